@@ -0,0 +1,141 @@
+import os
+from typing import Dict, List, Optional
+import numpy as np
+from config import ANN_NLIST, ANN_NPROBE, ANN_MIN_TRAIN_SIZE
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index
+    Rows are assigned to their closest k-means centroid, and a query only scores
+    the rows in its `nprobe` closest lists, so cost grows with ~sqrt(n) rather than n
+    
+    The index stores row numbers only; vectors stay in the owning store's matrix
+    """
+    
+    # Retrain once the corpus has grown this much since the last training
+    RETRAIN_GROWTH = 4
+    KMEANS_ITERATIONS = 10
+    SAMPLES_PER_LIST = 64
+    
+    def __init__(self, nlist: int = ANN_NLIST, nprobe: int = ANN_NPROBE, min_train_size: int = ANN_MIN_TRAIN_SIZE):
+        self.requested_nlist = nlist
+        self.nprobe = max(1, nprobe)
+        self.min_train_size = max(1, min_train_size)
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[List[int]] = []
+        self.trained_size = 0
+    
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+    
+    def needs_training(self, live_count: int) -> bool:
+        """Whether the index should be (re)trained for a corpus of this size"""
+        if live_count < self.min_train_size:
+            return False
+        return not self.trained or live_count >= self.trained_size * self.RETRAIN_GROWTH
+    
+    def _choose_nlist(self, count: int) -> int:
+        if self.requested_nlist > 0:
+            return min(self.requested_nlist, count)
+        return max(1, min(count, int(4 * np.sqrt(count))))
+    
+    def _assign(self, vectors: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        """Closest centroid (by cosine) for each row, computed in bounded batches"""
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            assignments[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ self.centroids.T, axis=1)
+        return assignments
+    
+    def train(self, vectors: np.ndarray, rows: np.ndarray):
+        """Run spherical k-means on a sample, then assign every row to a list"""
+        nlist = self._choose_nlist(len(rows))
+        rng = np.random.default_rng(0)
+        
+        sample_size = min(len(rows), nlist * self.SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(len(rows), size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        
+        for _ in range(self.KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            order = np.argsort(labels, kind='stable')
+            filled, starts = np.unique(labels[order], return_index=True)
+            # Empty clusters keep their previous centroid
+            centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0.0] = 1.0
+            centroids /= norms
+        
+        self.centroids = centroids.astype(np.float32)
+        self.reassign(vectors, rows)
+        self.trained_size = len(rows)
+    
+    def reassign(self, vectors: np.ndarray, rows: np.ndarray):
+        """Rebuild the inverted lists with the current centroids (e.g. after compaction)"""
+        self.lists = [[] for _ in range(len(self.centroids))]
+        for row, list_id in zip(rows.tolist(), self._assign(vectors).tolist()):
+            self.lists[list_id].append(row)
+    
+    def add(self, rows: List[int], vectors: np.ndarray):
+        """Insert rows incrementally (re-adding an updated row is fine; candidates are de-duplicated)"""
+        if not self.trained or len(rows) == 0:
+            return
+        for row, list_id in zip(rows, self._assign(vectors).tolist()):
+            self.lists[list_id].append(row)
+    
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Rows in the `nprobe` lists whose centroids are closest to the query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        selected = [self.lists[list_id] for list_id in probe.tolist() if self.lists[list_id]]
+        if not selected:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([np.asarray(rows, dtype=np.int64) for rows in selected]))
+    
+    def snapshot(self) -> Optional[Dict[str, np.ndarray]]:
+        """Arrays to persist (copies, so they can be written while the index keeps changing), None if untrained"""
+        if not self.trained:
+            return None
+        return {
+            'centroids': self.centroids.copy(),
+            'lengths': np.array([len(rows) for rows in self.lists], dtype=np.int64),
+            'rows': np.array([row for rows in self.lists for row in rows], dtype=np.int64),
+            'trained_size': np.int64(self.trained_size)
+        }
+    
+    @staticmethod
+    def write(path: str, snapshot: Optional[Dict[str, np.ndarray]]):
+        """Write a snapshot; an untrained (None) snapshot removes the file"""
+        if snapshot is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **snapshot)
+        os.replace(tmp_path, path)
+    
+    def save(self, path: str):
+        """Persist centroids and inverted lists"""
+        self.write(path, self.snapshot())
+    
+    def load(self, path: str) -> bool:
+        """Load a persisted index; returns False if there is none"""
+        if not os.path.exists(path):
+            return False
+        data = np.load(path)
+        self.centroids = data['centroids']
+        offsets = np.concatenate([[0], np.cumsum(data['lengths'])])
+        flat = data['rows'].tolist()
+        self.lists = [flat[offsets[i]:offsets[i + 1]] for i in range(len(self.centroids))]
+        self.trained_size = int(data['trained_size'])
+        return True
+    
+    def stats(self):
+        return {
+            'trained': self.trained,
+            'nlist': len(self.centroids) if self.trained else 0,
+            'nprobe': self.nprobe,
+            'trained_size': self.trained_size
+        }
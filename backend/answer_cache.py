@@ -0,0 +1,317 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import numpy as np
+from config import ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL_SECONDS, ANSWER_CACHE_SIZE, ANSWER_CACHE_PATH
+
+class _CacheEntry:
+    __slots__ = ('key', 'vector', 'result', 'documents', 'expires_at')
+    
+    def __init__(self, key: Tuple, vector: np.ndarray, result: Dict[str, Any], documents: frozenset, expires_at: float):
+        self.key = key
+        self.vector = vector
+        self.result = result
+        self.documents = documents
+        self.expires_at = expires_at
+
+class AnswerCache:
+    """
+    Semantic cache for RAG answers
+    A query hits when its embedding is within a cosine threshold of a cached
+    question asked with the same retrieval parameters
+    
+    With a db_path, answers and invalidations are also written to a shared sqlite
+    file that every worker process reads, so one worker's answers are hits in the
+    others and a re-ingested document is invalidated everywhere
+    """
+    
+    INVALIDATION_LOG_SIZE = 10000  # Invalidation records kept for workers that are catching up
+    
+    def __init__(
+        self,
+        similarity_threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        db_path: Optional[str] = ANSWER_CACHE_PATH
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        # Per parameter-set matrix of normalized question vectors, rebuilt lazily
+        self._buckets: Dict[Tuple, Optional[Tuple[List[str], np.ndarray]]] = {}
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        
+        self.db_path = db_path or None
+        self._db = None
+        self._synced_row = 0
+        self._synced_invalidation = 0
+        if self.db_path:
+            self._initialize_db()
+    
+    def _initialize_db(self):
+        """Open the shared tier and load the most recent live answers"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # AUTOINCREMENT keeps row ids increasing, so "rows after the last one seen" is exact
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "row_id INTEGER PRIMARY KEY AUTOINCREMENT, entry_id TEXT UNIQUE NOT NULL, "
+                "document_filter TEXT, top_k INTEGER NOT NULL, max_length INTEGER NOT NULL, "
+                "vector BLOB NOT NULL, result TEXT NOT NULL, documents TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            # A NULL document_name clears everything
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS invalidations (seq INTEGER PRIMARY KEY AUTOINCREMENT, document_name TEXT)"
+            )
+            self._db.commit()
+            
+            # Older invalidations were already applied to the stored rows
+            self._synced_invalidation = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+            with self._lock:
+                self._sync()
+        except Exception as e:
+            print(f"Error opening shared answer cache, using memory only: {e}")
+            self._db = None
+    
+    def _sync(self):
+        """Pull answers and invalidations written by other workers (lock held)"""
+        if self._db is None:
+            return
+        try:
+            invalidations = self._db.execute(
+                "SELECT seq, document_name FROM invalidations WHERE seq > ? ORDER BY seq", (self._synced_invalidation,)
+            ).fetchall()
+            rows = self._db.execute(
+                "SELECT row_id, entry_id, document_filter, top_k, max_length, vector, result, documents, expires_at "
+                "FROM answers WHERE row_id > ? ORDER BY row_id DESC LIMIT ?",
+                (self._synced_row, self.max_entries)
+            ).fetchall()
+        except Exception as e:
+            print(f"Error reading shared answer cache: {e}")
+            return
+        
+        if invalidations:
+            self._synced_invalidation = invalidations[-1][0]
+            names = {name for _, name in invalidations if name is not None}
+            if any(name is None for _, name in invalidations):
+                self._entries.clear()
+                self._buckets.clear()
+            elif names:
+                self._drop_documents(names)
+        
+        now = time.time()
+        for row_id, entry_id, document_filter, top_k, max_length, vector, result, documents, expires_at in reversed(rows):
+            self._synced_row = max(self._synced_row, row_id)
+            if entry_id in self._entries or expires_at <= now:
+                continue
+            key = self._make_key(document_filter, top_k, max_length)
+            self._entries[entry_id] = _CacheEntry(
+                key, np.frombuffer(vector, dtype=np.float32).copy(), json.loads(result),
+                frozenset(json.loads(documents)), expires_at
+            )
+            self._buckets[key] = None
+        self._evict()
+    
+    def _evict(self):
+        """Drop least recently used entries over max_entries (lock held)"""
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+    
+    def _drop_documents(self, names: set) -> int:
+        """Remove entries that cite, or were filtered to, any of the documents (lock held)"""
+        stale = [
+            entry_id for entry_id, entry in self._entries.items()
+            if entry.documents & names or entry.key[0] in names
+        ]
+        for entry_id in stale:
+            self._remove(entry_id)
+        return len(stale)
+    
+    @staticmethod
+    def _make_key(document_filter: Optional[str], top_k: int, max_length: int) -> Tuple:
+        return ((document_filter or '').strip() or None, top_k, max_length)
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            return None
+        return vector / norm
+    
+    def _remove(self, entry_id: str):
+        """Drop an entry and mark its bucket for rebuild (lock held)"""
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            self._buckets[entry.key] = None
+    
+    def _bucket(self, key: Tuple) -> Optional[Tuple[List[str], np.ndarray]]:
+        """Get the (entry ids, vector matrix) pair for a parameter set (lock held)"""
+        if key not in self._buckets:
+            return None
+        bucket = self._buckets[key]
+        if bucket is None:
+            ids = [entry_id for entry_id, entry in self._entries.items() if entry.key == key]
+            if not ids:
+                del self._buckets[key]
+                return None
+            bucket = (ids, np.stack([self._entries[entry_id].vector for entry_id in ids]))
+            self._buckets[key] = bucket
+        return bucket
+    
+    def lookup(
+        self,
+        embedding: List[float],
+        document_filter: Optional[str],
+        top_k: int,
+        max_length: int
+    ) -> Optional[Dict[str, Any]]:
+        """Return a copy of the closest cached result, or None on a miss"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return None
+        
+        key = self._make_key(document_filter, top_k, max_length)
+        now = time.time()
+        
+        with self._lock:
+            self._sync()
+            bucket = self._bucket(key)
+            if bucket is not None:
+                ids, matrix = bucket
+                similarities = matrix @ vector
+                
+                # Best candidates first; skip any that expired since the last rebuild
+                for position in np.argsort(-similarities):
+                    if similarities[position] < self.similarity_threshold:
+                        break
+                    entry_id = ids[position]
+                    entry = self._entries.get(entry_id)
+                    if entry is None:
+                        continue
+                    if entry.expires_at <= now:
+                        self._remove(entry_id)
+                        continue
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return copy.deepcopy(entry.result)
+            
+            self.misses += 1
+            return None
+    
+    def store(
+        self,
+        embedding: List[float],
+        document_filter: Optional[str],
+        top_k: int,
+        max_length: int,
+        result: Dict[str, Any]
+    ):
+        """Cache a query result, remembering which documents its sources cite"""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        
+        documents = frozenset(
+            source.get('metadata', {}).get('document_name')
+            for source in result.get('sources', [])
+        )
+        key = self._make_key(document_filter, top_k, max_length)
+        entry = _CacheEntry(key, vector, copy.deepcopy(result), documents, time.time() + self.ttl_seconds)
+        
+        entry_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[entry_id] = entry
+            self._buckets[key] = None
+            self._evict()
+            
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT INTO answers (entry_id, document_filter, top_k, max_length, vector, result, documents, expires_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (entry_id, key[0], top_k, max_length, vector.tobytes(), json.dumps(entry.result),
+                         json.dumps(sorted(name for name in documents if name)), entry.expires_at)
+                    )
+                    # Row ids are global, so this keeps the newest max_entries answers
+                    self._db.execute(
+                        "DELETE FROM answers WHERE expires_at <= ? OR row_id <= (SELECT MAX(row_id) FROM answers) - ?",
+                        (time.time(), self.max_entries)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Error writing shared answer cache: {e}")
+    
+    def _record_invalidations(self, names: List[Optional[str]]):
+        """Delete matching shared rows and log the invalidation for other workers (lock held)"""
+        if self._db is None:
+            return
+        try:
+            if any(name is None for name in names):
+                self._db.execute("DELETE FROM answers")
+            else:
+                placeholders = ','.join('?' * len(names))
+                self._db.execute(
+                    f"DELETE FROM answers WHERE document_filter IN ({placeholders}) OR EXISTS "
+                    f"(SELECT 1 FROM json_each(answers.documents) WHERE value IN ({placeholders}))",
+                    (*names, *names)
+                )
+            self._db.executemany("INSERT INTO invalidations (document_name) VALUES (?)", [(name,) for name in names])
+            self._db.execute(
+                "DELETE FROM invalidations WHERE seq <= (SELECT MAX(seq) FROM invalidations) - ?",
+                (self.INVALIDATION_LOG_SIZE,)
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"Error writing shared answer cache invalidation: {e}")
+    
+    def invalidate_documents(self, document_names: Iterable[str]) -> int:
+        """Drop entries that cite, or were filtered to, any of the given documents"""
+        names = set(document_names)
+        if not names:
+            return 0
+        with self._lock:
+            self._sync()
+            removed = self._drop_documents(names)
+            self._record_invalidations(sorted(names))
+            self.invalidations += removed
+            return removed
+    
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._record_invalidations([None])
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "shared": self._db is not None,
+                "similarity_threshold": self.similarity_threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,133 @@
+import random
+from typing import Dict, List, Tuple
+
+DRUGS = [
+    "metformin", "atorvastatin", "lisinopril", "amlodipine", "osimertinib", "erlotinib", "pembrolizumab",
+    "nivolumab", "warfarin", "apixaban", "insulin glargine", "empagliflozin", "semaglutide", "prednisone",
+    "methotrexate", "adalimumab", "tamoxifen", "letrozole", "vancomycin", "ceftriaxone"
+]
+CONDITIONS = [
+    "type 2 diabetes", "hypertension", "atrial fibrillation", "heart failure", "non-small cell lung cancer",
+    "EGFR T790M mutation", "rheumatoid arthritis", "chronic kidney disease", "breast cancer", "sepsis",
+    "community-acquired pneumonia", "asthma", "COPD", "stroke", "obesity", "hyperlipidemia"
+]
+OUTCOMES = [
+    "all-cause mortality", "progression-free survival", "HbA1c reduction", "systolic blood pressure",
+    "hospital readmission", "major adverse cardiovascular events", "overall response rate",
+    "serum creatinine", "quality of life scores", "length of stay"
+]
+TEMPLATES = [
+    "In a randomized trial of {n} patients with {condition}, {drug} improved {outcome} compared with placebo.",
+    "Adverse events associated with {drug} included nausea, fatigue and elevated liver enzymes in {pct}% of cases.",
+    "Patients with {condition} receiving {drug} showed a hazard ratio of 0.{hr} for {outcome}.",
+    "Subgroup analysis suggested that the benefit of {drug} on {outcome} was larger in patients over {age} years.",
+    "Guidelines recommend {drug} as first-line therapy for {condition} when contraindications are absent.",
+    "The median follow-up was {months} months and {outcome} was assessed at baseline and at the final visit.",
+    "Dose adjustment of {drug} is required in {condition} with reduced renal function.",
+]
+
+def _sentence(rng: random.Random) -> str:
+    return rng.choice(TEMPLATES).format(
+        n=rng.randint(80, 4000), drug=rng.choice(DRUGS), condition=rng.choice(CONDITIONS),
+        outcome=rng.choice(OUTCOMES), pct=rng.randint(2, 30), hr=rng.randint(55, 95),
+        age=rng.choice([50, 60, 65, 70, 75]), months=rng.randint(6, 60)
+    )
+
+def generate_pages(num_pages: int, lines_per_page: int = 40, seed: int = 0) -> List[List[str]]:
+    """Pages of wrapped lines of synthetic clinical-trial prose"""
+    rng = random.Random(seed)
+    pages = []
+    for page_num in range(num_pages):
+        lines = [f"Section {page_num + 1}: Clinical findings"]
+        current = ""
+        while len(lines) < lines_per_page:
+            for word in _sentence(rng).split():
+                if len(current) + len(word) + 1 > 90:
+                    lines.append(current)
+                    current = ""
+                current = f"{current} {word}".strip()
+            if rng.random() < 0.15:
+                lines.append(current)
+                lines.append("")
+                current = ""
+        pages.append(lines[:lines_per_page])
+    return pages
+
+def page_text_shapes(pages: List[List[str]]) -> Dict[str, List[str]]:
+    """
+    Page texts laid out the ways PDF extraction returns them: paragraphs with
+    blank lines, wrapped lines only, and one unbroken line per page
+    """
+    return {
+        "paragraphs": ["\n".join(lines) for lines in pages],
+        "lines": ["\n".join(line for line in lines if line) for lines in pages],
+        "unstructured": [" ".join(line for line in lines if line) for lines in pages],
+    }
+
+def build_pdf(pages: List[List[str]]) -> bytes:
+    """Minimal text-only PDF (Helvetica, one content stream per page) that PyPDF2 can extract"""
+    objects: List[bytes] = []
+    
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+    
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    # Page objects point at the page tree, which is written after them
+    pages_id = len(objects) + 2 * len(pages) + 1
+    page_ids = []
+    for lines in pages:
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in lines]
+        stream = ("BT /F1 9 Tf 40 760 Td 11 TL " + " ".join(f"({line}) '" for line in escaped) + " ET").encode("latin-1", "replace")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, content_id, font_id)
+        ))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids).encode()
+    add(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids)))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_offset)
+    return bytes(output)
+
+def generate_corpus(num_documents: int, pages_per_document: int, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """(document_name, pdf_bytes) pairs"""
+    return [
+        (f"bench_doc_{i:03d}", build_pdf(generate_pages(pages_per_document, seed=seed + i)))
+        for i in range(num_documents)
+    ]
+
+def generate_questions(count: int, seed: int = 0) -> List[str]:
+    """Distinct questions about the corpus vocabulary, so the answer cache never short-circuits them"""
+    rng = random.Random(seed)
+    forms = [
+        "What is the effect of {drug} on {outcome} in {condition}?",
+        "Which adverse events were reported with {drug}?",
+        "Is {drug} recommended for {condition}?",
+        "How was {outcome} measured in trials of {drug}?",
+    ]
+    return [
+        rng.choice(forms).format(drug=rng.choice(DRUGS), condition=rng.choice(CONDITIONS), outcome=rng.choice(OUTCOMES))
+        + f" (case {i})"
+        for i in range(count)
+    ]
+
+def generate_split_cases(count: int, seed: int = 0) -> List[Tuple[str, int, int]]:
+    """(text, chunk_size, chunk_overlap) triples of short random text dense in separators and edge cases"""
+    rng = random.Random(seed)
+    alphabet = ["a", "bc", "word", "longerword", "x" * 30, "é", "漢字", " ", "  ", "\t", "\n", "\n\n", "\n\n\n"]
+    cases = []
+    for _ in range(count):
+        chunk_size = rng.choice([5, 10, 20, 50, 100])
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 300)))
+        cases.append((text, chunk_size, rng.randint(0, chunk_size)))
+    return cases
\ No newline at end of file
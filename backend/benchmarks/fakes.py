@@ -0,0 +1,181 @@
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+import numpy as np
+from config import EMBEDDING_DIMENSION
+from vector_store import LocalVectorStore
+
+class LatencyModel:
+    """
+    Log-normal latency with injected failures
+    Defined by its median and p99 in milliseconds, which is how endpoint latency
+    is usually reported; p99 == median gives a fixed delay
+    """
+    
+    Z_99 = 2.3263  # Standard normal 99th percentile
+    
+    def __init__(self, median_ms: float = 0.0, p99_ms: Optional[float] = None, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.median_ms = max(0.0, median_ms)
+        p99_ms = max(p99_ms if p99_ms is not None else median_ms, self.median_ms)
+        self.sigma = math.log(p99_ms / self.median_ms) / self.Z_99 if self.median_ms > 0 else 0.0
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def sample(self) -> float:
+        """One latency draw, in seconds"""
+        if self.median_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self.median_ms * math.exp(self._random.gauss(0.0, self.sigma)) / 1000.0
+    
+    def fails(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+    
+    def wait(self, extra_seconds: float = 0.0):
+        delay = self.sample() + extra_seconds
+        if delay > 0:
+            time.sleep(delay)
+
+class _Capacity:
+    """Caps concurrent calls like a fixed number of endpoint instances; 0 means unlimited"""
+    
+    def __init__(self, limit: int):
+        self._semaphore = threading.BoundedSemaphore(limit) if limit > 0 else None
+    
+    def slot(self):
+        return self._semaphore if self._semaphore is not None else nullcontext()
+
+_TERM_PATTERN = re.compile(r"[a-z0-9]+")
+
+def hashed_embedding(text: str, dimension: int = EMBEDDING_DIMENSION) -> List[float]:
+    """
+    Deterministic bag-of-words embedding
+    Each term is hashed to a dimension and sign, so texts sharing terms score
+    higher and retrieval behaves plausibly without a model
+    """
+    vector = np.zeros(dimension, dtype=np.float32)
+    for term in _TERM_PATTERN.findall(text.lower()):
+        digest = hashlib.blake2b(term.encode(), digest_size=8).digest()
+        index = int.from_bytes(digest[:4], 'little') % dimension
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[0] = 1.0
+        norm = 1.0
+    return (vector / norm).tolist()
+
+class FakeEmbeddingClient:
+    """Stand-in for SageMakerEmbeddingClient: hashed embeddings behind simulated endpoint latency"""
+    
+    def __init__(self, latency: Optional[LatencyModel] = None, per_item_ms: float = 0.5, capacity: int = 4, endpoint_name: str = "fake-embedding"):
+        self.endpoint_name = endpoint_name
+        self.latency = latency or LatencyModel()
+        self.per_item_ms = per_item_ms
+        self._capacity = _Capacity(capacity)
+        self.calls = 0
+    
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        with self._capacity.slot():
+            self.latency.wait(self.per_item_ms * len(texts) / 1000.0)
+            if self.latency.fails():
+                # Same fallback as the real client
+                print("Error generating embeddings: injected fault")
+                return [[0.0] * EMBEDDING_DIMENSION for _ in texts]
+        return [hashed_embedding(text) for text in texts]
+    
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings([text])[0]
+
+class FakeLLMClient:
+    """Stand-in for SageMakerLLMClient: time to first token plus a per-token cost"""
+    
+    ANSWER = (
+        "Based on the provided context, the findings indicate a consistent association that "
+        "should be interpreted alongside the study population and the reported limitations."
+    )
+    
+    def __init__(self, latency: Optional[LatencyModel] = None, per_token_ms: float = 0.0, answer_tokens: int = 64, capacity: int = 4, endpoint_name: str = "fake-llm"):
+        self.endpoint_name = endpoint_name
+        self.latency = latency or LatencyModel()
+        self.per_token_ms = per_token_ms
+        self.answer_tokens = answer_tokens
+        self._capacity = _Capacity(capacity)
+        self.calls = 0
+    
+    def _tokens(self, max_length: int) -> List[str]:
+        words = self.ANSWER.split()
+        count = max(1, min(self.answer_tokens, max_length))
+        return [words[i % len(words)] for i in range(count)]
+    
+    def generate_response(self, prompt: str, max_length: int = 512) -> str:
+        self.calls += 1
+        tokens = self._tokens(max_length)
+        with self._capacity.slot():
+            self.latency.wait(self.per_token_ms * len(tokens) / 1000.0)
+            if self.latency.fails():
+                print("Error generating response: injected fault")
+                return "Error: Unable to generate response - injected fault"
+        return " ".join(tokens)
+    
+    def generate_response_stream(self, prompt: str, max_length: int = 512) -> Iterator[str]:
+        self.calls += 1
+        with self._capacity.slot():
+            self.latency.wait()
+            if self.latency.fails():
+                raise RuntimeError("injected fault")
+            for i, token in enumerate(self._tokens(max_length)):
+                if self.per_token_ms > 0:
+                    time.sleep(self.per_token_ms / 1000.0)
+                yield token if i == 0 else " " + token
+
+class FakeVectorStore(LocalVectorStore):
+    """Stand-in for PineconeVectorStore: the in-memory NumPy index plus simulated network latency"""
+    
+    def __init__(self, latency: Optional[LatencyModel] = None, dimension: int = EMBEDDING_DIMENSION):
+        super().__init__(path=None, dimension=dimension, index_type='flat')
+        self.latency = latency or LatencyModel()
+    
+    def upsert_vectors(self, texts: List[str], embeddings: List[List[float]], metadata: List[Dict[str, Any]], ids: Optional[List[str]] = None):
+        self.latency.wait()
+        if self.latency.fails():
+            print("Error upserting vectors: injected fault")
+            return False
+        return super().upsert_vectors(texts, embeddings, metadata, ids=ids)
+    
+    def similarity_search(self, query_embedding: List[float], top_k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict]:
+        self.latency.wait()
+        if self.latency.fails():
+            print("Error searching vectors: injected fault")
+            return []
+        return super().similarity_search(query_embedding, top_k, filter_dict)
+    
+    def delete_vectors(self, ids: List[str]) -> bool:
+        self.latency.wait()
+        if self.latency.fails():
+            print("Error deleting vectors: injected fault")
+            return False
+        return super().delete_vectors(ids)
+    
+    def fetch_metadata(self, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        self.latency.wait()
+        if self.latency.fails():
+            print("Error fetching vector metadata: injected fault")
+            return None
+        return super().fetch_metadata(ids)
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        self.latency.wait()
+        if self.latency.fails():
+            print("Error updating vector metadata: injected fault")
+            return False
+        return super().update_metadata(updates)
\ No newline at end of file
@@ -0,0 +1,447 @@
+"""
+Offline throughput and latency benchmarks for the RAG pipeline and API
+
+SageMaker and Pinecone are replaced by the stand-ins in benchmarks.fakes, so no
+AWS or Pinecone access is needed. Run from the backend directory:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --scenarios api --concurrency 1,8,32
+    python -m benchmarks.run --scenarios api --url http://localhost:8000
+    python -m benchmarks.run --baseline bench.json    # exits 1 on a regression
+    python -m benchmarks.run --scenarios chunking     # native chunker vs langchain
+    python -m benchmarks.run --scenarios startup      # exits 1 over STARTUP_BUDGET_SECONDS
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+SCENARIOS = ("ingest", "query", "api", "chunking", "startup")
+FAILED_ANSWER_PREFIXES = ("Error:", "I encountered", "I apologize", "I couldn't", "I need")
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline against simulated SageMaker and Pinecone")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: ingest, query, api, chunking, startup")
+    parser.add_argument("--documents", type=int, default=4, help="Synthetic PDFs to ingest")
+    parser.add_argument("--pages", type=int, default=20, help="Pages per synthetic PDF")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels to sweep")
+    parser.add_argument("--url", default=None, help="Benchmark a running server instead of the in-process app (api scenario)")
+    parser.add_argument("--embed-ms", type=float, default=15.0, help="Embedding endpoint median latency")
+    parser.add_argument("--embed-p99-ms", type=float, default=60.0)
+    parser.add_argument("--llm-ms", type=float, default=120.0, help="LLM endpoint median latency (time to first token)")
+    parser.add_argument("--llm-p99-ms", type=float, default=500.0)
+    parser.add_argument("--llm-per-token-ms", type=float, default=0.0, help="Added LLM latency per generated token")
+    parser.add_argument("--vector-ms", type=float, default=20.0, help="Vector store median latency")
+    parser.add_argument("--vector-p99-ms", type=float, default=80.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of simulated calls that fail")
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent calls each simulated endpoint serves; 0 is unlimited")
+    parser.add_argument("--answer-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--chunk-pages", type=int, default=1000, help="Pages in the document the chunking scenario splits")
+    parser.add_argument("--startup-runs", type=int, default=3, help="Cold starts measured by the startup scenario")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON report")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative p95/throughput change before a regression is flagged")
+    return parser.parse_args(argv)
+
+def configure_environment(args: argparse.Namespace):
+    """Keep the run hermetic; must happen before any backend module reads config"""
+    os.environ["VECTOR_STORE_BACKEND"] = "local"
+    os.environ["LOCAL_VECTOR_STORE_PATH"] = ""
+    os.environ["LEXICAL_INDEX_PATH"] = ""
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    os.environ["JOB_QUEUE_DIR"] = tempfile.mkdtemp(prefix="bench-jobs-")
+    os.environ["ANSWER_CACHE_ENABLED"] = "true" if args.answer_cache else "false"
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, Any]:
+    """Latency percentiles (ms), error rate and throughput for one run"""
+    requests = len(latencies)
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    latency_ms = {
+        "mean": float(values.mean()) if requests else 0.0,
+        "p50": float(np.percentile(values, 50)) if requests else 0.0,
+        "p95": float(np.percentile(values, 95)) if requests else 0.0,
+        "p99": float(np.percentile(values, 99)) if requests else 0.0,
+        "max": float(values.max()) if requests else 0.0,
+    }
+    return {
+        "requests": requests,
+        "errors": errors,
+        "error_rate": errors / requests if requests else 0.0,
+        "throughput_per_s": requests / wall_seconds if wall_seconds > 0 else 0.0,
+        "wall_seconds": wall_seconds,
+        "latency_ms": {name: round(value, 3) for name, value in latency_ms.items()},
+    }
+
+def build_pipeline(args: argparse.Namespace):
+    from benchmarks.fakes import FakeEmbeddingClient, FakeLLMClient, FakeVectorStore, LatencyModel
+    from rag_pipeline import RAGPipeline
+    
+    return RAGPipeline(
+        llm_client=FakeLLMClient(
+            LatencyModel(args.llm_ms, args.llm_p99_ms, args.error_rate, seed=args.seed),
+            per_token_ms=args.llm_per_token_ms,
+            capacity=args.capacity
+        ),
+        embedding_client=FakeEmbeddingClient(
+            LatencyModel(args.embed_ms, args.embed_p99_ms, args.error_rate, seed=args.seed + 1),
+            capacity=args.capacity
+        ),
+        vector_store=FakeVectorStore(LatencyModel(args.vector_ms, args.vector_p99_ms, args.error_rate, seed=args.seed + 2))
+    )
+
+def bench_ingest(pipeline, corpus: List[Tuple[str, bytes]], pages_per_document: int) -> Dict[str, Any]:
+    latencies = []
+    errors = 0
+    chunks = 0
+    started = time.perf_counter()
+    for document_name, pdf_content in corpus:
+        call_started = time.perf_counter()
+        result = pipeline.ingest_document(pdf_content, document_name, incremental=False)
+        latencies.append(time.perf_counter() - call_started)
+        if result.get("success"):
+            chunks += result.get("chunks_processed", 0)
+        else:
+            errors += 1
+    wall = time.perf_counter() - started
+    
+    report = summarize(latencies, errors, wall)
+    report["chunks"] = chunks
+    report["chunks_per_s"] = chunks / wall if wall > 0 else 0.0
+    report["pages_per_s"] = len(corpus) * pages_per_document / wall if wall > 0 else 0.0
+    return report
+
+def _answer_failed(result: Any) -> bool:
+    if not isinstance(result, dict):
+        return True
+    return result.get("num_sources", 0) == 0 or str(result.get("answer", "")).startswith(FAILED_ANSWER_PREFIXES)
+
+def bench_pipeline_queries(pipeline, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    """Call RAGPipeline.query directly from a pool of `concurrency` threads"""
+    def timed_query(question: str) -> Tuple[float, bool]:
+        call_started = time.perf_counter()
+        try:
+            failed = _answer_failed(pipeline.query(question))
+        except Exception:
+            failed = True
+        return time.perf_counter() - call_started, failed
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(timed_query, questions))
+    wall = time.perf_counter() - started
+    return summarize([latency for latency, _ in outcomes], sum(failed for _, failed in outcomes), wall)
+
+async def _bench_api_level(client, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    slots = asyncio.Semaphore(concurrency)
+    
+    async def timed_request(question: str) -> Tuple[float, bool]:
+        async with slots:
+            call_started = time.perf_counter()
+            try:
+                response = await client.post("/query", json={"question": question}, timeout=120.0)
+                failed = response.status_code != 200 or _answer_failed(response.json())
+            except Exception:
+                failed = True
+            return time.perf_counter() - call_started, failed
+    
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(timed_request(question) for question in questions))
+    wall = time.perf_counter() - started
+    return summarize([latency for latency, _ in outcomes], sum(failed for _, failed in outcomes), wall)
+
+async def bench_api(pipeline, questions_for: Callable[[int], List[str]], levels: List[int], url: Optional[str]) -> List[Dict[str, Any]]:
+    """POST /query concurrency sweep, in-process through ASGI or against a live server"""
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The api scenario needs httpx (pip install httpx)")
+    
+    if url:
+        client = httpx.AsyncClient(base_url=url)
+    else:
+        import main
+        main.rag_pipeline = pipeline
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://benchmark")
+    
+    results = []
+    async with client:
+        for concurrency in levels:
+            report = await _bench_api_level(client, questions_for(concurrency), concurrency)
+            results.append({"concurrency": concurrency, **report})
+    return results
+
+class _LangchainSpans:
+    """langchain's splitter behind TextChunker.split_spans, so iter_chunks can stream through either"""
+    
+    def __init__(self, splitter):
+        self.splitter = splitter
+    
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        spans = []
+        position = 0
+        for chunk in self.splitter.split_text(text):
+            start = text.find(chunk, position)
+            spans.append((start, start + len(chunk)))
+            position = start + 1
+        return spans
+
+def bench_chunking(num_pages: int, seed: int = 0, repeats: int = 3, cases: int = 2000) -> Dict[str, Any]:
+    """
+    Best-of-`repeats` time for the native chunker against langchain's splitter on
+    each page layout, splitting the whole text and streaming through iter_chunks,
+    plus a check that both chunk `cases` random texts identically
+    """
+    from benchmarks.corpus import generate_pages, generate_split_cases, page_text_shapes
+    from config import CHUNK_SIZE, CHUNK_OVERLAP
+    from document_processor import DocumentProcessor
+    from text_chunker import TextChunker
+    
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        RecursiveCharacterTextSplitter = None
+    
+    def splitter_for(chunk_size: int, chunk_overlap: int):
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len, separators=list(TextChunker.SEPARATORS)
+        )
+    
+    def best_of(split: Callable[[], List[Any]], characters: int) -> Dict[str, Any]:
+        seconds = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            chunks = split()
+            seconds.append(time.perf_counter() - started)
+        return {"seconds": round(min(seconds), 4), "chunks": len(chunks), "chars_per_s": round(characters / min(seconds))}
+    
+    chunker = TextChunker(CHUNK_SIZE, CHUNK_OVERLAP)
+    processor = DocumentProcessor(extract_workers=1)
+    report: Dict[str, Any] = {"pages": num_pages, "shapes": {}, "equivalence": None}
+    for shape, page_texts in page_text_shapes(generate_pages(num_pages, seed=seed)).items():
+        pages = list(enumerate(page_texts, start=1))
+        text = "".join("".join(DocumentProcessor._page_text_parts(page_num, page_text)) for page_num, page_text in pages)
+        result: Dict[str, Any] = {
+            "characters": len(text),
+            "native": best_of(lambda: chunker.split_text(text), len(text)),
+            "native_streaming": best_of(lambda: list(processor.iter_chunks(iter(pages))), len(text)),
+            "langchain": None,
+            "langchain_streaming": None,
+        }
+        if RecursiveCharacterTextSplitter is not None:
+            splitter = splitter_for(CHUNK_SIZE, CHUNK_OVERLAP)
+            baseline = DocumentProcessor(extract_workers=1)
+            baseline.chunker = _LangchainSpans(splitter)
+            result["langchain"] = best_of(lambda: splitter.split_text(text), len(text))
+            result["langchain_streaming"] = best_of(lambda: list(baseline.iter_chunks(iter(pages))), len(text))
+            result["speedup"] = round(result["langchain"]["seconds"] / max(result["native"]["seconds"], 1e-9), 2)
+            result["streaming_speedup"] = round(
+                result["langchain_streaming"]["seconds"] / max(result["native_streaming"]["seconds"], 1e-9), 2
+            )
+            result["identical"] = chunker.split_text(text) == splitter.split_text(text)
+        report["shapes"][shape] = result
+    
+    if RecursiveCharacterTextSplitter is not None:
+        mismatches = sum(
+            TextChunker(chunk_size, chunk_overlap).split_text(text) != splitter_for(chunk_size, chunk_overlap).split_text(text)
+            for text, chunk_size, chunk_overlap in generate_split_cases(cases, seed=seed)
+        )
+        report["equivalence"] = {"cases": cases, "mismatches": mismatches}
+    return report
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_PROBE = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _time_to_health(timeout: float = 30.0) -> float:
+    """Seconds from launching a fresh server process until GET /health answers 200"""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise SystemExit(f"Server exited during startup with code {server.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise SystemExit(f"/health did not answer within {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def bench_startup(runs: int) -> Dict[str, Any]:
+    """Cold-start cost in fresh processes: importing the app, and launching a server until /health answers"""
+    from config import STARTUP_BUDGET_SECONDS
+    
+    import_seconds = []
+    health_seconds = []
+    for _ in range(max(1, runs)):
+        probe = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120)
+        if probe.returncode != 0:
+            raise SystemExit(f"Importing the app failed:\n{probe.stderr}")
+        import_seconds.append(float(probe.stdout.strip().splitlines()[-1]))
+        health_seconds.append(_time_to_health())
+    
+    def spread(values: List[float]) -> Dict[str, float]:
+        return {"p50": round(float(np.median(values)), 4), "max": round(max(values), 4)}
+    
+    return {
+        "runs": len(import_seconds),
+        "budget_seconds": STARTUP_BUDGET_SECONDS,
+        "import_seconds": spread(import_seconds),
+        "health_seconds": spread(health_seconds),
+        "within_budget": float(np.median(import_seconds)) <= STARTUP_BUDGET_SECONDS,
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Regressions in p95 latency or throughput against a baseline report"""
+    regressions = []
+    
+    def check(label: str, current: Dict[str, Any], previous: Dict[str, Any]):
+        current_p95 = current["latency_ms"]["p95"]
+        previous_p95 = previous["latency_ms"]["p95"]
+        if previous_p95 > 0 and current_p95 > previous_p95 * (1 + tolerance):
+            regressions.append(f"{label}: p95 {previous_p95:.1f}ms -> {current_p95:.1f}ms")
+        current_rate = current["throughput_per_s"]
+        previous_rate = previous["throughput_per_s"]
+        if previous_rate > 0 and current_rate < previous_rate * (1 - tolerance):
+            regressions.append(f"{label}: throughput {previous_rate:.2f}/s -> {current_rate:.2f}/s")
+    
+    if "ingest" in report and "ingest" in baseline:
+        check("ingest", report["ingest"], baseline["ingest"])
+    for scenario in ("query", "api"):
+        previous_levels = {entry["concurrency"]: entry for entry in baseline.get(scenario, [])}
+        for entry in report.get(scenario, []):
+            previous = previous_levels.get(entry["concurrency"])
+            if previous is not None:
+                check(f"{scenario} c={entry['concurrency']}", entry, previous)
+    return regressions
+
+def print_table(report: Dict[str, Any]):
+    rows = []
+    if "ingest" in report:
+        rows.append(("ingest", "-", report["ingest"]))
+    for scenario in ("query", "api"):
+        rows.extend((scenario, str(entry["concurrency"]), entry) for entry in report.get(scenario, []))
+    if rows:
+        print(f"{'scenario':<8} {'conc':>5} {'reqs':>6} {'err%':>6} {'rate/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for scenario, concurrency, entry in rows:
+        latency = entry["latency_ms"]
+        print(
+            f"{scenario:<8} {concurrency:>5} {entry['requests']:>6} {entry['error_rate'] * 100:>5.1f}% "
+            f"{entry['throughput_per_s']:>9.2f} {latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f}"
+        )
+    if "chunking" in report:
+        chunking = report["chunking"]
+        for shape, result in chunking["shapes"].items():
+            timings = [
+                f"{name} {result[name]['seconds'] * 1000:.0f}ms"
+                for name in ("native", "langchain", "native_streaming", "langchain_streaming") if result[name]
+            ]
+            extra = (
+                f", {result['speedup']}x / {result['streaming_speedup']}x streamed, identical={result['identical']}"
+                if result["langchain"] else ""
+            )
+            print(f"chunking {shape}: {result['characters']} chars, {result['native']['chunks']} chunks: {', '.join(timings)}{extra}")
+        if chunking["equivalence"]:
+            print(f"chunking equivalence: {chunking['equivalence']['mismatches']} of {chunking['equivalence']['cases']} random texts differ from langchain")
+    if "startup" in report:
+        startup = report["startup"]
+        print(
+            f"startup: import p50 {startup['import_seconds']['p50'] * 1000:.0f}ms "
+            f"(max {startup['import_seconds']['max'] * 1000:.0f}ms), /health p50 {startup['health_seconds']['p50'] * 1000:.0f}ms "
+            f"(max {startup['health_seconds']['max'] * 1000:.0f}ms), budget {startup['budget_seconds'] * 1000:.0f}ms"
+        )
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    
+    configure_environment(args)
+    from benchmarks.corpus import generate_corpus, generate_questions
+    
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        }
+    }
+    
+    pipeline = None
+    if "ingest" in scenarios or "query" in scenarios or ("api" in scenarios and not args.url):
+        pipeline = build_pipeline(args)
+        corpus = generate_corpus(args.documents, args.pages, seed=args.seed)
+        # Ingestion also loads the corpus the query scenarios search
+        report["ingest"] = bench_ingest(pipeline, corpus, args.pages)
+        if "ingest" not in scenarios:
+            report.pop("ingest")
+    
+    # Fresh questions per level so no level is served from the embedding cache
+    def questions_for(concurrency: int) -> List[str]:
+        return generate_questions(args.queries, seed=args.seed * 1000 + concurrency)
+    
+    try:
+        if "query" in scenarios:
+            report["query"] = [
+                {"concurrency": concurrency, **bench_pipeline_queries(pipeline, questions_for(concurrency), concurrency)}
+                for concurrency in levels
+            ]
+        if "api" in scenarios:
+            report["api"] = asyncio.run(bench_api(pipeline, questions_for, levels, args.url))
+        if "chunking" in scenarios:
+            report["chunking"] = bench_chunking(args.chunk_pages, seed=args.seed)
+        if "startup" in scenarios:
+            report["startup"] = bench_startup(args.startup_runs)
+    finally:
+        if pipeline is not None:
+            pipeline.shutdown()
+    
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print_table(report)
+    print(f"Wrote {args.output}")
+    
+    status = 0
+    if "startup" in report and not report["startup"]["within_budget"]:
+        print(f"OVER BUDGET app import p50 {report['startup']['import_seconds']['p50']:.2f}s > {report['startup']['budget_seconds']:.2f}s")
+        status = 1
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(report, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
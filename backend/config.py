@@ -6,6 +6,7 @@ load_dotenv()
 # SageMaker Configuration
 SAGEMAKER_LLM_ENDPOINT = os.getenv("SAGEMAKER_LLM_ENDPOINT", "your-llm-endpoint-name")
 SAGEMAKER_EMBEDDING_ENDPOINT = os.getenv("SAGEMAKER_EMBEDDING_ENDPOINT", "your-embedding-endpoint-name")
+SAGEMAKER_RERANK_ENDPOINT = os.getenv("SAGEMAKER_RERANK_ENDPOINT", "")  # TEI cross-encoder endpoint, used when RERANK_BACKEND=sagemaker
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 
 # Pinecone Configuration
@@ -13,11 +14,120 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "your-pinecone-api-key")
 PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "your-pinecone-environment")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "medical-rag-index")
 
+# Downstream transport: shared connection pools, retries and timeouts
+SAGEMAKER_MAX_POOL_CONNECTIONS = int(os.getenv("SAGEMAKER_MAX_POOL_CONNECTIONS", "32"))  # Keep-alive connections per endpoint
+SAGEMAKER_CONNECT_TIMEOUT = float(os.getenv("SAGEMAKER_CONNECT_TIMEOUT", "2"))  # Seconds
+SAGEMAKER_READ_TIMEOUT = float(os.getenv("SAGEMAKER_READ_TIMEOUT", "10"))  # Seconds, embedding and rerank calls
+SAGEMAKER_LLM_READ_TIMEOUT = float(os.getenv("SAGEMAKER_LLM_READ_TIMEOUT", "60"))  # Seconds, generation calls
+SAGEMAKER_MAX_ATTEMPTS = int(os.getenv("SAGEMAKER_MAX_ATTEMPTS", "3"))  # Including the first call; adaptive backoff with jitter
+PINECONE_POOL_MAXSIZE = int(os.getenv("PINECONE_POOL_MAXSIZE", "32"))  # Keep-alive connections to the index host
+PINECONE_POOL_THREADS = int(os.getenv("PINECONE_POOL_THREADS", "4"))  # SDK threads for async_req calls
+PINECONE_MAX_RETRIES = int(os.getenv("PINECONE_MAX_RETRIES", "3"))  # Retries on 429/5xx and connection errors
+PINECONE_RETRY_BACKOFF = float(os.getenv("PINECONE_RETRY_BACKOFF", "0.2"))  # Base backoff and jitter, seconds
+PINECONE_TIMEOUT_SECONDS = float(os.getenv("PINECONE_TIMEOUT_SECONDS", "10"))  # Per-call timeout
+PINECONE_INIT_WAIT_SECONDS = float(os.getenv("PINECONE_INIT_WAIT_SECONDS", "30"))  # Longest a call waits for index discovery
+PINECONE_INIT_RETRY_SECONDS = float(os.getenv("PINECONE_INIT_RETRY_SECONDS", "30"))  # Upper bound on the discovery retry backoff
+PINECONE_CREATE_TIMEOUT_SECONDS = float(os.getenv("PINECONE_CREATE_TIMEOUT_SECONDS", "120"))  # Wait for a new index to be ready
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "90"))  # Budget for one query; 0 disables it
+
+# Vector store backend: "pinecone", "local" (in-process NumPy index) or
+# "replicated" (Pinecone primary with a local read replica)
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", "")  # Directory for the local index; empty keeps it in memory
+LOCAL_PERSIST_DELAY_SECONDS = float(os.getenv("LOCAL_PERSIST_DELAY_SECONDS", "5"))  # Changes are written at most this long after they happen
+REPLICA_SYNC_CHECK_SECONDS = int(os.getenv("REPLICA_SYNC_CHECK_SECONDS", "60"))  # How often the replica re-checks it matches Pinecone
+
+# Local index type: "flat" (exact) or "ivf" (approximate, sub-linear search)
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "flat").lower()
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))  # Number of IVF lists; 0 sizes it from the corpus (~4*sqrt(n))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))  # Lists scanned per query: higher = better recall, slower
+ANN_MIN_TRAIN_SIZE = int(os.getenv("ANN_MIN_TRAIN_SIZE", "10000"))  # Below this many vectors search stays exact
+
 # Embedding Configuration
 EMBEDDING_DIMENSION = 768  # PubMedBERT embedding dimension
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# LLM tokenizer used for exact prompt token budgeting (hub ID or local directory)
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "epfl-llm/meditron-7b")
+TOKEN_COUNT_CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "50000"))  # Memoized per-text token counts
+# Context packing: "greedy" keeps retrieval order until the budget is full,
+# "knapsack" picks the chunks with the best total score that fit the budget
+CONTEXT_PACKING = os.getenv("CONTEXT_PACKING", "greedy").lower()
+
+# Hybrid retrieval: a local BM25 index fused with dense results by reciprocal rank fusion
+HYBRID_SEARCH_ENABLED = os.getenv("HYBRID_SEARCH_ENABLED", "true").lower() == "true"
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "lexical_index.db")  # sqlite file; empty keeps it in memory
+RRF_K = int(os.getenv("RRF_K", "60"))  # Rank offset in 1 / (k + rank)
+
+# Reranking: over-fetch candidates and reorder them with a cross-encoder before generation
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "local").lower()  # "local" (CPU cross-encoder) or "sagemaker"
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")  # Used by the local backend
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))  # Candidates fetched from the vector store
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))  # Pairs scored per model call
+RERANK_TIMEOUT_MS = int(os.getenv("RERANK_TIMEOUT_MS", "300"))  # Stop scoring further batches after this long
+
+# PDF text extraction
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))  # Worker processes for page extraction
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))  # Smaller PDFs are extracted in-process
+
+# Streaming ingestion (extract -> chunk -> embed -> upsert run as overlapping stages)
+INGEST_WINDOW_SIZE = int(os.getenv("INGEST_WINDOW_SIZE", "256"))  # Chunks embedded and upserted together
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "2"))  # Windows buffered between stages
+
+# Embedding batching (TEI accepts a list of inputs per request)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # TEI max_client_batch_size default
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "16384"))  # TEI max_batch_tokens default
+EMBEDDING_BATCH_MAX_BYTES = int(os.getenv("EMBEDDING_BATCH_MAX_BYTES", "5000000"))  # SageMaker payload limit is 6MB
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))  # In-flight requests per endpoint
+
+# Coalescing of concurrent single-query embeddings into one endpoint call
+EMBEDDING_COALESCE_ENABLED = os.getenv("EMBEDDING_COALESCE_ENABLED", "true").lower() == "true"
+EMBEDDING_COALESCE_WAIT_MS = int(os.getenv("EMBEDDING_COALESCE_WAIT_MS", "5"))  # Longest a request waits for company
+EMBEDDING_COALESCE_MAX_ITEMS = int(os.getenv("EMBEDDING_COALESCE_MAX_ITEMS", "32"))  # Batch is sent once this full
+
+# Serving: worker processes and pipeline warm-up
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # Processes serving the API; each holds its own pipeline
+API_RELOAD = os.getenv("API_RELOAD", "false").lower() == "true"  # Auto-reload for development (single worker only)
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", "cache" if API_WORKERS > 1 else "")  # sqlite cache tiers shared by all workers
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(SHARED_CACHE_DIR, "metrics") if SHARED_CACHE_DIR else "")  # Per-worker metric files /metrics sums
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))  # How often each worker writes its metrics file
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"  # Touch endpoints and indexes before serving
+WARMUP_LLM = os.getenv("WARMUP_LLM", "false").lower() == "true"  # Also send a one-token generation
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "30"))  # Upper bound on the backoff between failed warm-ups
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "1.0"))  # Target for importing the app, checked by the startup benchmark
+
+# Query embedding cache
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))  # In-memory LRU entries
+EMBEDDING_CACHE_PATH = os.getenv(  # sqlite file for the persistent tier; empty disables it
+    "EMBEDDING_CACHE_PATH", os.path.join(SHARED_CACHE_DIR, "embeddings.db") if SHARED_CACHE_DIR else ""
+)
+
+# Semantic answer cache
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))  # Minimum cosine similarity for a hit
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_PATH = os.getenv(  # sqlite file shared by worker processes; empty keeps answers per process
+    "ANSWER_CACHE_PATH", os.path.join(SHARED_CACHE_DIR, "answers.db") if SHARED_CACHE_DIR else ""
+)
+
+# Request execution pools (blocking pipeline work runs off the event loop)
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "16"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+
+# Background ingestion jobs (POST /jobs)
+JOB_QUEUE_DIR = os.getenv("JOB_QUEUE_DIR", "job_queue")  # sqlite queue database and spooled uploads
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Documents ingested concurrently
+UPLOAD_MAX_UNCOMPRESSED_BYTES = int(os.getenv("UPLOAD_MAX_UNCOMPRESSED_BYTES", str(2 * 1024 ** 3)))  # Per zip archive
+
+# Batch queries (POST /query/batch)
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "1000"))
+BATCH_QUERY_CONCURRENCY = int(os.getenv("BATCH_QUERY_CONCURRENCY", "16"))  # Questions retrieved in parallel
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))  # LLM calls in flight per batch
+
 # API Configuration
 API_HOST = "0.0.0.0"
 API_PORT = 8000
\ No newline at end of file
@@ -1,46 +1,170 @@
-import PyPDF2
-from typing import List, Dict, Any
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from config import CHUNK_SIZE, CHUNK_OVERLAP
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from config import CHUNK_SIZE, CHUNK_OVERLAP, PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES
+from text_chunker import TextChunker
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from bisect import bisect_right
+import multiprocessing
+import os
+import tempfile
+import threading
 import hashlib
 import io
 
-class DocumentProcessor:
+# Reader for the file a worker process extracted from last, so its ranges share one parse
+_worker_reader: Tuple[Optional[str], Any] = (None, None)
+
+def _extract_page_range(pdf_content: bytes, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract (page_number, text) for pages [start, end)"""
+    import PyPDF2
+    return _extract_pages(PyPDF2.PdfReader(io.BytesIO(pdf_content)), start, end)
+
+def _extract_file_range(path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """Extract pages [start, end) of a spooled PDF; runs in worker processes"""
+    global _worker_reader
+    if _worker_reader[0] != path:
+        import PyPDF2
+        # Release the previous document before reading the next one into memory
+        _worker_reader = (None, None)
+        _worker_reader = (path, PyPDF2.PdfReader(path))
+    return _extract_pages(_worker_reader[1], start, end)
+
+def _extract_pages(pdf_reader, start: int, end: int) -> List[Tuple[int, str]]:
+    pages = []
+    for page_num in range(start, end):
+        try:
+            pages.append((page_num + 1, pdf_reader.pages[page_num].extract_text() or ""))
+        except Exception as e:
+            print(f"Error extracting text from page {page_num + 1}: {e}")
+    return pages
+
+class PageIndex:
+    """
+    Offsets where each page's text begins in the document text
+    Built while pages are appended, so a chunk's page range is two binary searches
+    """
+    
     def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=CHUNK_SIZE,
-            chunk_overlap=CHUNK_OVERLAP,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        self.offsets: List[int] = []
+        self.page_numbers: List[int] = []
     
-    def extract_text_from_pdf(self, pdf_content: bytes) -> str:
-        """Extract text from PDF bytes"""
+    def add(self, offset: int, page_num: int):
+        """Record that page_num's text starts at offset (offsets must not decrease)"""
+        self.offsets.append(offset)
+        self.page_numbers.append(page_num)
+    
+    def page_at(self, offset: int) -> Optional[int]:
+        """Page containing the character at offset"""
+        if not self.offsets:
+            return None
+        return self.page_numbers[max(0, bisect_right(self.offsets, offset) - 1)]
+    
+    def page_metadata(self, start: int, end: int) -> Dict[str, int]:
+        """page/page_start/page_end for the text [start, end), or nothing if no pages are known"""
+        if not self.offsets:
+            return {}
+        page_start = self.page_at(start)
+        return {'page': page_start, 'page_start': page_start, 'page_end': self.page_at(max(start, end - 1))}
+
+class DocumentProcessor:
+    def __init__(self, extract_workers: int = PDF_EXTRACT_WORKERS):
+        self.chunker = TextChunker(CHUNK_SIZE, CHUNK_OVERLAP)
+        self.extract_workers = max(1, extract_workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+    
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Lazily start the extraction process pool (shared by all extractions)"""
+        with self._pool_lock:
+            if self._pool is None:
+                # The server process runs many threads by now, which forking would copy mid-state
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(max_workers=self.extract_workers, mp_context=multiprocessing.get_context(method))
+            return self._pool
+    
+    def _reset_pool(self):
+        """Drop a broken pool so the next extraction starts a fresh one"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+    
+    def iter_pages(self, pdf_content: bytes) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) for every page, in page order, as ranges finish"""
+        import PyPDF2
+        num_pages = len(PyPDF2.PdfReader(io.BytesIO(pdf_content)).pages)
+        
+        if self.extract_workers <= 1 or num_pages < PDF_PARALLEL_MIN_PAGES:
+            yield from _extract_page_range(pdf_content, 0, num_pages)
+            return
+        
+        # Several ranges per worker so one slow (image-heavy) range doesn't stall the rest
+        num_ranges = min(num_pages, self.extract_workers * 4)
+        bounds = [num_pages * i // num_ranges for i in range(num_ranges + 1)]
+        next_page = 0
+        futures = []
+        # Workers read the PDF from a spooled file instead of each task pickling the bytes
+        spool = tempfile.NamedTemporaryFile(prefix="extract-", suffix=".pdf", delete=False)
         try:
-            pdf_file = io.BytesIO(pdf_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            with spool:
+                spool.write(pdf_content)
+            pool = self._get_pool()
+            futures = [
+                pool.submit(_extract_file_range, spool.name, start, end)
+                for start, end in zip(bounds, bounds[1:])
+            ]
             
-            text = ""
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    page_text = page.extract_text()
-                    if page_text.strip():
-                        text += f"\n--- Page {page_num + 1} ---\n"
-                        text += page_text + "\n"
-                except Exception as e:
-                    print(f"Error extracting text from page {page_num + 1}: {e}")
-                    continue
-            return text.strip()
+            for future, end in zip(futures, bounds[1:]):  # Submission order == page order
+                yield from future.result()
+                next_page = end
+        except BrokenProcessPool as e:
+            print(f"PDF extraction pool failed, extracting in-process: {e}")
+            self._reset_pool()
+            yield from _extract_page_range(pdf_content, next_page, num_pages)
+        finally:
+            for future in futures:
+                future.cancel()
+            try:
+                os.remove(spool.name)
+            except OSError as e:
+                print(f"Error removing spooled PDF {spool.name}: {e}")
+    
+    @staticmethod
+    def _page_text_parts(page_num: int, page_text: str) -> List[str]:
+        """Text appended to the document for one page (empty pages contribute nothing)"""
+        if not page_text.strip():
+            return []
+        return [f"\n--- Page {page_num} ---\n", page_text + "\n"]
+    
+    def extract_pages_from_pdf(self, pdf_content: bytes) -> Tuple[str, PageIndex]:
+        """Extract text from PDF bytes, with the offset where each page's text begins"""
+        page_index = PageIndex()
+        try:
+            parts = []
+            length = 0
+            for page_num, page_text in self.iter_pages(pdf_content):
+                page_parts = self._page_text_parts(page_num, page_text)
+                if page_parts:
+                    page_index.add(length, page_num)
+                for part in page_parts:
+                    parts.append(part)
+                    length += len(part)
+            return "".join(parts), page_index
         except Exception as e:
             print(f"Error extracting text from PDF: {e}")
-            return ""
+            return "", PageIndex()
     
-    def chunk_text(self, text: str, document_name: str = "document") -> List[Dict[str, Any]]:
-        """Split text into chunks with metadata"""
+    def extract_text_from_pdf(self, pdf_content: bytes) -> str:
+        """Extract text from PDF bytes"""
+        return self.extract_pages_from_pdf(pdf_content)[0].strip()
+    
+    def chunk_text(self, text: str, document_name: str = "document", page_index: Optional[PageIndex] = None) -> List[Dict[str, Any]]:
+        """Split text into chunks with metadata (and page numbers when page_index is given)"""
         try:
-            chunks = self.text_splitter.split_text(text)
+            spans = self.chunker.split_spans(text)
             processed_chunks = []
-            for i, chunk in enumerate(chunks):
+            for i, (start, end) in enumerate(spans):
+                chunk = text[start:end]
                 # Create a hash for the chunk to avoid duplicates
                 chunk_hash = hashlib.md5(chunk.encode()).hexdigest()
                 chunk_data = {
@@ -49,24 +173,96 @@ class DocumentProcessor:
                         'document_name': document_name,
                         'chunk_index': i,
                         'chunk_hash': chunk_hash,
-                        'total_chunks': len(chunks),
-                        'chunk_length': len(chunk)
+                        'total_chunks': len(spans),
+                        'chunk_length': len(chunk),
+                        'start_offset': start,
+                        'end_offset': end
                     }
                 }
+                if page_index is not None:
+                    chunk_data['metadata'].update(page_index.page_metadata(start, end))
                 processed_chunks.append(chunk_data)
             return processed_chunks
         except Exception as e:
             print(f"Error chunking text: {e}")
             return []
     
+    def iter_chunks(
+        self,
+        pages: Iterable[Tuple[int, str]],
+        document_name: str = "document",
+        window_chars: int = CHUNK_SIZE * 20
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream chunks from a page iterator without materializing the whole document
+        
+        Page text is collected until about `window_chars` characters are pending,
+        then joined once and split. The last chunk of each split is held back and
+        re-split together with the next pages, so chunks match splitting the whole
+        text at once except where a window boundary falls. start_offset and
+        end_offset are character offsets into the whole document text, and
+        page/page_start/page_end come from a page index kept as pages arrive;
+        total_chunks is unknown while streaming and is therefore not recorded.
+        """
+        page_index = PageIndex()
+        parts: List[str] = []
+        pending = 0  # Characters in buffer plus unjoined parts
+        buffer = ""
+        buffer_offset = 0  # Document offset of buffer[0]
+        chunk_index = 0
+        
+        def make_chunk(start: int, end: int) -> Dict[str, Any]:
+            chunk = buffer[start:end]
+            return {
+                'text': chunk,
+                'metadata': {
+                    'document_name': document_name,
+                    'chunk_index': chunk_index,
+                    'chunk_hash': hashlib.md5(chunk.encode()).hexdigest(),
+                    'chunk_length': len(chunk),
+                    'start_offset': buffer_offset + start,
+                    'end_offset': buffer_offset + end,
+                    **page_index.page_metadata(buffer_offset + start, buffer_offset + end)
+                }
+            }
+        
+        for page_num, page_text in pages:
+            page_parts = self._page_text_parts(page_num, page_text)
+            if page_parts:
+                page_index.add(buffer_offset + pending, page_num)
+            for part in page_parts:
+                parts.append(part)
+                pending += len(part)
+            if pending < window_chars:
+                continue
+            
+            buffer += "".join(parts)
+            parts = []
+            spans = self.chunker.split_spans(buffer)
+            if len(spans) < 2:
+                continue
+            for start, end in spans[:-1]:
+                yield make_chunk(start, end)
+                chunk_index += 1
+            # Restart from the held-back chunk; everything before it has been emitted
+            held = spans[-1][0]
+            buffer = buffer[held:]
+            buffer_offset += held
+            pending = len(buffer)
+        
+        buffer += "".join(parts)
+        for start, end in self.chunker.split_spans(buffer):
+            yield make_chunk(start, end)
+            chunk_index += 1
+    
     def process_pdf(self, pdf_content: bytes, document_name: str) -> List[Dict[str, Any]]:
         """Complete PDF processing pipeline"""
         # Extract text
-        text = self.extract_text_from_pdf(pdf_content)
-        if not text:
+        text, page_index = self.extract_pages_from_pdf(pdf_content)
+        if not text.strip():
             return []
         # Chunk text
-        chunks = self.chunk_text(text, document_name)
+        chunks = self.chunk_text(text, document_name, page_index)
         return chunks
     
     def preprocess_text(self, text: str) -> str:
@@ -75,4 +271,11 @@ class DocumentProcessor:
         import re
         text = re.sub(r'[^\w\s\-\.\,\;\:\(\)\[\]\{\}\/\%\+\=\<\>\@\#\$\&\*\!\?]', ' ', text)
         text = ' '.join(text.split())
-        return text
\ No newline at end of file
+        return text
+    
+    def shutdown(self):
+        """Stop the extraction worker processes"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
\ No newline at end of file
@@ -0,0 +1,117 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Any, Tuple
+from config import EMBEDDING_COALESCE_WAIT_MS, EMBEDDING_COALESCE_MAX_ITEMS, EMBEDDING_MAX_CONCURRENCY
+from transport import remaining_time, DeadlineExceeded
+
+class EmbeddingBatcher:
+    """
+    Coalesces single-text embedding requests from concurrent callers
+    A dispatcher thread collects requests for up to max_wait_ms (or max_items) and
+    sends them as one batch. When no batch is in flight a lone request is sent at
+    once, so the wait only applies under load
+    """
+    
+    def __init__(
+        self,
+        client,
+        max_wait_ms: int = EMBEDDING_COALESCE_WAIT_MS,
+        max_items: int = EMBEDDING_COALESCE_MAX_ITEMS,
+        max_in_flight: int = EMBEDDING_MAX_CONCURRENCY
+    ):
+        self.client = client
+        self.endpoint_name = client.endpoint_name
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_items = max(1, max_items)
+        self._pending: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="embedding-batch")
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        
+        self.requests = 0
+        self.batches = 0
+        
+        self._dispatcher = threading.Thread(target=self._dispatch, name="embedding-batcher", daemon=True)
+        self._dispatcher.start()
+    
+    def get_embedding(self, text: str) -> List[float]:
+        """Embed one text, sharing the endpoint call with concurrent callers"""
+        future: Future = Future()
+        self._pending.put((text, future))
+        remaining = remaining_time()
+        try:
+            return future.result(timeout=max(0.0, remaining) if remaining is not None else None)
+        except FutureTimeout:
+            # The shared batch still completes for the other callers
+            raise DeadlineExceeded("Request deadline exceeded waiting for a query embedding")
+    
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Multi-text requests are already batched; send them straight through"""
+        return self.client.get_embeddings(texts)
+    
+    def _dispatch(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._pending.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.max_wait
+            
+            while len(batch) < self.max_items:
+                with self._lock:
+                    idle = self._in_flight == 0
+                if idle and self._pending.empty():
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            with self._lock:
+                self._in_flight += 1
+            self._executor.submit(self._send, batch)
+    
+    def _send(self, batch: List[Tuple[str, Future]]):
+        try:
+            # Identical texts in one window share a single input
+            unique_texts = list(dict.fromkeys(text for text, _ in batch))
+            embeddings = self.client.get_embeddings(unique_texts)
+            by_text = dict(zip(unique_texts, embeddings))
+            for text, future in batch:
+                future.set_result(by_text[text])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.requests += len(batch)
+                self.batches += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': self.requests / self.batches if self.batches else 0.0
+        }
+    
+    def shutdown(self):
+        """Stop the dispatcher once queued requests are sent"""
+        self._stop.set()
+        self._dispatcher.join(timeout=1.0)
+        while True:
+            try:
+                batch = [self._pending.get_nowait()]
+            except queue.Empty:
+                break
+            with self._lock:
+                self._in_flight += 1
+            self._send(batch)
+        self._executor.shutdown(wait=True)
\ No newline at end of file
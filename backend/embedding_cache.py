@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+from config import EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_PATH
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings
+    An in-memory LRU sits in front of an optional sqlite store that survives restarts
+    """
+    
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, db_path: Optional[str] = EMBEDDING_CACHE_PATH):
+        self.max_entries = max(1, max_entries)
+        self.db_path = db_path or None
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        if self.db_path:
+            self._initialize_db()
+    
+    def _initialize_db(self):
+        """Open (or create) the persistent sqlite tier"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"Error opening embedding cache database, using memory only: {e}")
+            self._db = None
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace so trivially different spellings share an entry"""
+        return ' '.join(text.split())
+    
+    @classmethod
+    def make_key(cls, text: str, endpoint_name: str) -> str:
+        """Cache key: hash of the endpoint name and the normalized text"""
+        raw = f"{endpoint_name}\x00{cls.normalize(text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+    
+    def _remember(self, key: str, embedding: List[float]):
+        """Insert into the LRU tier, evicting the least recently used entries (lock held)"""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+    
+    def get(self, text: str, endpoint_name: str) -> Optional[List[float]]:
+        """Return the cached embedding, or None on a miss"""
+        key = self.make_key(text, endpoint_name)
+        
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return embedding
+            
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                except Exception as e:
+                    print(f"Error reading embedding cache: {e}")
+                    row = None
+                
+                if row is not None:
+                    # Stored as packed float32
+                    embedding = array('f', row[0]).tolist()
+                    self._remember(key, embedding)
+                    self.disk_hits += 1
+                    return embedding
+            
+            self.misses += 1
+            return None
+    
+    def put(self, text: str, endpoint_name: str, embedding: List[float]):
+        """Store an embedding in both tiers"""
+        key = self.make_key(text, endpoint_name)
+        
+        with self._lock:
+            self._remember(key, list(embedding))
+            
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)",
+                        (key, array('f', embedding).tobytes(), time.time())
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Error writing embedding cache: {e}")
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hits": hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
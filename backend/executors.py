@@ -0,0 +1,50 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator
+from config import QUERY_WORKERS, INGEST_WORKERS, BATCH_QUERY_CONCURRENCY
+
+# Separate pools so long-running ingests can never starve interactive queries
+query_executor = ThreadPoolExecutor(max_workers=max(1, QUERY_WORKERS), thread_name_prefix="query")
+ingest_executor = ThreadPoolExecutor(max_workers=max(1, INGEST_WORKERS), thread_name_prefix="ingest")
+# Questions of /query/batch requests; shared so concurrent batches can't multiply the thread count
+batch_query_executor = ThreadPoolExecutor(max_workers=max(1, BATCH_QUERY_CONCURRENCY), thread_name_prefix="query-batch")
+
+async def run_in_executor(executor: ThreadPoolExecutor, func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call in the given pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+async def run_query_task(func: Callable, *args, **kwargs) -> Any:
+    """Run blocking query-path work (embedding, search, generation) in the query pool"""
+    return await run_in_executor(query_executor, func, *args, **kwargs)
+
+async def run_ingest_task(func: Callable, *args, **kwargs) -> Any:
+    """Run blocking ingestion work in the ingest pool"""
+    return await run_in_executor(ingest_executor, func, *args, **kwargs)
+
+async def iterate_in_query_pool(iterator: Iterator) -> AsyncIterator:
+    """Drive a blocking iterator from the query pool, one item at a time; closes it there when done"""
+    sentinel = object()
+    step = None
+    try:
+        while True:
+            step = query_executor.submit(next, iterator, sentinel)
+            item = await asyncio.wrap_future(step)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            # A step abandoned on client disconnect is still running; close once it returns
+            if step is None:
+                query_executor.submit(close)
+            else:
+                step.add_done_callback(lambda _: query_executor.submit(close))
+
+def shutdown_executors():
+    """Stop accepting work and wait for in-flight tasks to finish"""
+    query_executor.shutdown(wait=True)
+    batch_query_executor.shutdown(wait=True)
+    ingest_executor.shutdown(wait=True)
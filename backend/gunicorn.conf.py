@@ -0,0 +1,30 @@
+import multiprocessing
+import os
+
+# Size the pool before config is imported, so every worker sees the same API_WORKERS
+os.environ.setdefault("API_WORKERS", str(multiprocessing.cpu_count()))
+
+from config import API_HOST, API_PORT, API_WORKERS, METRICS_DIR, WARMUP_TIMEOUT_SECONDS
+
+bind = f"{API_HOST}:{API_PORT}"
+workers = API_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Each worker builds its own thread pools, connection pools and sqlite handles,
+# none of which survive a fork, so the app is imported after forking
+preload_app = False
+
+# Workers warm up before they accept traffic (only Pinecone discovery continues in the
+# background); don't kill them while they do
+timeout = int(WARMUP_TIMEOUT_SECONDS) + 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = "-"
+loglevel = "info"
+
+def on_starting(server):
+    """Clear metric files left by an earlier run before workers start writing theirs"""
+    from metrics import SharedMetrics
+    if METRICS_DIR:
+        SharedMetrics.reset(METRICS_DIR)
\ No newline at end of file
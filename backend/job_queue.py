@@ -0,0 +1,245 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, List, Optional
+from config import JOB_QUEUE_DIR, JOB_WORKERS
+
+JobHandler = Callable[[Dict[str, Any], Callable[[str, Dict[str, int]], None]], Dict[str, Any]]
+
+class JobQueue:
+    """
+    Persistent background queue for document ingestion
+    Jobs live in a sqlite database and their uploads are spooled to disk, so queued
+    work survives restarts. A fixed pool of worker threads claims jobs oldest first
+    
+    When several API processes share a queue directory, every process can submit
+    and read jobs but only the one holding the directory's lock file runs them;
+    the others stand by and take over if that process exits
+    """
+    
+    PROGRESS_FLUSH_SECONDS = 1.0  # Progress is kept in memory and written through at most this often
+    LOCK_RETRY_SECONDS = 5.0  # How often a standby process checks whether it can take over
+    
+    def __init__(self, queue_dir: str = JOB_QUEUE_DIR, workers: int = JOB_WORKERS):
+        self.queue_dir = queue_dir
+        self.upload_dir = os.path.join(queue_dir, 'uploads')
+        self.workers = max(1, workers)
+        os.makedirs(self.upload_dir, exist_ok=True)
+        
+        self._db = sqlite3.connect(os.path.join(queue_dir, 'jobs.db'), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, batch_id TEXT, document_name TEXT NOT NULL, file_path TEXT NOT NULL, "
+            "incremental INTEGER NOT NULL DEFAULT 1, status TEXT NOT NULL, stage TEXT, progress TEXT, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id)")
+        self._db.commit()
+        
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._live: Dict[str, Dict[str, Any]] = {}
+        self._lock_file = None
+    
+    def _acquire_worker_lock(self) -> bool:
+        """Try to become the process that runs this queue's jobs"""
+        try:
+            import fcntl
+        except ImportError:
+            return True  # No flock (Windows): assume a single process
+        lock_file = open(os.path.join(self.queue_dir, 'workers.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held for the life of the process; the OS releases it when the process exits
+        self._lock_file = lock_file
+        return True
+    
+    def start(self, handler: JobHandler):
+        """Start the worker threads, or stand by if another process is running this queue"""
+        if self._acquire_worker_lock():
+            self._start_workers(handler)
+            return
+        print("Ingestion jobs are run by another process; standing by")
+        threading.Thread(target=self._standby, args=(handler,), name="job-standby", daemon=True).start()
+    
+    def _standby(self, handler: JobHandler):
+        while not self._stop.wait(self.LOCK_RETRY_SECONDS):
+            if self._acquire_worker_lock():
+                print("Took over running ingestion jobs")
+                self._start_workers(handler)
+                return
+    
+    def _start_workers(self, handler: JobHandler):
+        """Requeue jobs interrupted by a restart and start the worker threads"""
+        with self._lock:
+            recovered = self._db.execute(
+                "UPDATE jobs SET status = 'queued', stage = NULL, started_at = NULL WHERE status = 'running'"
+            ).rowcount
+            self._db.commit()
+        if recovered:
+            print(f"Requeued {recovered} interrupted ingestion jobs")
+        
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(handler,), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """Stop claiming new jobs; a job cut off mid-run is requeued on the next start"""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+    
+    def submit(self, document_name: str, source: BinaryIO, incremental: bool = True, batch_id: Optional[str] = None) -> Dict[str, Any]:
+        """Spool an upload to disk and queue it"""
+        job_id = uuid.uuid4().hex
+        file_path = os.path.join(self.upload_dir, f"{job_id}.pdf")
+        partial_path = file_path + '.part'
+        try:
+            with open(partial_path, 'wb') as spooled:
+                shutil.copyfileobj(source, spooled, 1024 * 1024)
+        except Exception:
+            os.remove(partial_path)
+            raise
+        os.replace(partial_path, file_path)
+        
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, batch_id, document_name, file_path, incremental, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, batch_id, document_name, file_path, int(incremental), time.time())
+            )
+            self._db.commit()
+        with self._wakeup:
+            self._wakeup.notify()
+        return self.get(job_id)
+    
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job running and return it"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                "UPDATE jobs SET status = 'running', stage = 'queued', started_at = ? WHERE id = ?",
+                (time.time(), row['id'])
+            )
+            self._db.commit()
+            return dict(row)
+    
+    def _work(self, handler: JobHandler):
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            self._run(job, handler)
+    
+    def _run(self, job: Dict[str, Any], handler: JobHandler):
+        job_id = job['id']
+        live = {'stage': 'queued', 'progress': {}, 'flushed_at': 0.0}
+        self._live[job_id] = live
+        
+        def report(stage: str, counters: Dict[str, int]):
+            live['stage'] = stage
+            live['progress'] = counters
+            now = time.time()
+            if now - live['flushed_at'] >= self.PROGRESS_FLUSH_SECONDS:
+                live['flushed_at'] = now
+                self._update(job_id, stage=stage, progress=json.dumps(counters))
+        
+        try:
+            result = handler(job, report)
+            status = 'completed' if result.get('success') else 'failed'
+            error = None if result.get('success') else result.get('message')
+        except Exception as e:
+            print(f"Error running ingestion job {job_id}: {e}")
+            result = None
+            status = 'failed'
+            error = str(e)
+        
+        self._update(
+            job_id,
+            status=status,
+            stage='done',
+            progress=json.dumps(live['progress']),
+            result=json.dumps(result) if result is not None else None,
+            error=error,
+            finished_at=time.time()
+        )
+        self._live.pop(job_id, None)
+        try:
+            os.remove(job['file_path'])
+        except OSError:
+            pass
+    
+    def _update(self, job_id: str, **fields: Any):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+    
+    def _to_dict(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = {
+            'job_id': row['id'],
+            'batch_id': row['batch_id'],
+            'document_name': row['document_name'],
+            'incremental': bool(row['incremental']),
+            'status': row['status'],
+            'stage': row['stage'],
+            'progress': json.loads(row['progress']) if row['progress'] else {},
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+        live = self._live.get(row['id'])
+        if live is not None:
+            job['stage'] = live['stage']
+            job['progress'] = dict(live['progress'])
+        return job
+    
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Current state of a job, or None if it does not exist"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+    
+    def list_jobs(self, status: Optional[str] = None, batch_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally filtered by status or batch"""
+        conditions = []
+        params: List[Any] = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if batch_id:
+            conditions.append("batch_id = ?")
+            params.append(batch_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+    
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs in each status"""
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
\ No newline at end of file
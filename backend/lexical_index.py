@@ -0,0 +1,221 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Set
+import numpy as np
+from config import LEXICAL_INDEX_PATH
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what which who with how does do can".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms; keeps gene symbols and numbers such as egfr, t790m, 19"""
+    return [term for term in _TOKEN_PATTERN.findall(text.lower()) if term not in _STOPWORDS]
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk text, stored in sqlite
+    Postings live on disk in a (term, doc_id) keyed table, so a query only reads the
+    postings of its own terms. Chunks are keyed by the same vector IDs as the vector store
+    """
+    
+    K1 = 1.2
+    B = 0.75
+    MAX_DF_RATIO = 0.25  # Terms in more than this share of chunks are skipped in multi-term queries
+    
+    def __init__(self, db_path: Optional[str] = LEXICAL_INDEX_PATH):
+        self.db_path = db_path or ":memory:"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "doc_id INTEGER PRIMARY KEY, vector_id TEXT UNIQUE NOT NULL, document_name TEXT, "
+            "length INTEGER NOT NULL, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_document ON chunks (document_name)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, doc_id INTEGER NOT NULL, tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, doc_id)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID")
+        self._db.commit()
+        
+        self._data_version = None
+        self._refresh_counts()
+    
+    def _refresh_counts(self):
+        """
+        Reload the chunk count and total length if another connection (e.g. another
+        worker process) has committed since they were read; this connection's own
+        writes keep them current (lock held, or during __init__)
+        """
+        data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        count, total_length = self._db.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+        self._num_chunks = count
+        self._total_length = total_length
+        self._data_version = data_version
+    
+    def add(self, ids: List[str], texts: List[str], metadata: List[Dict[str, Any]]):
+        """Index chunks, replacing any already stored under the same IDs"""
+        with self._lock:
+            self._delete_ids(ids)
+            postings = []
+            new_terms = Counter()
+            for vector_id, text, meta in zip(ids, texts, metadata):
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                record = {key: value for key, value in meta.items() if key != 'text'}
+                doc_id = self._db.execute(
+                    "INSERT INTO chunks (vector_id, document_name, length, text, metadata) VALUES (?, ?, ?, ?, ?)",
+                    (vector_id, meta.get('document_name'), length, text, json.dumps(record))
+                ).lastrowid
+                postings.extend((term, doc_id, tf) for term, tf in terms.items())
+                new_terms.update(terms.keys())
+                self._num_chunks += 1
+                self._total_length += length
+            
+            self._db.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", postings)
+            self._db.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                new_terms.items()
+            )
+            self._db.commit()
+    
+    def _delete_ids(self, ids: List[str]):
+        """Remove chunks and their postings (lock held, caller commits)"""
+        postings = []
+        removed_terms = Counter()
+        for vector_id in ids:
+            row = self._db.execute("SELECT doc_id, length, text FROM chunks WHERE vector_id = ?", (vector_id,)).fetchone()
+            if row is None:
+                continue
+            doc_id, length, text = row
+            # Re-tokenizing the stored text finds the postings without a doc_id index
+            terms = set(tokenize(text))
+            postings.extend((term, doc_id) for term in terms)
+            removed_terms.update(terms)
+            self._db.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._num_chunks -= 1
+            self._total_length -= length
+        
+        self._db.executemany("DELETE FROM postings WHERE term = ? AND doc_id = ?", postings)
+        self._db.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(count, term) for term, count in removed_terms.items()])
+    
+    def stored_ids(self, ids: List[str]) -> Set[str]:
+        """The subset of ids that are indexed"""
+        if not ids:
+            return set()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT vector_id FROM chunks WHERE vector_id IN ({','.join('?' * len(ids))})", ids
+            ).fetchall()
+        return {row[0] for row in rows}
+    
+    def delete(self, ids: List[str]):
+        """Remove chunks by vector ID"""
+        with self._lock:
+            self._delete_ids(ids)
+            self._db.execute("DELETE FROM terms WHERE df <= 0")
+            self._db.commit()
+    
+    def delete_document(self, document_name: str):
+        """Remove every chunk of a document"""
+        with self._lock:
+            ids = [row[0] for row in self._db.execute(
+                "SELECT vector_id FROM chunks WHERE document_name = ?", (document_name,)
+            )]
+            self._delete_ids(ids)
+            self._db.execute("DELETE FROM terms WHERE df <= 0")
+            self._db.commit()
+    
+    def search(self, query: str, top_k: int = 5, document_names: Optional[Set[str]] = None) -> List[Dict]:
+        """Top chunks by BM25 score, as dicts with id, score, text and metadata"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or top_k <= 0:
+            return []
+        
+        with self._lock:
+            self._refresh_counts()
+            num_chunks = self._num_chunks
+            if num_chunks == 0:
+                return []
+            avg_length = self._total_length / num_chunks
+            
+            placeholders = ','.join('?' * len(terms))
+            document_frequency = dict(self._db.execute(
+                f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms
+            ).fetchall())
+            query_terms = [term for term in terms if document_frequency.get(term, 0) > 0]
+            if len(query_terms) > 1:
+                query_terms = [
+                    term for term in query_terms if document_frequency[term] <= num_chunks * self.MAX_DF_RATIO
+                ] or query_terms
+            
+            document_clause = ""
+            document_params: List[Any] = []
+            if document_names is not None:
+                document_clause = f" AND c.document_name IN ({','.join('?' * len(document_names))})"
+                document_params = list(document_names)
+            
+            doc_ids = []
+            contributions = []
+            for term in query_terms:
+                rows = self._db.execute(
+                    "SELECT p.doc_id, p.tf, c.length FROM postings p JOIN chunks c ON c.doc_id = p.doc_id "
+                    f"WHERE p.term = ?{document_clause}",
+                    (term, *document_params)
+                ).fetchall()
+                if not rows:
+                    continue
+                postings = np.asarray(rows, dtype=np.float64)
+                df = document_frequency[term]
+                idf = math.log(1 + (num_chunks - df + 0.5) / (df + 0.5))
+                tf = postings[:, 1]
+                norm = self.K1 * (1 - self.B + self.B * postings[:, 2] / avg_length)
+                doc_ids.append(postings[:, 0].astype(np.int64))
+                contributions.append(idf * tf * (self.K1 + 1) / (tf + norm))
+            
+            if not doc_ids:
+                return []
+            
+            unique_ids, inverse = np.unique(np.concatenate(doc_ids), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate(contributions))
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+            else:
+                best = np.arange(len(scores))
+            best = best[np.argsort(-scores[best])]
+            
+            top_ids = [int(unique_ids[i]) for i in best]
+            rows = self._db.execute(
+                f"SELECT doc_id, vector_id, text, metadata FROM chunks WHERE doc_id IN ({','.join('?' * len(top_ids))})",
+                top_ids
+            ).fetchall()
+        
+        by_doc_id = {row[0]: row for row in rows}
+        results = []
+        for i in best:
+            row = by_doc_id.get(int(unique_ids[i]))
+            if row is None:
+                continue
+            metadata = json.loads(row[3])
+            metadata['text'] = row[2]
+            results.append({'id': row[1], 'score': float(scores[i]), 'text': row[2], 'metadata': metadata})
+        return results
+    
+    def stats(self) -> Dict[str, Any]:
+        """Index size statistics"""
+        with self._lock:
+            self._refresh_counts()
+            num_terms = self._db.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+            return {'chunks': self._num_chunks, 'terms': num_terms, 'path': self.db_path}
\ No newline at end of file
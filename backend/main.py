@@ -1,12 +1,27 @@
+import time
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Sequence, Tuple
+import asyncio
+import json
 import logging
-import uvicorn
+import os
+import uuid
+import zipfile
+from contextlib import aclosing
 from rag_pipeline import RAGPipeline
-from config import API_HOST, API_PORT
+from job_queue import JobQueue
+from executors import run_query_task, run_ingest_task, iterate_in_query_pool, shutdown_executors
+from transport import with_deadline, iterate_with_deadline, DeadlineExceeded
+from metrics import with_timings, render_metrics, HTTP_REQUEST_SECONDS, SHARED_METRICS
+from config import (
+    API_HOST, API_PORT, API_WORKERS, API_RELOAD, BATCH_MAX_QUESTIONS, REQUEST_DEADLINE_SECONDS, WARMUP_ENABLED,
+    WARMUP_RETRY_SECONDS, VECTOR_STORE_BACKEND, STARTUP_BUDGET_SECONDS, UPLOAD_MAX_UNCOMPRESSED_BYTES
+)
 
 # Setup logger
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +41,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request, call_next):
+    """Observe request latency per route template (streamed bodies are timed to their first byte)"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        # Label by template, not raw path, so IDs in URLs don't multiply the series
+        path = route.path if route is not None else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, path, str(status))
+
 # Initialize RAG pipeline with error handling
 try:
     rag_pipeline = RAGPipeline()
@@ -34,6 +64,19 @@ except Exception as e:
     logger.error(f"Failed to initialize RAG Pipeline: {e}")
     rag_pipeline = None
 
+# Set once the critical warm-up steps have succeeded; /ready reports 503 until then
+pipeline_ready = False
+_warm_up_task: Optional[asyncio.Task] = None
+# A worker can't answer queries without these; the other steps only make first requests faster
+CRITICAL_WARMUP_STEPS = ("embedding_endpoint", "vector_store")
+
+# Background ingestion queue; workers start with the app
+try:
+    job_queue = JobQueue()
+except Exception as e:
+    logger.error(f"Failed to initialize job queue: {e}")
+    job_queue = None
+
 # Pydantic models - ALIGNED WITH FRONTEND
 class SourceModel(BaseModel):
     content: str
@@ -45,12 +88,31 @@ class QueryRequest(BaseModel):
     top_k: Optional[int] = Field(default=5, ge=1, le=20, description="Number of sources to retrieve")
     document_filter: Optional[str] = Field(default=None, description="Filter by specific document name")
     max_length: Optional[int] = Field(default=512, ge=50, le=2048, description="Maximum response length")
+    include_timings: Optional[bool] = Field(default=False, description="Return per-stage timings in milliseconds")
 
 class QueryResponse(BaseModel):
     answer: str
     sources: List[SourceModel]
     confidence: float = Field(..., ge=0.0, le=1.0)
     num_sources: int = Field(..., ge=0)
+    timings: Optional[Dict[str, float]] = None
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str] = Field(..., description="Medical questions to answer")
+    top_k: Optional[int] = Field(default=5, ge=1, le=20, description="Number of sources to retrieve per question")
+    document_filter: Optional[str] = Field(default=None, description="Filter by specific document name")
+    max_length: Optional[int] = Field(default=512, ge=50, le=2048, description="Maximum response length")
+
+class BatchQueryItem(BaseModel):
+    question: str
+    success: bool
+    result: Optional[QueryResponse] = None
+    error: Optional[str] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryItem]
+    num_questions: int
+    num_unique: int
 
 class DocumentResponse(BaseModel):
     success: bool
@@ -62,13 +124,107 @@ class HealthResponse(BaseModel):
     status: str
     message: str
     rag_pipeline: str
+    vector_store: str = "unknown"
+    ready: bool = False
     timestamp: str
 
+class JobResponse(BaseModel):
+    job_id: str
+    batch_id: Optional[str] = None
+    document_name: str
+    incremental: bool = True
+    status: str
+    stage: Optional[str] = None
+    progress: Dict[str, int] = Field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class JobBatchResponse(BaseModel):
+    batch_id: str
+    jobs: List[JobResponse]
+    skipped: List[str] = Field(default_factory=list)
+
 class ErrorResponse(BaseModel):
     error: bool = True
     message: str
     detail: Optional[str] = None
 
+def _run_ingest_job(job: Dict[str, Any], report) -> Dict[str, Any]:
+    """Ingest one spooled upload for the job queue"""
+    if rag_pipeline is None:
+        return {"success": False, "message": "RAG pipeline not available"}
+    with open(job['file_path'], 'rb') as spooled:
+        pdf_content = spooled.read()
+    return rag_pipeline.ingest_document(
+        pdf_content, job['document_name'], bool(job['incremental']), progress_callback=report
+    )
+
+@app.on_event("startup")
+async def startup_event():
+    """
+    Start the ingestion workers and warm up
+    A single worker warms up in the background, so /health answers immediately. With
+    several workers each one warms up before it accepts traffic, and only Pinecone index
+    discovery (and the vector search that waits on it) finishes in the background
+    """
+    global _warm_up_task, pipeline_ready
+    if API_WORKERS > 1 and VECTOR_STORE_BACKEND == 'local':
+        logger.warning("Each worker process keeps its own local vector index; use Pinecone with API_WORKERS > 1")
+    if SHARED_METRICS is not None:
+        SHARED_METRICS.start()
+    if rag_pipeline is not None:
+        if not WARMUP_ENABLED:
+            pipeline_ready = True
+        elif API_WORKERS > 1:
+            deferred = ["vector_store"] if rag_pipeline.vector_store_status() == "initializing" else []
+            pending = await _warm_up(skip=deferred) + deferred
+            if pending:
+                _warm_up_task = asyncio.create_task(_warm_up_in_background(pending))
+            else:
+                pipeline_ready = True
+        else:
+            _warm_up_task = asyncio.create_task(_warm_up_in_background())
+    if job_queue is not None and rag_pipeline is not None:
+        job_queue.start(_run_ingest_job)
+
+async def _warm_up(only: Optional[Sequence[str]] = None, skip: Sequence[str] = ()) -> List[str]:
+    """Run warm-up steps; returns the critical ones that failed"""
+    try:
+        report = await run_query_task(rag_pipeline.warm_up, only, skip)
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
+        return [name for name in CRITICAL_WARMUP_STEPS if (only is None or name in only) and name not in skip]
+    return [name for name in CRITICAL_WARMUP_STEPS if name in report and not report[name]['ok']]
+
+async def _warm_up_in_background(pending: Optional[Sequence[str]] = None):
+    """Warm up (or retry the `pending` steps) with backoff until the critical steps succeed, then mark the worker ready"""
+    global pipeline_ready
+    delay = 1.0
+    while True:
+        pending = await _warm_up(pending)
+        if not pending:
+            break
+        logger.error(f"Warm-up of {', '.join(pending)} failed; /ready answers 503 until it succeeds (retrying in {delay:.0f}s)")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_SECONDS)
+    pipeline_ready = True
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Let in-flight pipeline work finish before the process exits"""
+    if _warm_up_task is not None:
+        _warm_up_task.cancel()
+    if job_queue is not None:
+        job_queue.stop()
+    shutdown_executors()
+    if rag_pipeline is not None:
+        rag_pipeline.shutdown()
+    if SHARED_METRICS is not None:
+        SHARED_METRICS.stop()
+
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """Custom exception handler to return consistent error format"""
@@ -104,13 +260,28 @@ async def health_check():
         status=pipeline_status,
         message="Medical RAG API is running",
         rag_pipeline=pipeline_status,
+        vector_store=rag_pipeline.vector_store_status() if rag_pipeline is not None else "unknown",
+        ready=_is_ready(),
         timestamp=datetime.utcnow().isoformat()
     )
 
+def _is_ready() -> bool:
+    return pipeline_ready and rag_pipeline is not None and rag_pipeline.vector_store_status() == "ready"
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once this worker has warmed up and its vector store is connected"""
+    if rag_pipeline is None:
+        raise HTTPException(status_code=503, detail="RAG pipeline not available")
+    if not _is_ready():
+        raise HTTPException(status_code=503, detail=f"RAG pipeline is warming up (vector store {rag_pipeline.vector_store_status()})")
+    return {"ready": True}
+
 @app.post("/ingest", response_model=DocumentResponse)
 async def ingest_document(
     file: UploadFile = File(..., description="PDF file to ingest"),
-    document_name: Optional[str] = Form(None, description="Optional document name override")
+    document_name: Optional[str] = Form(None, description="Optional document name override"),
+    incremental: bool = Form(True, description="Only embed chunks that changed since the last upload")
 ):
     """Ingest a PDF document into the RAG system"""
     try:
@@ -134,7 +305,7 @@ async def ingest_document(
 
         # Process document
         logger.info(f"Processing document: {doc_name}")
-        result = rag_pipeline.ingest_document(pdf_content, doc_name)
+        result = await run_ingest_task(rag_pipeline.ingest_document, pdf_content, doc_name, incremental)
         
         if not result.get("success", False):
             raise HTTPException(
@@ -150,6 +321,110 @@ async def ingest_document(
         logger.exception("Unexpected error during document ingestion")
         raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
 
+def _document_name_from_path(path: str) -> str:
+    """Document name for an upload or archive member; folders are kept so nested files don't collide"""
+    return os.path.splitext(path.replace('\\', '/').strip('/'))[0].replace('/', '_')
+
+def _spool_uploads(files: List[UploadFile], incremental: bool, batch_id: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Queue every PDF in the uploads, expanding zip archives; returns (jobs, skipped names)"""
+    jobs = []
+    skipped = []
+    names = set()  # Two documents with one name would delete each other's vectors
+    
+    def submit(document_name: str, source, label: str):
+        if document_name in names:
+            logger.warning(f"Skipping {label}: another upload in this batch is also named {document_name}")
+            skipped.append(label)
+            return
+        jobs.append(job_queue.submit(document_name, source, incremental, batch_id))
+        names.add(document_name)
+    
+    for upload in files:
+        filename = upload.filename or ""
+        lowered = filename.lower()
+        
+        if lowered.endswith('.pdf'):
+            submit(_document_name_from_path(os.path.basename(filename)), upload.file, filename)
+        elif lowered.endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile:
+                skipped.append(filename)
+                continue
+            with archive:
+                members = []
+                for member in archive.infolist():
+                    name = member.filename
+                    base = os.path.basename(name)
+                    if member.is_dir() or name.startswith('__MACOSX/') or base.startswith('.'):
+                        continue
+                    if not base.lower().endswith('.pdf'):
+                        skipped.append(f"{filename}:{name}")
+                        continue
+                    members.append(member)
+                
+                # Checked before spooling anything; reads never return more than the declared sizes
+                total_size = sum(member.file_size for member in members)
+                if total_size > UPLOAD_MAX_UNCOMPRESSED_BYTES:
+                    logger.warning(f"Skipping {filename}: {total_size} bytes uncompressed exceeds {UPLOAD_MAX_UNCOMPRESSED_BYTES}")
+                    skipped.append(filename)
+                    continue
+                for member in members:
+                    try:
+                        with archive.open(member) as source:
+                            submit(_document_name_from_path(member.filename), source, f"{filename}:{member.filename}")
+                    except zipfile.BadZipFile:
+                        skipped.append(f"{filename}:{member.filename}")
+        else:
+            skipped.append(filename)
+    return jobs, skipped
+
+@app.post("/jobs", response_model=JobBatchResponse, status_code=202)
+async def submit_ingest_jobs(
+    files: List[UploadFile] = File(..., description="PDF files and/or zip archives of PDFs"),
+    incremental: bool = Form(True, description="Only embed chunks that changed since the last upload")
+):
+    """Queue PDFs for background ingestion and return their job IDs immediately"""
+    try:
+        if job_queue is None:
+            raise HTTPException(status_code=503, detail="Job queue not available")
+        
+        batch_id = uuid.uuid4().hex
+        jobs, skipped = await run_ingest_task(_spool_uploads, files, incremental, batch_id)
+        if not jobs:
+            raise HTTPException(status_code=400, detail="No PDF files found in the upload")
+        
+        logger.info(f"Queued {len(jobs)} ingestion jobs in batch {batch_id}")
+        return JobBatchResponse(batch_id=batch_id, jobs=[JobResponse(**job) for job in jobs], skipped=skipped)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error queueing ingestion jobs")
+        raise HTTPException(status_code=500, detail=f"Failed to queue documents: {str(e)}")
+
+@app.get("/jobs", response_model=List[JobResponse])
+async def list_ingest_jobs(
+    status: Optional[str] = Query(None, description="queued, running, completed or failed"),
+    batch_id: Optional[str] = Query(None, description="Only jobs from this upload batch"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """List ingestion jobs, most recent first"""
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    jobs = await run_query_task(job_queue.list_jobs, status, batch_id, limit)
+    return [JobResponse(**job) for job in jobs]
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_ingest_job(job_id: str):
+    """Status and per-stage progress of one ingestion job"""
+    if job_queue is None:
+        raise HTTPException(status_code=503, detail="Job queue not available")
+    job = await run_query_task(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobResponse(**job)
+
 @app.post("/query", response_model=QueryResponse)
 async def query_documents(request: QueryRequest):
     """Query the RAG system with a medical question"""
@@ -166,7 +441,8 @@ async def query_documents(request: QueryRequest):
         
         # Process query through RAG pipeline
         try:
-            result = rag_pipeline.query(
+            result, timings = await run_query_task(
+                with_deadline(REQUEST_DEADLINE_SECONDS, with_timings(rag_pipeline.query)),
                 question=request.question.strip(),
                 top_k=request.top_k,
                 document_filter=request.document_filter,
@@ -187,6 +463,8 @@ async def query_documents(request: QueryRequest):
         try:
             validated_result = validate_rag_response(result)
             response = QueryResponse(**validated_result)
+            if request.include_timings:
+                response.timings = timings
             
             logger.info(f"Successfully processed query. Answer length: {len(response.answer)}, Sources: {response.num_sources}")
             return response
@@ -202,6 +480,88 @@ async def query_documents(request: QueryRequest):
         logger.exception("Unexpected error during query processing")
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_documents_batch(request: BatchQueryRequest):
+    """Answer many questions in one request; results come back in input order"""
+    try:
+        if rag_pipeline is None:
+            raise HTTPException(status_code=503, detail="RAG pipeline not available")
+        
+        if not request.questions:
+            raise HTTPException(status_code=400, detail="At least one question is required")
+        if len(request.questions) > BATCH_MAX_QUESTIONS:
+            raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+        
+        logger.info(f"Processing batch of {len(request.questions)} queries")
+        results = await run_query_task(
+            rag_pipeline.query_batch,
+            questions=request.questions,
+            top_k=request.top_k,
+            document_filter=request.document_filter,
+            max_length=request.max_length
+        )
+        
+        items = []
+        for item in results:
+            if item["success"]:
+                try:
+                    item["result"] = QueryResponse(**validate_rag_response(item["result"]))
+                except Exception as validation_error:
+                    item.update(success=False, result=None, error=f"Response formatting failed: {str(validation_error)}")
+            items.append(BatchQueryItem(**item))
+        
+        return BatchQueryResponse(
+            results=items,
+            num_questions=len(items),
+            num_unique=len({" ".join(question.split()) for question in request.questions if question.strip()})
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error during batch query processing")
+        raise HTTPException(status_code=500, detail=f"Batch query processing failed: {str(e)}")
+
+@app.post("/query/stream")
+async def query_documents_stream(request: QueryRequest):
+    """
+    Query the RAG system and stream the answer as newline-delimited JSON
+    
+    Emits a "sources" event first, then "token" events as the LLM generates,
+    then a final "done" event (or an "error" event)
+    """
+    if rag_pipeline is None:
+        raise HTTPException(status_code=503, detail="RAG pipeline not available")
+        
+    if not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    
+    logger.info(f"Processing streaming query: {request.question[:100]}...")
+    
+    events = rag_pipeline.query_stream(
+        question=request.question.strip(),
+        top_k=request.top_k,
+        document_filter=request.document_filter,
+        max_length=request.max_length
+    )
+    
+    async def ndjson_events() -> AsyncIterator[str]:
+        # The deadline spans the whole stream, including token generation
+        async with aclosing(iterate_in_query_pool(iterate_with_deadline(REQUEST_DEADLINE_SECONDS, events))) as steps:
+            try:
+                async for event in steps:
+                    yield json.dumps(event) + "\n"
+            except DeadlineExceeded as e:
+                logger.warning(f"Streaming query stopped: {e}")
+                yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+    
+    return StreamingResponse(
+        ndjson_events(),
+        media_type="application/x-ndjson",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 def validate_rag_response(result: Dict[str, Any]) -> Dict[str, Any]:
     """Validate and ensure RAG response matches expected format"""
     validated = {}
@@ -287,7 +647,7 @@ async def delete_document(document_name: str):
             raise HTTPException(status_code=400, detail="Document name cannot be empty")
             
         logger.info(f"Deleting document: {document_name}")
-        result = rag_pipeline.delete_document(document_name.strip())
+        result = await run_query_task(rag_pipeline.delete_document, document_name.strip())
         
         if not result.get("success", False):
             raise HTTPException(
@@ -310,13 +670,23 @@ async def get_index_stats():
         if rag_pipeline is None:
             raise HTTPException(status_code=503, detail="RAG pipeline not available")
             
-        stats = rag_pipeline.get_index_stats()
-        return {"stats": stats, "timestamp": __import__('datetime').datetime.utcnow().isoformat()}
+        stats = await run_query_task(rag_pipeline.get_index_stats)
+        return {
+            "stats": stats,
+            "caches": rag_pipeline.get_cache_stats(),
+            "jobs": job_queue.stats() if job_queue is not None else None,
+            "timestamp": __import__('datetime').datetime.utcnow().isoformat()
+        }
         
     except Exception as e:
         logger.exception("Unexpected error fetching statistics")
         raise HTTPException(status_code=500, detail=f"Failed to fetch statistics: {str(e)}")
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Latency histograms and error counters in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -326,11 +696,17 @@ async def root():
         "status": "healthy" if rag_pipeline is not None else "RAG pipeline unavailable",
         "endpoints": {
             "health": "GET /health - Health check",
+            "ready": "GET /ready - Readiness probe (503 until warm-up finishes)",
             "ingest": "POST /ingest - Upload PDF document",  
+            "jobs": "POST /jobs - Queue PDFs or zip archives for background ingestion",
+            "job_status": "GET /jobs/{job_id} - Ingestion job status and progress",
             "query": "POST /query - Ask medical questions",
+            "query_batch": "POST /query/batch - Answer many questions in one request",
+            "query_stream": "POST /query/stream - Ask medical questions with a streamed answer (NDJSON)",
             "simple_query": "GET /query - Simple query interface",
             "delete": "DELETE /documents/{document_name} - Delete document",
             "stats": "GET /stats - Get system statistics",
+            "metrics": "GET /metrics - Prometheus latency metrics",
             "docs": "GET /docs - API documentation"
         },
         "models": {
@@ -340,12 +716,24 @@ async def root():
         }
     }
 
+# Heavy SDKs (boto3, Pinecone, PyPDF2) load on first use, which keeps this cheap
+_import_seconds = time.perf_counter() - _import_started
+if _import_seconds > STARTUP_BUDGET_SECONDS:
+    logger.warning(f"App import took {_import_seconds:.2f}s, over the {STARTUP_BUDGET_SECONDS:.2f}s startup budget")
+else:
+    logger.info(f"App imported in {_import_seconds:.2f}s")
+
 if __name__ == "__main__":
+    import uvicorn
+    if SHARED_METRICS is not None:
+        SHARED_METRICS.reset()
     uvicorn.run(
         "main:app", 
         host=API_HOST, 
         port=API_PORT, 
-        reload=True, 
+        workers=API_WORKERS,
+        # Reload watches files from a single process and can't be combined with workers
+        reload=API_RELOAD and API_WORKERS == 1, 
         log_level="info",
         access_log=True
     )
\ No newline at end of file
@@ -0,0 +1,259 @@
+import bisect
+import contextvars
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from config import METRICS_DIR, METRICS_FLUSH_SECONDS
+
+# Seconds; spans sub-millisecond cache hits up to slow generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REGISTRY: List = []
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    """Cumulative-bucket latency histogram, rendered in the Prometheus text format"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+    
+    def observe(self, value: float, *labelvalues: str):
+        # Per-bucket counts; they are summed into cumulative counts when rendered
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def snapshot(self) -> Dict[Tuple[str, ...], List]:
+        """Copy of every series: label values -> [per-bucket counts, sum, count]"""
+        with self._lock:
+            return {labels: [list(counts), total, count] for labels, (counts, total, count) in self._series.items()}
+    
+    @staticmethod
+    def merge(series: Optional[List], other: List) -> List:
+        """Sum of two snapshot series (series may be None)"""
+        if series is None:
+            return [list(other[0]), other[1], other[2]]
+        return [[a + b for a, b in zip(series[0], other[0])], series[1] + other[1], series[2] + other[2]]
+    
+    def render(self, series: Optional[Dict[Tuple[str, ...], List]] = None) -> List[str]:
+        """Text exposition of the given snapshot (this process's series by default)"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        series = self.snapshot() if series is None else series
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Counter:
+    """Monotonic counter, rendered in the Prometheus text format"""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+    
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+    
+    def snapshot(self) -> Dict[Tuple[str, ...], float]:
+        """Copy of every series: label values -> value"""
+        with self._lock:
+            return dict(self._values)
+    
+    @staticmethod
+    def merge(value: Optional[float], other: float) -> float:
+        """Sum of two snapshot values (value may be None)"""
+        return other if value is None else value + other
+    
+    def render(self, values: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        """Text exposition of the given snapshot (this process's values by default)"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        values = self.snapshot() if values is None else values
+        lines.extend(f"{self.name}{_format_labels(self.labelnames, labels)} {value}" for labels, value in sorted(values.items()))
+        return lines
+
+class SharedMetrics:
+    """
+    Metrics summed over every worker process of a server
+    Each process writes its own series to <directory>/metrics-<pid>.json every
+    flush_seconds (and whenever it renders), so /metrics on any worker reports the
+    whole server. Files of exited workers are kept so totals never go backwards;
+    reset() clears the directory when the server starts
+    """
+    
+    def __init__(self, directory: str, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.directory = directory
+        self.flush_seconds = max(0.1, flush_seconds)
+        self.path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self):
+        """Start writing this process's file in the background"""
+        if self._thread is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="metrics-flush", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop the background writer after a final write"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+    
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+    
+    def flush(self):
+        """Replace this process's file with its current series"""
+        snapshot = {metric.name: [[list(labels), data] for labels, data in metric.snapshot().items()] for metric in REGISTRY}
+        temp_path = f"{self.path}.tmp"
+        try:
+            with self._write_lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(temp_path, "w") as temp_file:
+                    json.dump(snapshot, temp_file)
+                os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Error writing metrics to {self.path}: {e}")
+    
+    def collect(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Series of every process's file, summed per metric and label values"""
+        self.flush()
+        metrics = {metric.name: metric for metric in REGISTRY}
+        merged: Dict[str, Dict[Tuple[str, ...], Any]] = {name: {} for name in metrics}
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path) as metrics_file:
+                    snapshot = json.load(metrics_file)
+            except (OSError, ValueError) as e:
+                print(f"Error reading metrics from {path}: {e}")
+                continue
+            for name, series in snapshot.items():
+                if name not in metrics:
+                    continue
+                for labels, data in series:
+                    key = tuple(labels)
+                    merged[name][key] = metrics[name].merge(merged[name].get(key), data)
+        return merged
+    
+    @staticmethod
+    def reset(directory: str = METRICS_DIR):
+        """Remove the metric files left by an earlier server run"""
+        for path in glob.glob(os.path.join(directory, "metrics-*.json*")):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error removing {path}: {e}")
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in each RAG pipeline stage", ("stage",))
+DOWNSTREAM_SECONDS = Histogram("rag_downstream_seconds", "Latency of calls to SageMaker and Pinecone", ("service", "operation"))
+DOWNSTREAM_ERRORS = Counter("rag_downstream_errors_total", "Failed calls to SageMaker and Pinecone", ("service", "operation"))
+HTTP_REQUEST_SECONDS = Histogram("rag_http_request_seconds", "HTTP request latency by route", ("method", "route", "status"))
+
+# Set when several workers share METRICS_DIR; /metrics then reports all of them
+SHARED_METRICS = SharedMetrics(METRICS_DIR) if METRICS_DIR else None
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format, summed over workers if they are shared"""
+    merged = SHARED_METRICS.collect() if SHARED_METRICS is not None else {}
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(merged.get(metric.name, {}) if SHARED_METRICS is not None else None))
+    return "\n".join(lines) + "\n"
+
+# Per-request timings (milliseconds by span name), collected only when a caller asks for them
+_timings: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("request_timings", default=None)
+_timings_lock = threading.Lock()
+
+def _record(span: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        # Batched embedding calls can finish on several pool threads at once
+        with _timings_lock:
+            timings[span] = round(timings.get(span, 0.0) + seconds * 1000, 3)
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Collect the spans recorded inside this block into the yielded dict"""
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+def with_timings(func: Callable) -> Callable:
+    """Wrap func so it returns (result, timings) for the spans it recorded"""
+    def run(*args, **kwargs):
+        with collect_timings() as timings:
+            result = func(*args, **kwargs)
+        return result, timings
+    return run
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage)
+        _record(stage, elapsed)
+
+@contextmanager
+def timed_call(service: str, operation: str) -> Iterator[None]:
+    """Time a downstream call, counting it as an error if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DOWNSTREAM_ERRORS.inc(service, operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        DOWNSTREAM_SECONDS.observe(elapsed, service, operation)
+        _record(f"{service}.{operation}", elapsed)
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage measured by the caller (e.g. spans that cross generator yields)"""
+    STAGE_SECONDS.observe(seconds, stage)
+    _record(stage, seconds)
\ No newline at end of file
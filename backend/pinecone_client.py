@@ -1,50 +1,110 @@
-import pinecone
-from pinecone import Pinecone, PodSpec
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Set
+import threading
 import uuid
 import time
-from config import PINECONE_API_KEY, PINECONE_INDEX_NAME, EMBEDDING_DIMENSION
+from config import (
+    PINECONE_API_KEY, PINECONE_INDEX_NAME, EMBEDDING_DIMENSION, PINECONE_POOL_THREADS, PINECONE_INIT_WAIT_SECONDS,
+    PINECONE_INIT_RETRY_SECONDS, PINECONE_CREATE_TIMEOUT_SECONDS
+)
+from vector_store import VectorStore, document_id_prefix
+from transport import pinecone_openapi_config, pinecone_timeout, call_timeout
+from metrics import timed_call
 
-class PineconeVectorStore:
+class PineconeVectorStore(VectorStore):
+    """
+    Vector store backed by a Pinecone index
+    The SDK import and index discovery (list, create, describe) run on a background
+    thread, so constructing the store never blocks startup. Calls made before the
+    index is connected wait for it, up to PINECONE_INIT_WAIT_SECONDS
+    """
+    
     def __init__(self):
-        self.pc = Pinecone(api_key=PINECONE_API_KEY)
+        self.pc = None
         self.index_name = PINECONE_INDEX_NAME
         self.index = None
-        self._initialize_index()
+        self.init_error: Optional[str] = None
+        self._attempted = threading.Event()
+        threading.Thread(target=self._initialize_index, name="pinecone-init", daemon=True).start()
+    
+    @property
+    def status(self) -> str:
+        """Discovery state: "ready", "initializing" or "failed" (discovery keeps retrying after a failure)"""
+        if self.index is not None:
+            return "ready"
+        return "failed" if self.init_error else "initializing"
+    
+    def _get_index(self):
+        """The connected index, waiting for discovery if it is still running"""
+        if self.index is None and not self._attempted.wait(call_timeout(PINECONE_INIT_WAIT_SECONDS, "Pinecone index discovery")):
+            raise RuntimeError("Pinecone index is still initializing")
+        if self.index is None:
+            raise RuntimeError(f"Pinecone index unavailable: {self.init_error}")
+        return self.index
     
     def _initialize_index(self):
+        """Connect to the index, creating it if needed; retries with backoff until it succeeds"""
+        backoff = 1.0
+        while True:
+            try:
+                self._connect()
+                self.init_error = None
+                return
+            except Exception as e:
+                print(f"Error initializing Pinecone index, retrying in {backoff:.0f}s: {e}")
+                self.init_error = str(e)
+            finally:
+                self._attempted.set()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, max(1.0, PINECONE_INIT_RETRY_SECONDS))
+    
+    def _connect(self):
         """Initialize or create Pinecone index"""
-        try:
-            # Check if index exists
-            existing_indexes = [index.name for index in self.pc.list_indexes()]
-            
-            if self.index_name not in existing_indexes:
-                print(f"Creating new Pinecone index: {self.index_name}")
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=EMBEDDING_DIMENSION,
-                    metric='cosine',
-                    spec=PodSpec(
-                        environment='gcp-starter',  # Use free tier
-                        pod_type='starter'
-                    )
+        from pinecone import Pinecone, PodSpec
+        from pinecone.data import Index
+        
+        if self.pc is None:
+            self.pc = Pinecone(api_key=PINECONE_API_KEY)
+        
+        # Check if index exists
+        existing_indexes = [index.name for index in self.pc.list_indexes()]
+        
+        if self.index_name not in existing_indexes:
+            print(f"Creating new Pinecone index: {self.index_name}")
+            self.pc.create_index(
+                name=self.index_name,
+                dimension=EMBEDDING_DIMENSION,
+                metric='cosine',
+                spec=PodSpec(
+                    environment='gcp-starter',  # Use free tier
+                    pod_type='starter'
                 )
-                # Wait for index to be ready
-                time.sleep(10)
-            
-            self.index = self.pc.Index(self.index_name)
-            print(f"Connected to Pinecone index: {self.index_name}")
-            
-        except Exception as e:
-            print(f"Error initializing Pinecone index: {e}")
-            raise
+            )
+        
+        # Poll until the index reports ready instead of sleeping a fixed time
+        description = self.pc.describe_index(self.index_name)
+        give_up_at = time.monotonic() + PINECONE_CREATE_TIMEOUT_SECONDS
+        while not (description.status or {}).get('ready', True):
+            if time.monotonic() > give_up_at:
+                raise TimeoutError(f"Pinecone index {self.index_name} was not ready after {PINECONE_CREATE_TIMEOUT_SECONDS:.0f}s")
+            time.sleep(1)
+            description = self.pc.describe_index(self.index_name)
+        
+        # Built directly rather than via pc.Index so the data plane gets the
+        # shared pool size, keep-alive and retry settings
+        self.index = Index(
+            api_key=PINECONE_API_KEY,
+            host=description.host,
+            pool_threads=max(1, PINECONE_POOL_THREADS),
+            openapi_config=pinecone_openapi_config(PINECONE_API_KEY, description.host)
+        )
+        print(f"Connected to Pinecone index: {self.index_name}")
     
-    def upsert_vectors(self, texts: List[str], embeddings: List[List[float]], metadata: List[Dict[str, Any]]):
+    def upsert_vectors(self, texts: List[str], embeddings: List[List[float]], metadata: List[Dict[str, Any]], ids: Optional[List[str]] = None):
         """Store vectors in Pinecone"""
         try:
             vectors = []
             for i, (text, embedding, meta) in enumerate(zip(texts, embeddings, metadata)):
-                vector_id = str(uuid.uuid4())
+                vector_id = ids[i] if ids else str(uuid.uuid4())
                 vectors.append({
                     'id': vector_id,
                     'values': embedding,
@@ -59,7 +119,8 @@ class PineconeVectorStore:
             batch_size = 100
             for i in range(0, len(vectors), batch_size):
                 batch = vectors[i:i + batch_size]
-                self.index.upsert(vectors=batch)
+                with timed_call("pinecone", "upsert"):
+                    self._get_index().upsert(vectors=batch, _request_timeout=pinecone_timeout("upsert"))
                 print(f"Upserted batch {i//batch_size + 1}/{(len(vectors) + batch_size - 1)//batch_size}")
             
             return True
@@ -71,12 +132,14 @@ class PineconeVectorStore:
     def similarity_search(self, query_embedding: List[float], top_k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict]:
         """Search for similar vectors"""
         try:
-            query_response = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                filter=filter_dict
-            )
+            with timed_call("pinecone", "query"):
+                query_response = self._get_index().query(
+                    vector=query_embedding,
+                    top_k=top_k,
+                    include_metadata=True,
+                    filter=filter_dict,
+                    _request_timeout=pinecone_timeout("query")
+                )
             
             results = []
             for match in query_response.matches:
@@ -93,19 +156,159 @@ class PineconeVectorStore:
             print(f"Error searching vectors: {e}")
             return []
     
+    @staticmethod
+    def _probe_vector() -> List[float]:
+        """Query vector for filter-only lookups; any non-zero vector works, the filter does the selection"""
+        probe = [0.0] * EMBEDDING_DIMENSION
+        probe[0] = 1.0
+        return probe
+    
+    def _iter_ids_by_timestamp(self, index, max_matches: int = 10000) -> Iterator[List[str]]:
+        """
+        Enumerate IDs with filtered queries only, for indexes without ID listing
+        (pod indexes, and pinecone-client 3.0.0 has no Index.list)
+        Every upsert stamps a 'timestamp'; ranges holding max_matches or more are
+        halved until each fits in one ids-only query
+        """
+        ranges = [(0.0, time.time() + 1.0)]
+        while ranges:
+            low, high = ranges.pop()
+            with timed_call("pinecone", "query"):
+                query_response = index.query(
+                    vector=self._probe_vector(),
+                    top_k=max_matches,
+                    include_metadata=False,
+                    include_values=False,
+                    filter={'timestamp': {'$gte': low, '$lt': high}},
+                    _request_timeout=pinecone_timeout("query")
+                )
+            if len(query_response.matches) < max_matches:
+                if query_response.matches:
+                    yield [match.id for match in query_response.matches]
+                continue
+            if high - low < 1e-3:
+                raise NotImplementedError(f"More than {max_matches} vectors share a timestamp; cannot enumerate them")
+            middle = (low + high) / 2
+            ranges.append((middle, high))
+            ranges.append((low, middle))
+    
+    def iter_vectors(self, batch_size: int = 100) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield stored vectors in batches
+        IDs come from Index.list where the SDK and index support it, otherwise from
+        timestamp-range queries; vectors stored without a timestamp are not found
+        """
+        index = self._get_index()
+        list_ids = getattr(index, 'list', None)
+        id_batches = list_ids(limit=batch_size) if list_ids is not None else self._iter_ids_by_timestamp(index)
+        
+        for id_batch in id_batches:
+            id_batch = list(id_batch)
+            for i in range(0, len(id_batch), batch_size):
+                fetched = self._fetch(id_batch[i:i + batch_size])
+                yield [
+                    {'id': vector_id, 'values': vector.values, 'metadata': vector.metadata or {}}
+                    for vector_id, vector in fetched.items()
+                ]
+    
     def delete_by_metadata(self, filter_dict: Dict):
         """Delete vectors by metadata filter"""
         try:
-            self.index.delete(filter=filter_dict)
+            with timed_call("pinecone", "delete"):
+                self._get_index().delete(filter=filter_dict, _request_timeout=pinecone_timeout("delete"))
             return True
         except Exception as e:
             print(f"Error deleting vectors: {e}")
             return False
     
+    def delete_vectors(self, ids: List[str]) -> bool:
+        """Delete vectors by ID"""
+        try:
+            # Delete in batches of 1000 (Pinecone's per-request limit)
+            batch_size = 1000
+            for i in range(0, len(ids), batch_size):
+                with timed_call("pinecone", "delete"):
+                    self._get_index().delete(ids=ids[i:i + batch_size], _request_timeout=pinecone_timeout("delete"))
+            return True
+        except Exception as e:
+            print(f"Error deleting vectors: {e}")
+            return False
+    
+    def list_document_ids(self, document_name: str) -> Optional[Set[str]]:
+        """
+        IDs stored for a document
+        Uses prefix listing where the index supports it, otherwise a filtered query,
+        which is capped at 10000 matches; None means the IDs could not all be read
+        """
+        try:
+            index = self._get_index()
+            list_ids = getattr(index, 'list', None)
+            if list_ids is not None:
+                ids = set()
+                for id_batch in list_ids(prefix=document_id_prefix(document_name)):
+                    ids.update(id_batch)
+                return ids
+            
+            max_matches = 10000
+            query_response = index.query(
+                vector=self._probe_vector(),
+                top_k=max_matches,
+                include_metadata=False,
+                include_values=False,
+                filter={'document_name': document_name},
+                _request_timeout=pinecone_timeout("query")
+            )
+            if len(query_response.matches) >= max_matches:
+                return None
+            return {match.id for match in query_response.matches}
+        except Exception as e:
+            print(f"Error listing vector IDs: {e}")
+            return None
+    
+    def _fetch(self, ids: List[str]) -> Dict[str, Any]:
+        """Fetch stored vectors by ID, 100 per request"""
+        vectors = {}
+        batch_size = 100
+        for i in range(0, len(ids), batch_size):
+            with timed_call("pinecone", "fetch"):
+                fetched = self._get_index().fetch(ids=ids[i:i + batch_size], _request_timeout=pinecone_timeout("fetch"))
+            vectors.update(fetched.vectors)
+        return vectors
+    
+    def fetch_metadata(self, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Stored metadata of the given IDs"""
+        try:
+            return {vector_id: dict(vector.metadata or {}) for vector_id, vector in self._fetch(ids).items()}
+        except Exception as e:
+            print(f"Error fetching vector metadata: {e}")
+            return None
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """
+        Re-upsert stored vectors with merged metadata
+        One fetch and one upsert per 100 vectors instead of an update call per vector
+        """
+        try:
+            ids = list(updates)
+            batch_size = 100
+            for i in range(0, len(ids), batch_size):
+                fetched = self._fetch(ids[i:i + batch_size])
+                vectors = [
+                    {'id': vector_id, 'values': vector.values, 'metadata': {**(vector.metadata or {}), **updates[vector_id]}}
+                    for vector_id, vector in fetched.items()
+                ]
+                if vectors:
+                    with timed_call("pinecone", "upsert"):
+                        self._get_index().upsert(vectors=vectors, _request_timeout=pinecone_timeout("upsert"))
+            return True
+        except Exception as e:
+            print(f"Error updating vector metadata: {e}")
+            return False
+    
     def get_index_stats(self):
         """Get index statistics"""
         try:
-            return self.index.describe_index_stats()
+            return self._get_index().describe_index_stats()
         except Exception as e:
             print(f"Error getting index stats: {e}")
             return None
\ No newline at end of file
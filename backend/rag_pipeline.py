@@ -1,39 +1,126 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Callable, Iterator, Optional, Sequence, Set, Tuple, Union
+from contextlib import nullcontext
+import copy
+import hashlib
 import logging
+import queue
+import threading
+import time
+import numpy as np
 from sagemaker_clients import SageMakerLLMClient, SageMakerEmbeddingClient
-from pinecone_client import PineconeVectorStore
+from vector_store import create_vector_store, chunk_vector_id
 from document_processor import DocumentProcessor
+from embedding_cache import EmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from answer_cache import AnswerCache
+from token_counter import get_token_counter
+from reranker import Reranker
+from lexical_index import LexicalIndex
+from transport import request_deadline
+from metrics import timed, observe_stage
+from executors import batch_query_executor
+from config import (
+    ANSWER_CACHE_ENABLED, HYBRID_SEARCH_ENABLED, RRF_K, RERANK_ENABLED, INGEST_WINDOW_SIZE, INGEST_QUEUE_DEPTH,
+    CONTEXT_PACKING, BATCH_LLM_CONCURRENCY, EMBEDDING_COALESCE_ENABLED,
+    REQUEST_DEADLINE_SECONDS, WARMUP_LLM, WARMUP_TIMEOUT_SECONDS
+)
 
 # Setup logger
 logger = logging.getLogger(__name__)
 
+class _IngestProgress:
+    """
+    Thread-safe stage and counter tracking for one ingestion, reported through a callback
+    The stages overlap, so stage is the furthest one any chunk has reached
+    """
+    
+    STAGES = ('extracting', 'embedding', 'storing', 'cleanup')
+    
+    def __init__(self, callback: Optional[Callable[[str, Dict[str, int]], None]]):
+        self.callback = callback
+        self.stage = 'extracting'
+        self.counters = {'pages_extracted': 0, 'chunks_embedded': 0, 'chunks_stored': 0}
+        self._lock = threading.Lock()
+    
+    def update(self, stage: Optional[str] = None, **counters: int):
+        with self._lock:
+            if stage and self.STAGES.index(stage) > self.STAGES.index(self.stage):
+                self.stage = stage
+            self.counters.update(counters)
+            snapshot = (self.stage, dict(self.counters))
+        self._report(*snapshot)
+    
+    def add(self, counter: str, amount: int):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+            snapshot = (self.stage, dict(self.counters))
+        self._report(*snapshot)
+    
+    def count_pages(self, pages: Iterator[Tuple[int, str]]) -> Iterator[Tuple[int, str]]:
+        for page in pages:
+            self.add('pages_extracted', 1)
+            yield page
+    
+    def _report(self, stage: str, counters: Dict[str, int]):
+        if self.callback is None:
+            return
+        try:
+            self.callback(stage, counters)
+        except Exception as e:
+            logger.warning(f"Ingest progress callback failed: {e}")
+
 class RAGPipeline:
     """
     Retrieval-Augmented Generation Pipeline for Medical Literature
     Handles document ingestion, retrieval, and answer generation
     """
     
-    def __init__(self):
-        """Initialize all RAG components"""
+    # Chunk metadata that depends on where a chunk sits in its document, not on its text
+    POSITION_FIELDS = ('chunk_index', 'chunk_id', 'start_offset', 'end_offset', 'page', 'page_start', 'page_end')
+    
+    def __init__(self, llm_client=None, embedding_client=None, vector_store=None):
+        """
+        Initialize all RAG components
+        The clients and vector store default to the configured SageMaker endpoints and
+        backend; passing stand-ins (e.g. the benchmark fakes) runs the pipeline offline
+        """
         try:
             logger.info("Initializing RAG Pipeline components...")
             
-            self.llm_client = SageMakerLLMClient()
+            self.llm_client = llm_client or SageMakerLLMClient()
             logger.info("✓ LLM client initialized")
             
-            self.embedding_client = SageMakerEmbeddingClient() 
+            self.embedding_client = embedding_client or SageMakerEmbeddingClient()
             logger.info("✓ Embedding client initialized")
             
-            self.vector_store = PineconeVectorStore()
+            # Concurrent single-query embeddings share endpoint calls
+            self.query_embedder = EmbeddingBatcher(self.embedding_client) if EMBEDDING_COALESCE_ENABLED else self.embedding_client
+            
+            # Checked against None: an empty store is falsy (its length is 0)
+            self.vector_store = vector_store if vector_store is not None else create_vector_store()
             logger.info("✓ Vector store initialized")
             
             self.doc_processor = DocumentProcessor()
             logger.info("✓ Document processor initialized")
             
+            self.embedding_cache = EmbeddingCache()
+            logger.info("✓ Embedding cache initialized")
+            
+            self.answer_cache = AnswerCache() if ANSWER_CACHE_ENABLED else None
+            logger.info(f"✓ Answer cache {'initialized' if self.answer_cache else 'disabled'}")
+            
+            self.lexical_index = LexicalIndex() if HYBRID_SEARCH_ENABLED else None
+            logger.info(f"✓ Lexical index {'initialized' if self.lexical_index else 'disabled'}")
+            
+            self.reranker = Reranker() if RERANK_ENABLED else None
+            logger.info(f"✓ Reranker {'initialized' if self.reranker else 'disabled'}")
+            
+            self.token_counter = get_token_counter()
+            logger.info(f"✓ Token counter initialized ({self.token_counter.tokenizer_name})")
+            
             # Token management constants
             self.MAX_TOTAL_TOKENS = 2048
-            self.BASE_PROMPT_TOKENS = 150  # Approximate tokens for base prompt structure
-            self.SAFETY_BUFFER = 50  # Safety buffer for token estimation
+            self.SAFETY_BUFFER = 50  # Safety buffer, only applied when token counts are estimated
             
             logger.info("RAG Pipeline initialized successfully")
             
@@ -41,21 +128,79 @@ class RAGPipeline:
             logger.error(f"Failed to initialize RAG Pipeline: {e}")
             raise RuntimeError(f"RAG Pipeline initialization failed: {str(e)}") from e
     
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, serving repeats from the embedding cache"""
+        endpoint_name = self.embedding_client.endpoint_name
+        
+        cached = self.embedding_cache.get(query, endpoint_name)
+        if cached is not None:
+            return cached
+        
+        with timed("embed_query"):
+            embedding = self.query_embedder.get_embedding(query)
+        # The client falls back to zero vectors on errors; never cache those
+        if embedding and any(embedding):
+            self.embedding_cache.put(query, endpoint_name, embedding)
+        return embedding
+    
+    def _embed_queries(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """Embed many queries, serving cached ones and embedding the rest in one batched call"""
+        endpoint_name = self.embedding_client.endpoint_name
+        embeddings: List[Optional[List[float]]] = [self.embedding_cache.get(query, endpoint_name) for query in queries]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        if missing:
+            fresh = self.embedding_client.get_embeddings([queries[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                # Zero vectors are failures; leave them for retrieval to retry and report
+                if embedding and any(embedding):
+                    self.embedding_cache.put(queries[i], endpoint_name, embedding)
+                    embeddings[i] = embedding
+        return embeddings
+    
     def _estimate_tokens(self, text: str) -> int:
         """
-        Rough estimation of token count (approximately 4 characters per token)
-        This is a conservative estimate - actual tokenization may vary
+        Token count of text under the LLM tokenizer (memoized per text)
+        Falls back to ~4 characters per token when the tokenizer is unavailable
         """
-        return len(text) // 4
+        return self.token_counter.count(text)
     
     def _truncate_context_to_fit_tokens(self, context_parts: List[str], query: str, max_new_tokens: int) -> str:
         """
         Truncate context to fit within token limits while preserving the most relevant information
         """
-        # Calculate available tokens for context
-        available_tokens = (self.MAX_TOTAL_TOKENS - max_new_tokens - 
-                          self.BASE_PROMPT_TOKENS - self.SAFETY_BUFFER - 
-                          self._estimate_tokens(query))
+        part_tokens = [self._estimate_tokens(part) for part in context_parts]
+        context, _ = self._pack_context(context_parts, part_tokens, None, query, max_new_tokens)
+        return context
+    
+    def _prompt_overhead_tokens(self, query: str) -> int:
+        """Tokens taken by everything but the context: the prompt template, the query and BOS"""
+        return self._estimate_tokens(self._create_medical_prompt(query.strip(), "")) + 1
+    
+    def _stored_token_count(self, content: str, metadata: Dict[str, Any]) -> int:
+        """Chunk token count from ingest-time metadata, counted now if missing or from another tokenizer"""
+        token_count = metadata.get('token_count')
+        if (token_count is not None and self.token_counter.exact and
+                metadata.get('tokenizer') == self.token_counter.tokenizer_name):
+            return int(token_count)
+        return self._estimate_tokens(content)
+    
+    def _pack_context(
+        self,
+        context_parts: List[str],
+        part_tokens: List[int],
+        part_scores: Optional[List[float]],
+        query: str,
+        max_new_tokens: int
+    ) -> Tuple[str, int]:
+        """
+        Choose and join context parts under the token budget using their known token counts
+        
+        Returns:
+            (context, context token count)
+        """
+        safety_buffer = 0 if self.token_counter.exact else self.SAFETY_BUFFER
+        available_tokens = self.MAX_TOTAL_TOKENS - max_new_tokens - self._prompt_overhead_tokens(query) - safety_buffer
         
         if available_tokens <= 0:
             logger.warning("Very little space available for context due to token constraints")
@@ -63,40 +208,93 @@ class RAGPipeline:
         
         logger.info(f"Available tokens for context: {available_tokens}")
         
-        # Try to fit as much context as possible, prioritizing earlier (more relevant) chunks
-        truncated_parts = []
-        current_tokens = 0
+        # Every part after the first is preceded by a blank-line separator; one extra
+        # token per part covers merges at the joins
+        separator_tokens = self._estimate_tokens("\n\n")
+        weights = [tokens + separator_tokens + 1 for tokens in part_tokens]
         
-        for i, part in enumerate(context_parts):
-            part_tokens = self._estimate_tokens(part)
-            
-            if current_tokens + part_tokens <= available_tokens:
-                # Full part fits
-                truncated_parts.append(part)
-                current_tokens += part_tokens
-            else:
-                # Try to fit a truncated version of this part
-                remaining_tokens = available_tokens - current_tokens
-                if remaining_tokens > 50:  # Only if there's reasonable space left
-                    # Estimate how much of the part we can include
-                    chars_available = remaining_tokens * 4  # Rough conversion back to characters
-                    truncated_part = part[:chars_available] + "... [truncated]"
-                    truncated_parts.append(truncated_part)
-                break
+        if CONTEXT_PACKING == 'knapsack' and part_scores is not None:
+            selected = self._knapsack_select(weights, part_scores, available_tokens)
+        else:
+            # Prioritize earlier (more relevant) chunks
+            selected = []
+            used = 0
+            for i, weight in enumerate(weights):
+                if used + weight > available_tokens:
+                    break
+                selected.append(i)
+                used += weight
+        
+        current_tokens = sum(weights[i] for i in selected)
+        parts = {i: context_parts[i] for i in selected}
+        
+        # Fill what is left with a truncated version of the best part that did not fit
+        remaining_tokens = available_tokens - current_tokens
+        leftover = [i for i in range(len(context_parts)) if i not in parts]
+        if leftover and remaining_tokens > 50:  # Only if there's reasonable space left
+            marker = "... [truncated]"
+            budget = remaining_tokens - self._estimate_tokens(marker) - separator_tokens - 1
+            parts[leftover[0]] = self.token_counter.truncate(context_parts[leftover[0]], budget) + marker
+            current_tokens = available_tokens
+        
+        result = "\n\n".join(parts[i] for i in sorted(parts))
+        logger.info(f"Context packed to {current_tokens} tokens from {len(parts)} of {len(context_parts)} parts")
+        return result, current_tokens
+    
+    def _knapsack_select(self, weights: List[int], scores: List[float], capacity: int) -> List[int]:
+        """
+        0/1 knapsack: indices of the parts with the highest total score whose weights fit the capacity
+        Scores are rescaled to [0, 1] first, since reranker logits can be negative and fusion
+        scores are tiny; non-negative scores keep their ratios
+        """
+        values = np.asarray(scores, dtype=np.float64)
+        low = min(values.min(), 0.0) if len(values) else 0.0
+        span = values.max() - low if len(values) else 0.0
+        values = (values - low) / span if span > 0 else np.ones_like(values)
+        values += 1e-6
+        best = np.zeros(capacity + 1)
+        keep = np.zeros((len(weights), capacity + 1), dtype=bool)
         
-        result = "\n\n".join(truncated_parts)
-        final_tokens = self._estimate_tokens(result)
+        for i, weight in enumerate(weights):
+            if weight > capacity:
+                continue
+            candidate = best[:capacity + 1 - weight] + values[i]
+            improved = candidate > best[weight:]
+            keep[i, weight:] = improved
+            best[weight:] = np.where(improved, candidate, best[weight:])
         
-        logger.info(f"Context truncated to {final_tokens} estimated tokens from {len(context_parts)} parts")
-        return result
+        selected = []
+        remaining = capacity
+        for i in range(len(weights) - 1, -1, -1):
+            if keep[i, remaining]:
+                selected.append(i)
+                remaining -= weights[i]
+        return sorted(selected)
     
-    def ingest_document(self, pdf_content: bytes, document_name: str) -> Dict[str, Any]:
+    def ingest_document(
+        self,
+        pdf_content: bytes,
+        document_name: str,
+        incremental: bool = True,
+        progress_callback: Optional[Callable[[str, Dict[str, int]], None]] = None
+    ) -> Dict[str, Any]:
         """
         Ingest a PDF document into the RAG system
         
+        Pages flow through extraction and chunking on a producer thread, are
+        embedded in windows of INGEST_WINDOW_SIZE chunks on the calling thread and
+        are upserted on a consumer thread, so the stages overlap and only a few
+        windows are ever held in memory
+        
+        Vector IDs are derived from the document name and chunk_hash, so in
+        incremental mode a re-ingested document only embeds chunks whose IDs are
+        not stored yet and deletes the IDs that no longer occur
+        
         Args:
             pdf_content: PDF file content as bytes
             document_name: Name identifier for the document
+            incremental: Skip chunks that are already stored; False re-embeds every chunk
+            progress_callback: Called with (stage, counters) as the document moves through the stages
             
         Returns:
             Dict with success status, message, and processing details
@@ -123,97 +321,85 @@ class RAGPipeline:
             
             document_name = document_name.strip()
             
-            # Process PDF into chunks
             logger.info(f"Processing PDF: {document_name}")
-            chunks = self.doc_processor.process_pdf(pdf_content, document_name)
+            started = time.perf_counter()
+            progress = _IngestProgress(progress_callback)
+            pages = progress.count_pages(self.doc_processor.iter_pages(pdf_content))
+            chunks = self.doc_processor.iter_chunks(pages, document_name)
             
-            if not chunks:
-                return {
-                    "success": False,
-                    "message": "No text could be extracted from the PDF",
-                    "chunks_processed": 0,
-                    "document_name": document_name
-                }
+            with timed("ingest_list_ids"):
+                existing_ids = self.vector_store.list_document_ids(document_name)
+            if existing_ids is None:
+                logger.warning(f"Cannot list stored chunks for {document_name}; re-embedding every chunk")
+            seen_ids = set()
+            moved_ids = set()
+            skip_ids = existing_ids if incremental and existing_ids else set()
+            windows = self._prepare_chunk_windows(chunks, document_name, skip_ids, seen_ids, moved_ids)
             
-            logger.info(f"Extracted {len(chunks)} chunks from document")
-            
-            # Prepare texts and metadata
-            texts = []
-            metadata_list = []
-            
-            for i, chunk in enumerate(chunks):
-                if isinstance(chunk, dict):
-                    text = chunk.get('text', '').strip()
-                    if text:  # Only include non-empty chunks
-                        texts.append(text)
-                        
-                        # Ensure metadata has required fields
-                        chunk_metadata = chunk.get('metadata', {})
-                        chunk_metadata.update({
-                            'document_name': document_name,
-                            'chunk_index': i,
-                            'chunk_id': f"{document_name}_chunk_{i}"
-                        })
-                        metadata_list.append(chunk_metadata)
-                else:
-                    logger.warning(f"Invalid chunk format at index {i}: {type(chunk)}")
-            
-            if not texts:
-                return {
-                    "success": False,
-                    "message": "No valid text chunks found in PDF",
-                    "chunks_processed": 0,
-                    "document_name": document_name
-                }
+            with timed("ingest_stages"):
+                chunks_stored, error_message = self._run_ingest_stages(windows, progress)
             
-            # Generate embeddings
-            logger.info(f"Generating embeddings for {len(texts)} chunks...")
-            try:
-                embeddings = self.embedding_client.get_embeddings(texts)
-                if not embeddings or len(embeddings) != len(texts):
-                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings) if embeddings else 0}")
-                    
-            except Exception as e:
-                logger.error(f"Failed to generate embeddings: {e}")
+            if error_message:
+                # Windows stored before the failure are searchable, so answers cached without them are stale
+                if chunks_stored or moved_ids:
+                    self._invalidate_cached_answers(document_name)
                 return {
                     "success": False,
-                    "message": f"Failed to generate embeddings: {str(e)}",
-                    "chunks_processed": 0,
+                    "message": error_message,
+                    "chunks_processed": chunks_stored,
                     "document_name": document_name
                 }
             
-            # Store vectors in Pinecone
-            logger.info("Storing vectors in Pinecone...")
-            try:
-                success = self.vector_store.upsert_vectors(texts, embeddings, metadata_list)
-                
-                if not success:
-                    return {
-                        "success": False,
-                        "message": "Failed to store vectors in Pinecone",
-                        "chunks_processed": 0,
-                        "document_name": document_name
-                    }
-                    
-            except Exception as e:
-                logger.error(f"Failed to store vectors: {e}")
+            chunks_processed = len(seen_ids)
+            if chunks_processed == 0:
                 return {
                     "success": False,
-                    "message": f"Failed to store vectors: {str(e)}",
+                    "message": "No text could be extracted from the PDF",
                     "chunks_processed": 0,
                     "document_name": document_name
                 }
             
-            logger.info(f"Successfully ingested document: {document_name} ({len(texts)} chunks)")
+            # Only delete vanished chunks once every current chunk is stored
+            stale_ids = sorted(existing_ids - seen_ids) if existing_ids else []
+            progress.update('cleanup', chunks_total=chunks_processed, chunks_removed=len(stale_ids))
+            with timed("ingest_cleanup"):
+                if stale_ids and not self.vector_store.delete_vectors(stale_ids):
+                    logger.warning(f"Failed to delete {len(stale_ids)} stale chunks of {document_name}")
+                if stale_ids and self.lexical_index:
+                    self.lexical_index.delete(stale_ids)
+                # One write for the whole document instead of one per window
+                self.vector_store.flush()
+            
+            if chunks_stored or stale_ids or moved_ids:
+                self._invalidate_cached_answers(document_name)
+            
+            chunks_unchanged = chunks_processed - chunks_stored
+            observe_stage("ingest", time.perf_counter() - started)
+            logger.info(
+                f"Successfully ingested document: {document_name} ({chunks_stored} stored, "
+                f"{chunks_unchanged} unchanged, {len(moved_ids)} moved, {len(stale_ids)} removed)"
+            )
+            if chunks_unchanged:
+                message = (
+                    f"Successfully processed {chunks_processed} chunks: stored {chunks_stored} new, "
+                    f"kept {chunks_unchanged} unchanged, removed {len(stale_ids)} stale"
+                )
+            else:
+                message = f"Successfully processed and stored {chunks_processed} chunks"
             return {
                 "success": True,
-                "message": f"Successfully processed and stored {len(texts)} chunks",
-                "chunks_processed": len(texts),
+                "message": message,
+                "chunks_processed": chunks_processed,
                 "document_name": document_name
             }
                 
         except Exception as e:
             logger.error(f"Unexpected error during document ingestion: {e}")
+            # Some chunks may have been stored before the error
+            try:
+                self._invalidate_cached_answers(document_name)
+            except Exception as invalidate_error:
+                logger.warning(f"Failed to invalidate cached answers for {document_name}: {invalidate_error}")
             return {
                 "success": False,
                 "message": f"Document processing failed: {str(e)}",
@@ -221,11 +407,256 @@ class RAGPipeline:
                 "document_name": document_name
             }
     
+    def _prepare_chunk_windows(
+        self,
+        chunks: Iterator[Dict[str, Any]],
+        document_name: str,
+        existing_ids: Set[str],
+        seen_ids: Set[str],
+        moved_ids: Set[str]
+    ) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        """
+        Group streamed chunks into (ids, texts, metadata) windows of INGEST_WINDOW_SIZE
+        Every chunk ID is added to seen_ids; chunks in existing_ids and repeats
+        within the document are left out of the windows, and chunks in existing_ids
+        are handed to _refresh_kept_chunks in batches of the same size instead
+        (which adds the IDs whose stored position it updated to moved_ids)
+        """
+        ids = []
+        texts = []
+        metadata_list = []
+        kept = []
+        
+        for chunk in chunks:
+            if not isinstance(chunk, dict):
+                logger.warning(f"Invalid chunk format: {type(chunk)}")
+                continue
+            
+            text = chunk.get('text', '').strip()
+            if not text:  # Only include non-empty chunks
+                continue
+            
+            # Ensure metadata has required fields
+            chunk_metadata = chunk.get('metadata', {})
+            chunk_hash = chunk_metadata.get('chunk_hash') or hashlib.md5(text.encode()).hexdigest()
+            vector_id = chunk_vector_id(document_name, chunk_hash)
+            if vector_id in seen_ids:
+                continue
+            seen_ids.add(vector_id)
+            if vector_id in existing_ids:
+                kept.append((vector_id, text, chunk_metadata))
+                if len(kept) >= INGEST_WINDOW_SIZE:
+                    self._refresh_kept_chunks(document_name, kept, moved_ids)
+                    kept = []
+                continue
+            
+            ids.append(vector_id)
+            texts.append(text)
+            metadata_list.append(self._complete_chunk_metadata(document_name, text, chunk_metadata))
+            
+            if len(texts) >= INGEST_WINDOW_SIZE:
+                yield ids, texts, metadata_list
+                ids = []
+                texts = []
+                metadata_list = []
+        
+        if kept:
+            self._refresh_kept_chunks(document_name, kept, moved_ids)
+        if texts:
+            yield ids, texts, metadata_list
+    
+    def _complete_chunk_metadata(
+        self, document_name: str, text: str, chunk_metadata: Dict[str, Any], count_tokens: bool = True
+    ) -> Dict[str, Any]:
+        """Add the fields every stored chunk carries to the chunker's metadata"""
+        chunk_index = chunk_metadata.get('chunk_index', 0)
+        chunk_metadata.update({
+            'document_name': document_name,
+            'chunk_index': chunk_index,
+            'chunk_id': f"{document_name}_chunk_{chunk_index}"
+        })
+        # Counted once here so query-time context packing is integer arithmetic
+        if count_tokens and self.token_counter.exact:
+            chunk_metadata['token_count'] = self.token_counter.count(text)
+            chunk_metadata['tokenizer'] = self.token_counter.tokenizer_name
+        return chunk_metadata
+    
+    def _refresh_kept_chunks(self, document_name: str, kept: List[Tuple[str, str, Dict[str, Any]]], moved_ids: Set[str]):
+        """
+        Bring already-stored chunks up to date without re-embedding them
+        Vector IDs only depend on the chunk text, so a chunk that moved (pages
+        inserted before it, say) keeps its ID; its position fields are rewritten
+        in place. Chunks missing from the lexical index, e.g. documents ingested
+        before hybrid search was enabled, are indexed
+        """
+        for _, text, meta in kept:
+            self._complete_chunk_metadata(document_name, text, meta, count_tokens=False)
+        moved = self._update_chunk_positions(kept)
+        moved_ids.update(moved)
+        
+        if not self.lexical_index:
+            return
+        try:
+            indexed = self.lexical_index.stored_ids([vector_id for vector_id, _, _ in kept])
+            # Moved chunks are re-added so lexical hits cite the new pages too
+            missing = [chunk for chunk in kept if chunk[0] not in indexed or chunk[0] in moved]
+            if not missing:
+                return
+            with timed("ingest_lexical"):
+                self.lexical_index.add(
+                    [vector_id for vector_id, _, _ in missing],
+                    [text for _, text, _ in missing],
+                    [self._complete_chunk_metadata(document_name, text, meta) for _, text, meta in missing]
+                )
+            logger.info(f"Added {len(missing)} stored chunks of {document_name} to the lexical index")
+        except Exception as e:
+            logger.warning(f"Failed to backfill lexical index: {e}")
+    
+    def _update_chunk_positions(self, kept: List[Tuple[str, str, Dict[str, Any]]]) -> Set[str]:
+        """Rewrite POSITION_FIELDS of stored chunks whose stored values differ; returns the updated IDs"""
+        try:
+            with timed("ingest_positions"):
+                stored = self.vector_store.fetch_metadata([vector_id for vector_id, _, _ in kept])
+                if stored is None:
+                    logger.warning("Cannot read stored chunk metadata; page numbers of unchanged chunks are not refreshed")
+                    return set()
+                
+                updates = {}
+                for vector_id, _, meta in kept:
+                    current = stored.get(vector_id)
+                    if current is None:
+                        continue
+                    fields = {field: meta[field] for field in self.POSITION_FIELDS if field in meta}
+                    if any(current.get(field) != value for field, value in fields.items()):
+                        updates[vector_id] = fields
+                
+                if updates and not self.vector_store.update_metadata(updates):
+                    logger.warning(f"Failed to update the positions of {len(updates)} stored chunks")
+                    return set()
+            return set(updates)
+        except Exception as e:
+            logger.warning(f"Failed to refresh stored chunk positions: {e}")
+            return set()
+    
+    def _run_ingest_stages(
+        self,
+        windows: Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]],
+        progress: "_IngestProgress"
+    ) -> Tuple[int, Optional[str]]:
+        """
+        Run extract/chunk -> embed -> upsert as overlapping stages
+        
+        Returns:
+            (chunks stored, error message or None)
+        """
+        window_queue = queue.Queue(maxsize=max(1, INGEST_QUEUE_DEPTH))
+        upsert_queue = queue.Queue(maxsize=max(1, INGEST_QUEUE_DEPTH))
+        done = object()
+        stop = threading.Event()
+        errors = []
+        stored = [0]
+        
+        def put(target: queue.Queue, item: Any) -> bool:
+            # Bounded queues give backpressure; give up if another stage failed
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def get(source: queue.Queue) -> Any:
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return done
+        
+        def produce():
+            try:
+                # Time spent pulling a window from the generator is extraction plus chunking
+                started = time.perf_counter()
+                for window in windows:
+                    observe_stage("ingest_extract", time.perf_counter() - started)
+                    if not put(window_queue, window):
+                        return
+                    started = time.perf_counter()
+            except Exception as e:
+                logger.error(f"Failed to extract and chunk document: {e}")
+                errors.append(f"Document processing failed: {str(e)}")
+                stop.set()
+            finally:
+                put(window_queue, done)
+        
+        def consume():
+            while True:
+                item = get(upsert_queue)
+                if item is done:
+                    return
+                ids, texts, embeddings, metadata_list = item
+                try:
+                    with timed("ingest_store"):
+                        success = self.vector_store.upsert_vectors(texts, embeddings, metadata_list, ids=ids)
+                except Exception as e:
+                    logger.error(f"Failed to store vectors: {e}")
+                    success = False
+                if not success:
+                    errors.append("Failed to store vectors in the vector store")
+                    stop.set()
+                    return
+                stored[0] += len(texts)
+                if self.lexical_index:
+                    try:
+                        with timed("ingest_lexical"):
+                            self.lexical_index.add(ids, texts, metadata_list)
+                    except Exception as e:
+                        logger.warning(f"Failed to update lexical index: {e}")
+                progress.update('storing', chunks_stored=stored[0])
+        
+        producer = threading.Thread(target=produce, name="ingest-extract", daemon=True)
+        consumer = threading.Thread(target=consume, name="ingest-upsert", daemon=True)
+        producer.start()
+        consumer.start()
+        
+        try:
+            while True:
+                window = get(window_queue)
+                if window is done:
+                    break
+                ids, texts, metadata_list = window
+                
+                logger.info(f"Generating embeddings for {len(texts)} chunks...")
+                progress.update('embedding')
+                with timed("ingest_embed"):
+                    embeddings = self.embedding_client.get_embeddings(texts)
+                # The client falls back to zero vectors when the endpoint fails
+                if not embeddings or len(embeddings) != len(texts) or not all(any(e) for e in embeddings):
+                    errors.append(f"Failed to generate embeddings for {len(texts)} chunks")
+                    stop.set()
+                    break
+                
+                progress.add('chunks_embedded', len(texts))
+                if not put(upsert_queue, (ids, texts, embeddings, metadata_list)):
+                    break
+        except Exception as e:
+            logger.error(f"Failed to generate embeddings: {e}")
+            errors.append(f"Failed to generate embeddings: {str(e)}")
+            stop.set()
+        finally:
+            put(upsert_queue, done)
+            producer.join()
+            consumer.join()
+        
+        return stored[0], (errors[0] if errors else None)
+    
     def retrieve_relevant_context(
         self, 
         query: str, 
         top_k: int = 5, 
-        document_filter: Optional[str] = None
+        document_filter: Optional[str] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Retrieve relevant context documents for a query
@@ -234,28 +665,41 @@ class RAGPipeline:
             query: The search query
             top_k: Number of top results to return
             document_filter: Optional document name to filter by
+            query_embedding: Precomputed embedding of the query, if already available
             
         Returns:
             List of relevant document chunks with metadata and scores
         """
+        return self._retrieve_context(query, top_k, document_filter, query_embedding)[0]
+    
+    def _retrieve_context(
+        self,
+        query: str,
+        top_k: int,
+        document_filter: Optional[str],
+        query_embedding: Optional[List[float]]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """retrieve_relevant_context, plus why retrieval failed (None when it ran, even if nothing matched)"""
         try:
             logger.info(f"Retrieving context for query: {query[:100]}...")
             
             # Validate query
             if not query or not query.strip():
                 logger.warning("Empty query provided")
-                return []
+                return [], None
             
             # Generate query embedding
             try:
-                query_embedding = self.embedding_client.get_embedding(query.strip())
-                if not query_embedding:
+                if query_embedding is None:
+                    query_embedding = self._embed_query(query.strip())
+                # The client falls back to a zero vector when the endpoint fails
+                if not query_embedding or not any(query_embedding):
                     logger.error("Failed to generate query embedding")
-                    return []
+                    return [], "Failed to generate query embedding"
                     
             except Exception as e:
                 logger.error(f"Error generating query embedding: {e}")
-                return []
+                return [], f"Failed to generate query embedding: {str(e)}"
             
             # Prepare search filter
             filter_dict = None
@@ -265,26 +709,69 @@ class RAGPipeline:
             
             # Search for similar vectors
             try:
-                results = self.vector_store.similarity_search(
-                    query_embedding=query_embedding,
-                    top_k=max(1, min(top_k, 20)),  # Ensure reasonable bounds
-                    filter_dict=filter_dict
-                )
+                top_k = max(1, min(top_k, 20))  # Ensure reasonable bounds
+                # Over-fetch when a reranker will pick the final top_k
+                fetch_k = max(top_k, self.reranker.candidates) if self.reranker else top_k
+                with timed("dense_search"):
+                    results = self.vector_store.similarity_search(
+                        query_embedding=query_embedding,
+                        top_k=fetch_k,
+                        filter_dict=filter_dict
+                    )
+                
+                if self.lexical_index:
+                    document_names = {document_filter.strip()} if filter_dict else None
+                    with timed("lexical_search"):
+                        lexical_results = self.lexical_index.search(query.strip(), fetch_k, document_names)
+                    results = self._fuse_results(results, lexical_results, fetch_k)
                 
                 if not results:
                     logger.info("No similar documents found")
-                    return []
+                    return [], None
+                
+                if self.reranker:
+                    with timed("rerank"):
+                        results = self.reranker.rerank(query.strip(), results, top_k)
                 
                 logger.info(f"Retrieved {len(results)} relevant documents")
-                return results
+                return results, None
                 
             except Exception as e:
                 logger.error(f"Error during similarity search: {e}")
-                return []
+                return [], f"Similarity search failed: {str(e)}"
             
         except Exception as e:
             logger.error(f"Unexpected error during context retrieval: {e}")
-            return []
+            return [], f"Context retrieval failed: {str(e)}"
+    
+    def _fuse_results(self, dense_results: List[Dict], lexical_results: List[Dict], top_k: int) -> List[Dict]:
+        """
+        Reciprocal rank fusion of dense and BM25 results
+        Dense hits keep their similarity score; lexical-only hits get the lowest dense
+        score in the candidate set so confidence is not inflated by BM25 scale
+        """
+        if not lexical_results:
+            return dense_results[:top_k]
+        
+        fused_scores: Dict[str, float] = {}
+        docs: Dict[str, Dict] = {}
+        for results in (dense_results, lexical_results):
+            for rank, doc in enumerate(results):
+                fused_scores[doc['id']] = fused_scores.get(doc['id'], 0.0) + 1.0 / (RRF_K + rank + 1)
+                docs.setdefault(doc['id'], doc)
+        
+        dense_ids = {doc['id'] for doc in dense_results}
+        floor_score = min((doc.get('score', 0.0) for doc in dense_results), default=0.0)
+        ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)[:top_k]
+        fused = []
+        for doc_id in ranked:
+            doc = docs[doc_id]
+            if doc_id not in dense_ids:
+                doc = {**doc, 'score': floor_score, 'bm25_score': doc.get('score', 0.0)}
+            fused.append({**doc, 'fusion_score': fused_scores[doc_id]})
+        
+        logger.info(f"Fused {len(dense_results)} dense and {len(lexical_results)} lexical results")
+        return fused
     
     def generate_answer(
         self, 
@@ -303,94 +790,140 @@ class RAGPipeline:
         Returns:
             Generated answer string
         """
+        answer, _ = self._generate_answer(query, context_docs, max_length)
+        return answer
+    
+    def _generate_answer(
+        self, 
+        query: str, 
+        context_docs: List[Dict[str, Any]], 
+        max_length: int = 512
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Generate an answer and report why it is a fallback, if it is one
+        
+        Fallback messages come with the reason generation failed (None for a real
+        LLM answer) so callers can avoid caching them and report the failure
+        """
         try:
             logger.info("Generating answer from context...")
             
             # Validate inputs
             if not query or not query.strip():
-                return "I need a valid question to provide an answer."
+                return "I need a valid question to provide an answer.", "Empty question"
             
             if not context_docs:
-                return "I couldn't find relevant information in the knowledge base to answer your question. Please try rephrasing your question or check if the relevant documents have been uploaded."
-            
-            # Prepare context from retrieved documents
-            context_parts = []
-            seen_content = set()  # Avoid duplicate content
-            
-            for i, doc in enumerate(context_docs[:10]):  # Limit context to top 10 docs
-                try:
-                    # Extract text content
-                    content = doc.get('text', '') or doc.get('content', '')
-                    if not content or content in seen_content:
-                        continue
-                    
-                    seen_content.add(content)
-                    
-                    # Get metadata
-                    metadata = doc.get('metadata', {})
-                    doc_name = metadata.get('document_name', 'Unknown Document')
-                    page_num = metadata.get('page', 'Unknown')
-                    
-                    # Format context piece
-                    context_piece = f"[Source {i+1}: {doc_name}, Page {page_num}]\n{content}"
-                    context_parts.append(context_piece)
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing context document {i}: {e}")
-                    continue
-            
-            if not context_parts:
-                return "I found some potentially relevant information, but encountered issues processing it. Please try rephrasing your question."
-            
-            # Adjust max_length based on token constraints
-            adjusted_max_length = min(max_length, 400)  # Conservative limit
-            logger.info(f"Adjusted max_length to {adjusted_max_length} to prevent token overflow")
-            
-            # Truncate context to fit within token limits
-            truncated_context = self._truncate_context_to_fit_tokens(
-                context_parts, query, adjusted_max_length
-            )
-            
-            # Create medical-focused prompt
-            prompt = self._create_medical_prompt(query.strip(), truncated_context)
+                return "I couldn't find relevant information in the knowledge base to answer your question. Please try rephrasing your question or check if the relevant documents have been uploaded.", "No context documents"
             
-            # Log prompt length for debugging
-            prompt_tokens = self._estimate_tokens(prompt)
-            total_estimated_tokens = prompt_tokens + adjusted_max_length
-            logger.info(f"Prompt tokens: ~{prompt_tokens}, Max new tokens: {adjusted_max_length}, "
-                       f"Total estimated: {total_estimated_tokens}")
-            
-            if total_estimated_tokens > self.MAX_TOTAL_TOKENS:
-                logger.warning(f"Estimated tokens ({total_estimated_tokens}) may exceed limit ({self.MAX_TOTAL_TOKENS})")
-                # Further reduce max_length as fallback
-                adjusted_max_length = max(50, self.MAX_TOTAL_TOKENS - prompt_tokens - self.SAFETY_BUFFER)
-                logger.info(f"Further adjusted max_length to {adjusted_max_length}")
+            with timed("pack_context"):
+                prompt, adjusted_max_length, fallback_message = self._build_generation_prompt(
+                    query, context_docs, max_length
+                )
+            if fallback_message:
+                return fallback_message, "No usable context in the retrieved documents"
             
             # Generate response using LLM
             try:
-                response = self.llm_client.generate_response(
-                    prompt=prompt,
-                    max_length=adjusted_max_length
-                )
+                with timed("generate"):
+                    response = self.llm_client.generate_response(
+                        prompt=prompt,
+                        max_length=adjusted_max_length
+                    )
                 
                 if not response:
-                    return "I apologize, but I couldn't generate a proper response. Please try rephrasing your question."
+                    return "I apologize, but I couldn't generate a proper response. Please try rephrasing your question.", "The LLM returned an empty response"
                 
                 # Clean and validate response
                 response = str(response).strip()
                 if len(response) < 10:  # Too short to be meaningful
-                    return "I apologize, but I couldn't generate a sufficiently detailed response to your question."
+                    return "I apologize, but I couldn't generate a sufficiently detailed response to your question.", "The LLM response was too short"
                 
                 logger.info(f"Generated answer of length: {len(response)}")
-                return response
+                # The LLM client reports endpoint failures as an "Error: ..." string
+                return response, response if response.startswith("Error: Unable to generate response") else None
                 
             except Exception as e:
                 logger.error(f"Error generating LLM response: {e}")
-                return f"I encountered an issue while generating the response. Please try again or rephrase your question."
+                return f"I encountered an issue while generating the response. Please try again or rephrase your question.", f"LLM call failed: {str(e)}"
             
         except Exception as e:
             logger.error(f"Unexpected error during answer generation: {e}")
-            return "I apologize, but I encountered an unexpected error while processing your question. Please try again."
+            return "I apologize, but I encountered an unexpected error while processing your question. Please try again.", f"Answer generation failed: {str(e)}"
+    
+    def _build_generation_prompt(
+        self, 
+        query: str, 
+        context_docs: List[Dict[str, Any]], 
+        max_length: int
+    ) -> Tuple[Optional[str], int, Optional[str]]:
+        """
+        Build the LLM prompt from retrieved documents and size max_new_tokens to fit
+        
+        Returns:
+            (prompt, adjusted max_new_tokens, fallback message if no usable context)
+        """
+        # Prepare context from retrieved documents
+        context_parts = []
+        part_tokens = []
+        part_scores = []
+        seen_content = set()  # Avoid duplicate content
+        
+        for i, doc in enumerate(context_docs[:10]):  # Limit context to top 10 docs
+            try:
+                # Extract text content
+                content = doc.get('text', '') or doc.get('content', '')
+                if not content or content in seen_content:
+                    continue
+                
+                seen_content.add(content)
+                
+                # Get metadata
+                metadata = doc.get('metadata', {})
+                doc_name = metadata.get('document_name', 'Unknown Document')
+                page_num = metadata.get('page', 'Unknown')
+                page_end = metadata.get('page_end', page_num)
+                pages = f"Page {page_num}" if page_end == page_num else f"Pages {page_num}-{page_end}"
+                
+                # Format context piece
+                header = f"[Source {i+1}: {doc_name}, {pages}]\n"
+                context_parts.append(header + content)
+                part_tokens.append(self._estimate_tokens(header) + self._stored_token_count(content, metadata))
+                # Reranker order, else the fused dense/BM25 order, else dense similarity
+                part_scores.append(doc.get('rerank_score', doc.get('fusion_score', doc.get('score', 0.0))))
+            
+            except Exception as e:
+                logger.warning(f"Error processing context document {i}: {e}")
+                continue
+        
+        if not context_parts:
+            return None, max_length, "I found some potentially relevant information, but encountered issues processing it. Please try rephrasing your question."
+        
+        # Adjust max_length based on token constraints
+        adjusted_max_length = min(max_length, 400)  # Conservative limit
+        logger.info(f"Adjusted max_length to {adjusted_max_length} to prevent token overflow")
+        
+        # Truncate context to fit within token limits
+        truncated_context, context_tokens = self._pack_context(
+            context_parts, part_tokens, part_scores, query, adjusted_max_length
+        )
+        
+        # Create medical-focused prompt
+        prompt = self._create_medical_prompt(query.strip(), truncated_context)
+        
+        # Log prompt length for debugging
+        prompt_tokens = self._prompt_overhead_tokens(query) + context_tokens
+        total_estimated_tokens = prompt_tokens + adjusted_max_length
+        logger.info(f"Prompt tokens: ~{prompt_tokens}, Max new tokens: {adjusted_max_length}, "
+                   f"Total estimated: {total_estimated_tokens}")
+        
+        if total_estimated_tokens > self.MAX_TOTAL_TOKENS:
+            logger.warning(f"Estimated tokens ({total_estimated_tokens}) may exceed limit ({self.MAX_TOTAL_TOKENS})")
+            # Further reduce max_length as fallback
+            safety_buffer = 0 if self.token_counter.exact else self.SAFETY_BUFFER
+            adjusted_max_length = max(50, self.MAX_TOTAL_TOKENS - prompt_tokens - safety_buffer)
+            logger.info(f"Further adjusted max_length to {adjusted_max_length}")
+        
+        return prompt, adjusted_max_length, None
     
     def _create_medical_prompt(self, query: str, context: str) -> str:
         """Create a well-structured prompt for medical question answering"""
@@ -430,12 +963,31 @@ ANSWER:"""
         Returns:
             Dictionary with answer, sources, confidence, and num_sources
         """
+        with timed("query"):
+            return self._run_query(question, top_k, document_filter, max_length)[0]
+    
+    def _run_query(
+        self,
+        question: str,
+        top_k: int,
+        document_filter: Optional[str],
+        max_length: int,
+        query_embedding: Optional[List[float]] = None,
+        generation_slots: Optional[threading.Semaphore] = None
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Body of query(); batch queries pass a precomputed embedding and a cap on concurrent generations
+        
+        Returns:
+            (response, why embedding, retrieval or generation failed, or None if the answer is genuine)
+        """
         try:
             logger.info(f"Processing RAG query: {question[:100]}...")
             
             # Input validation
             if not question or not question.strip():
-                return self._create_error_response("Please provide a valid medical question.")
+                message = "Please provide a valid medical question."
+                return self._create_error_response(message), message
             
             question = question.strip()
             
@@ -443,78 +995,37 @@ ANSWER:"""
             top_k = max(1, min(top_k or 5, 20))
             max_length = max(50, min(max_length or 512, 400))  # Conservative upper limit
             
+            # Step 0: Serve semantically equivalent repeats from the answer cache
+            with timed("cache_lookup"):
+                query_embedding, cached_result = self._lookup_cached_answer(
+                    question, document_filter, top_k, max_length, query_embedding
+                )
+            if cached_result is not None:
+                return cached_result, None
+            
             # Step 1: Retrieve relevant context
             logger.info(f"Retrieving top {top_k} relevant documents...")
-            context_docs = self.retrieve_relevant_context(
-                query=question,
-                top_k=top_k,
-                document_filter=document_filter
-            )
+            with timed("retrieve"):
+                context_docs, retrieval_error = self._retrieve_context(question, top_k, document_filter, query_embedding)
             
             if not context_docs:
                 return self._create_error_response(
                     "I couldn't find relevant information in the knowledge base to answer your question. "
                     "Please try rephrasing your question or ensure the relevant documents have been uploaded."
-                )
+                ), retrieval_error
             
             # Step 2: Generate answer
             logger.info(f"Generating answer from {len(context_docs)} context documents...")
-            answer = self.generate_answer(question, context_docs, max_length)
-            
-            # Step 3: Format sources for frontend
-            formatted_sources = []
-            total_score = 0.0
+            waited = time.perf_counter()
+            with generation_slots or nullcontext():
+                if generation_slots is not None:
+                    observe_stage("generation_wait", time.perf_counter() - waited)
+                answer, generation_error = self._generate_answer(question, context_docs, max_length)
             
-            for i, doc in enumerate(context_docs):
-                try:
-                    # Extract and validate content
-                    content = doc.get('text', '') or doc.get('content', '')
-                    if not content:
-                        content = "Content not available"
-                    
-                    # Extract and validate metadata
-                    metadata = doc.get('metadata', {})
-                    score = float(doc.get('score', 0.0))
-                    total_score += score
-                    
-                    # Create properly formatted source
-                    source = {
-                        "content": str(content)[:1000],  # Limit content length
-                        "metadata": {
-                            "document_name": metadata.get('document_name', 'Unknown'),
-                            "chunk_index": metadata.get('chunk_index', i),
-                            "page": metadata.get('page', 1),
-                            "chunk_id": metadata.get('chunk_id', f"chunk_{i}"),
-                            # Add any additional metadata fields
-                            **{k: v for k, v in metadata.items() 
-                               if k not in ['document_name', 'chunk_index', 'page', 'chunk_id']}
-                        },
-                        "score": score
-                    }
-                    
-                    formatted_sources.append(source)
-                    
-                except Exception as e:
-                    logger.warning(f"Error formatting source {i}: {e}")
-                    # Add a fallback source to maintain count
-                    formatted_sources.append({
-                        "content": "Error retrieving source content",
-                        "metadata": {
-                            "document_name": "Unknown",
-                            "chunk_index": i,
-                            "page": 1,
-                            "chunk_id": f"error_chunk_{i}"
-                        },
-                        "score": 0.0
-                    })
-            
-            # Step 4: Calculate confidence score
-            if len(context_docs) > 0 and total_score > 0:
-                confidence = min(1.0, max(0.0, total_score / len(context_docs)))
-            else:
-                confidence = 0.5  # Default moderate confidence
+            # Step 3: Format sources for frontend and calculate confidence
+            formatted_sources, confidence = self._format_sources(context_docs)
             
-            # Step 5: Create final response in exact format expected by FastAPI
+            # Step 4: Create final response in exact format expected by FastAPI
             result = {
                 "answer": str(answer),
                 "sources": formatted_sources,
@@ -522,17 +1033,289 @@ ANSWER:"""
                 "num_sources": int(len(formatted_sources))
             }
             
+            # Only real generations are worth reusing; fallbacks should be retried
+            if generation_error is None and query_embedding is not None and self.answer_cache is not None:
+                self.answer_cache.store(query_embedding, document_filter, top_k, max_length, result)
+            
             logger.info(f"Query processed successfully - Answer: {len(answer)} chars, "
                        f"Sources: {len(formatted_sources)}, Confidence: {confidence:.3f}")
             
-            return result
+            return result, generation_error
             
         except Exception as e:
             logger.error(f"Unexpected error in RAG query pipeline: {e}")
             logger.exception("Full exception details:")
             return self._create_error_response(
                 f"I encountered an unexpected error while processing your question: {str(e)}"
-            )
+            ), str(e)
+    
+    def query_batch(
+        self,
+        questions: List[str],
+        top_k: int = 5,
+        document_filter: Optional[str] = None,
+        max_length: int = 512
+    ) -> List[Dict[str, Any]]:
+        """
+        Answer many questions at once
+        
+        Repeated questions are answered once, all questions are embedded in one
+        batched call, retrieval runs concurrently and LLM calls are capped at
+        BATCH_LLM_CONCURRENCY in flight
+        
+        Returns:
+            One {"question", "success", "result", "error"} dict per question, in input order;
+            success is False, with the reason in error, when embedding, retrieval or generation failed
+        """
+        normalized = [EmbeddingCache.normalize(question or "") for question in questions]
+        unique_questions = list(dict.fromkeys(question for question in normalized if question))
+        logger.info(f"Processing batch of {len(questions)} questions ({len(unique_questions)} unique)")
+        
+        try:
+            embeddings = self._embed_queries(unique_questions) if unique_questions else []
+        except Exception as e:
+            logger.warning(f"Batch embedding failed, embedding per question: {e}")
+            embeddings = [None] * len(unique_questions)
+        
+        generation_slots = threading.BoundedSemaphore(max(1, BATCH_LLM_CONCURRENCY))
+        outcomes: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str]]] = {}
+        
+        def answer(question: str, embedding: Optional[List[float]]):
+            try:
+                # Each question gets its own budget from when a worker picks it up
+                with request_deadline(REQUEST_DEADLINE_SECONDS):
+                    return self._run_query(
+                        question, top_k, document_filter, max_length,
+                        query_embedding=embedding, generation_slots=generation_slots
+                    )
+            except Exception as e:
+                logger.error(f"Batch question failed: {e}")
+                return None, str(e)
+        
+        # Retrieval runs in the process-wide batch pool, which holds BATCH_QUERY_CONCURRENCY threads
+        futures = {
+            question: batch_query_executor.submit(answer, question, embedding)
+            for question, embedding in zip(unique_questions, embeddings)
+        }
+        for question, future in futures.items():
+            outcomes[question] = future.result()
+        
+        results = []
+        for question, key in zip(questions, normalized):
+            if not key:
+                results.append({"question": question, "success": False, "result": None, "error": "Question cannot be empty"})
+                continue
+            result, error = outcomes[key]
+            results.append({
+                "question": question,
+                "success": error is None,
+                # Duplicates share one answer; give each its own copy
+                "result": copy.deepcopy(result) if result is not None and error is None else None,
+                "error": error
+            })
+        return results
+    
+    def query_stream(
+        self, 
+        question: str, 
+        top_k: int = 5, 
+        document_filter: Optional[str] = None, 
+        max_length: int = 512
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of query
+        
+        Yields events in order:
+            {"type": "sources", "sources": [...], "confidence": float, "num_sources": int}
+            {"type": "token", "text": str} (repeated as the LLM generates)
+            {"type": "done", "answer": str}
+        or a single {"type": "error", "message": str} if the pipeline fails
+        """
+        try:
+            logger.info(f"Processing streaming RAG query: {question[:100]}...")
+            
+            if not question or not question.strip():
+                yield {"type": "error", "message": "Please provide a valid medical question."}
+                return
+            
+            question = question.strip()
+            top_k = max(1, min(top_k or 5, 20))
+            max_length = max(50, min(max_length or 512, 400))  # Conservative upper limit
+            
+            with timed("cache_lookup"):
+                query_embedding, cached_result = self._lookup_cached_answer(
+                    question, document_filter, top_k, max_length
+                )
+            if cached_result is not None:
+                yield from self._stream_complete_result(cached_result)
+                return
+            
+            with timed("retrieve"):
+                context_docs = self.retrieve_relevant_context(
+                    query=question,
+                    top_k=top_k,
+                    document_filter=document_filter,
+                    query_embedding=query_embedding
+                )
+            
+            if not context_docs:
+                yield from self._stream_complete_result(self._create_error_response(
+                    "I couldn't find relevant information in the knowledge base to answer your question. "
+                    "Please try rephrasing your question or ensure the relevant documents have been uploaded."
+                ))
+                return
+            
+            # Sources go out before generation starts
+            formatted_sources, confidence = self._format_sources(context_docs)
+            yield {
+                "type": "sources",
+                "sources": formatted_sources,
+                "confidence": float(confidence),
+                "num_sources": int(len(formatted_sources))
+            }
+            
+            with timed("pack_context"):
+                prompt, adjusted_max_length, fallback_message = self._build_generation_prompt(
+                    question, context_docs, max_length
+                )
+            if fallback_message:
+                yield {"type": "token", "text": fallback_message}
+                yield {"type": "done", "answer": fallback_message}
+                return
+            
+            pieces = []
+            # Measured by hand: a with-block would also count time the consumer spends between tokens
+            started = time.perf_counter()
+            generating = 0.0
+            for text in self.llm_client.generate_response_stream(prompt=prompt, max_length=adjusted_max_length):
+                generating += time.perf_counter() - started
+                if not pieces:
+                    observe_stage("first_token", generating)
+                pieces.append(text)
+                yield {"type": "token", "text": text}
+                started = time.perf_counter()
+            observe_stage("generate_stream", generating + time.perf_counter() - started)
+            
+            answer = "".join(pieces).strip()
+            yield {"type": "done", "answer": answer}
+            
+            if len(answer) >= 10 and query_embedding is not None and self.answer_cache is not None:
+                self.answer_cache.store(query_embedding, document_filter, top_k, max_length, {
+                    "answer": answer,
+                    "sources": formatted_sources,
+                    "confidence": float(confidence),
+                    "num_sources": int(len(formatted_sources))
+                })
+            
+            logger.info(f"Streaming query processed successfully - Answer: {len(answer)} chars, "
+                       f"Sources: {len(formatted_sources)}")
+            
+        except Exception as e:
+            logger.error(f"Unexpected error in streaming RAG query pipeline: {e}")
+            logger.exception("Full exception details:")
+            yield {
+                "type": "error",
+                "message": f"I encountered an unexpected error while processing your question: {str(e)}"
+            }
+    
+    def _stream_complete_result(self, result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Replay an already complete query result as stream events"""
+        yield {
+            "type": "sources",
+            "sources": result["sources"],
+            "confidence": result["confidence"],
+            "num_sources": result["num_sources"]
+        }
+        yield {"type": "token", "text": result["answer"]}
+        yield {"type": "done", "answer": result["answer"]}
+    
+    def _lookup_cached_answer(
+        self, 
+        question: str, 
+        document_filter: Optional[str], 
+        top_k: int, 
+        max_length: int,
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[Optional[List[float]], Optional[Dict[str, Any]]]:
+        """
+        Embed the question (unless an embedding is given) and check the answer cache
+        
+        Returns:
+            (query embedding or None if unavailable, cached result or None on a miss)
+        """
+        if self.answer_cache is None:
+            return query_embedding, None
+        
+        if query_embedding is None:
+            try:
+                query_embedding = self._embed_query(question)
+            except Exception as e:
+                logger.warning(f"Error embedding query for answer cache lookup: {e}")
+        
+        if not query_embedding or not any(query_embedding):
+            # Let retrieval retry the embedding and report the failure
+            return None, None
+        
+        cached_result = self.answer_cache.lookup(query_embedding, document_filter, top_k, max_length)
+        if cached_result is not None:
+            logger.info("Answer cache hit")
+        return query_embedding, cached_result
+    
+    def _format_sources(self, context_docs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], float]:
+        """Format retrieved documents as API sources and compute the confidence score"""
+        formatted_sources = []
+        total_score = 0.0
+        
+        for i, doc in enumerate(context_docs):
+            try:
+                # Extract and validate content
+                content = doc.get('text', '') or doc.get('content', '')
+                if not content:
+                    content = "Content not available"
+                
+                # Extract and validate metadata
+                metadata = doc.get('metadata', {})
+                score = float(doc.get('score', 0.0))
+                total_score += score
+                
+                # Create properly formatted source
+                source = {
+                    "content": str(content)[:1000],  # Limit content length
+                    "metadata": {
+                        "document_name": metadata.get('document_name', 'Unknown'),
+                        "chunk_index": metadata.get('chunk_index', i),
+                        "page": metadata.get('page', 1),
+                        "chunk_id": metadata.get('chunk_id', f"chunk_{i}"),
+                        # Add any additional metadata fields
+                        **{k: v for k, v in metadata.items() 
+                           if k not in ['document_name', 'chunk_index', 'page', 'chunk_id']}
+                    },
+                    "score": score
+                }
+                
+                formatted_sources.append(source)
+                
+            except Exception as e:
+                logger.warning(f"Error formatting source {i}: {e}")
+                # Add a fallback source to maintain count
+                formatted_sources.append({
+                    "content": "Error retrieving source content",
+                    "metadata": {
+                        "document_name": "Unknown",
+                        "chunk_index": i,
+                        "page": 1,
+                        "chunk_id": f"error_chunk_{i}"
+                    },
+                    "score": 0.0
+                })
+        
+        # Confidence is the mean retrieval score
+        if len(context_docs) > 0 and total_score > 0:
+            confidence = min(1.0, max(0.0, total_score / len(context_docs)))
+        else:
+            confidence = 0.5  # Default moderate confidence
+        
+        return formatted_sources, confidence
     
     def _create_error_response(self, message: str) -> Dict[str, Any]:
         """Create a standardized error response"""
@@ -549,6 +1332,9 @@ ANSWER:"""
             success = self.vector_store.delete_by_metadata({"document_name": document_name})
             
             if success:
+                if self.lexical_index:
+                    self.lexical_index.delete_document(document_name)
+                self._invalidate_cached_answers(document_name)
                 return {
                     "success": True,
                     "message": f"Successfully deleted document: {document_name}"
@@ -566,6 +1352,94 @@ ANSWER:"""
                 "message": f"Error deleting document: {str(e)}"
             }
     
+    def _invalidate_cached_answers(self, document_name: str):
+        """Drop cached answers that depend on a document that just changed"""
+        if self.answer_cache is not None:
+            removed = self.answer_cache.invalidate_documents([document_name])
+            if removed:
+                logger.info(f"Invalidated {removed} cached answers for document: {document_name}")
+    
+    def warm_up(self, only: Optional[Sequence[str]] = None, skip: Sequence[str] = ()) -> Dict[str, Dict[str, Any]]:
+        """
+        Exercise each component once before serving
+        Loads the tokenizer and reranker model and opens pooled connections to the
+        embedding endpoint and vector store, so the first user request doesn't pay
+        for them. Failures are logged and reported, never raised
+        
+        Args:
+            only: Names of the steps to run (all by default)
+            skip: Names of steps not to run
+        
+        Returns:
+            {component: {"ok": bool, "seconds": float}}
+        """
+        probe = "warm up"
+        state: Dict[str, Any] = {}
+        
+        def embed():
+            state['embedding'] = self.embedding_client.get_embeddings([probe])[0]
+            return any(state['embedding'])
+        
+        def search():
+            if 'embedding' not in state:
+                embed()
+            return self.vector_store.similarity_search(state['embedding'], top_k=1) is not None
+        
+        steps: List[Tuple[str, Callable[[], Any]]] = [
+            ("tokenizer", lambda: self.token_counter.count(probe) >= 0),
+            ("embedding_endpoint", embed),
+            ("vector_store", search),
+        ]
+        if self.lexical_index:
+            steps.append(("lexical_index", lambda: self.lexical_index.search(probe, 1) is not None))
+        if self.reranker:
+            steps.append(("reranker", lambda: self.reranker.warm_up() or True))
+        if WARMUP_LLM:
+            steps.append(("llm_endpoint", lambda: not self.llm_client.generate_response(probe, max_length=1).startswith("Error:")))
+        
+        steps = [(name, step) for name, step in steps if (only is None or name in only) and name not in skip]
+        
+        report = {}
+        with request_deadline(WARMUP_TIMEOUT_SECONDS):
+            for name, step in steps:
+                started = time.perf_counter()
+                try:
+                    ok = bool(step())
+                except Exception as e:
+                    logger.warning(f"Warm-up of {name} failed: {e}")
+                    ok = False
+                report[name] = {"ok": ok, "seconds": round(time.perf_counter() - started, 3)}
+        
+        logger.info("Warm-up finished: " + ", ".join(
+            f"{name} {'ok' if step['ok'] else 'FAILED'} ({step['seconds']}s)" for name, step in report.items()
+        ))
+        return report
+    
+    def shutdown(self):
+        """Release background resources (extraction worker processes, embedding batcher) and flush the vector store"""
+        self.doc_processor.shutdown()
+        try:
+            self.vector_store.flush()
+        except Exception as e:
+            logger.warning(f"Failed to flush the vector store: {e}")
+        if isinstance(self.query_embedder, EmbeddingBatcher):
+            self.query_embedder.shutdown()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get hit/miss statistics for the pipeline caches"""
+        return {
+            "embedding_cache": self.embedding_cache.stats(),
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else {"enabled": False},
+            "token_counts": self.token_counter.stats(),
+            "query_embedding_batches": (
+                self.query_embedder.stats() if isinstance(self.query_embedder, EmbeddingBatcher) else {"enabled": False}
+            )
+        }
+    
+    def vector_store_status(self) -> str:
+        """Vector store readiness: "ready", "initializing" or "failed"; stores without background setup are always ready"""
+        return getattr(self.vector_store, 'status', 'ready')
+    
     def get_index_stats(self) -> Dict[str, Any]:
         """Get vector store statistics"""
         try:
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import List, Dict, Any
+from config import (
+    RERANK_BACKEND, RERANK_MODEL, RERANK_CANDIDATES, RERANK_BATCH_SIZE, RERANK_TIMEOUT_MS,
+    SAGEMAKER_RERANK_ENDPOINT
+)
+
+class Reranker:
+    """
+    Reorders retrieved chunks by cross-encoder relevance to the query
+    Candidates are scored in batches in retrieval order; once the latency cap is
+    reached the remaining candidates keep their retrieval order behind the scored ones,
+    with rerank scores below the lowest one given
+    """
+    
+    def __init__(
+        self,
+        backend: str = RERANK_BACKEND,
+        model_name: str = RERANK_MODEL,
+        candidates: int = RERANK_CANDIDATES,
+        batch_size: int = RERANK_BATCH_SIZE,
+        timeout_ms: int = RERANK_TIMEOUT_MS
+    ):
+        self.backend = backend
+        self.model_name = model_name
+        self.candidates = max(1, candidates)
+        self.batch_size = max(1, batch_size)
+        self.timeout_seconds = timeout_ms / 1000.0
+        self._scorer = None
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+    
+    def _get_scorer(self):
+        """Load the scoring backend once (None if it is unavailable)"""
+        if not self._load_attempted:
+            with self._load_lock:
+                if not self._load_attempted:
+                    try:
+                        if self.backend == 'sagemaker':
+                            from sagemaker_clients import SageMakerRerankClient
+                            if not SAGEMAKER_RERANK_ENDPOINT:
+                                raise ValueError("SAGEMAKER_RERANK_ENDPOINT is not set")
+                            self._scorer = SageMakerRerankClient().score
+                        else:
+                            from sentence_transformers import CrossEncoder
+                            model = CrossEncoder(self.model_name, max_length=512, device='cpu')
+                            self._scorer = lambda query, texts: [
+                                float(score) for score in model.predict([(query, text) for text in texts], batch_size=len(texts))
+                            ]
+                        print(f"Loaded {self.backend} reranker")
+                    except Exception as e:
+                        print(f"Error loading reranker, keeping retrieval order: {e}")
+                        self._scorer = None
+                    self._load_attempted = True
+        return self._scorer
+    
+    def warm_up(self):
+        """Load the model ahead of the first query"""
+        self._get_scorer()
+    
+    def rerank(self, query: str, docs: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """Return the top_n docs by rerank score, each annotated with rerank_score"""
+        scorer = self._get_scorer()
+        if scorer is None or len(docs) <= 1:
+            return docs[:top_n]
+        
+        started = time.time()
+        deadline = started + self.timeout_seconds
+        scored = []
+        next_start = 0
+        
+        try:
+            while next_start < len(docs):
+                if scored and time.time() >= deadline:
+                    print(f"Rerank latency cap reached after {len(scored)}/{len(docs)} candidates")
+                    break
+                batch = docs[next_start:next_start + self.batch_size]
+                scores = scorer(query, [doc.get('text', '') for doc in batch])
+                scored.extend({**doc, 'rerank_score': score} for doc, score in zip(batch, scores))
+                next_start += len(batch)
+        except Exception as e:
+            print(f"Error reranking candidates: {e}")
+            if not scored:
+                return docs[:top_n]
+        
+        ranked = sorted(scored, key=lambda doc: doc['rerank_score'], reverse=True)
+        # Unscored candidates rank below every scored one, in retrieval order
+        floor = ranked[-1]['rerank_score']
+        ranked.extend({**doc, 'rerank_score': floor - 1e-3 * (i + 1)} for i, doc in enumerate(docs[len(scored):]))
+        return ranked[:top_n]
\ No newline at end of file
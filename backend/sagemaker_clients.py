@@ -1,13 +1,26 @@
-import boto3
+import contextvars
 import json
-from typing import List, Dict, Any
-from config import SAGEMAKER_LLM_ENDPOINT, SAGEMAKER_EMBEDDING_ENDPOINT, AWS_REGION
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from config import (
+    SAGEMAKER_LLM_ENDPOINT, SAGEMAKER_EMBEDDING_ENDPOINT, SAGEMAKER_RERANK_ENDPOINT,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_MAX_TOKENS, EMBEDDING_BATCH_MAX_BYTES,
+    EMBEDDING_MAX_CONCURRENCY, SAGEMAKER_LLM_READ_TIMEOUT
+)
+from transport import get_sagemaker_runtime, remaining_time, DeadlineExceeded
+from metrics import timed_call
 
 class SageMakerLLMClient:
     def __init__(self):
-        self.runtime = boto3.client('sagemaker-runtime', region_name=AWS_REGION)
         self.endpoint_name = SAGEMAKER_LLM_ENDPOINT
     
+    @property
+    def runtime(self):
+        # Resolved per call (a dict lookup) so the boto3 client is only built once it's needed
+        return get_sagemaker_runtime(self.endpoint_name, SAGEMAKER_LLM_READ_TIMEOUT)
+    
     def generate_response(self, prompt: str, max_length: int = 512) -> str:
         """Generate response using the deployed Meditron model"""
         try:
@@ -22,13 +35,13 @@ class SageMakerLLMClient:
                 }
             }
             
-            response = self.runtime.invoke_endpoint(
-                EndpointName=self.endpoint_name,
-                ContentType='application/json',
-                Body=json.dumps(payload)
-            )
-            
-            result = json.loads(response['Body'].read().decode())
+            with timed_call("sagemaker", "generate"):
+                response = self.runtime.invoke_endpoint(
+                    EndpointName=self.endpoint_name,
+                    ContentType='application/json',
+                    Body=json.dumps(payload)
+                )
+                result = json.loads(response['Body'].read().decode())
             
             # Extract generated text
             if isinstance(result, list) and len(result) > 0:
@@ -47,42 +60,201 @@ class SageMakerLLMClient:
         except Exception as e:
             print(f"Error generating response: {e}")
             return f"Error: Unable to generate response - {str(e)}"
+    
+    def _parse_stream_line(self, line: bytes) -> Optional[str]:
+        """Extract the token text from one TGI server-sent event line"""
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return None
+        
+        event = json.loads(line[len(b"data:"):].decode())
+        token = event.get('token') or {}
+        if token.get('special'):
+            return None
+        return token.get('text')
+    
+    def generate_response_stream(self, prompt: str, max_length: int = 512) -> Iterator[str]:
+        """Stream generated tokens from the deployed Meditron model as they are produced"""
+        try:
+            payload = {
+                "inputs": prompt,
+                "parameters": {
+                    "max_new_tokens": max_length,
+                    "temperature": 0.7,
+                    "do_sample": True,
+                    "top_p": 0.9,
+                    "repetition_penalty": 1.1
+                },
+                "stream": True
+            }
+            
+            # Covers the request up to the response headers, not the token stream
+            with timed_call("sagemaker", "generate_stream"):
+                response = self.runtime.invoke_endpoint_with_response_stream(
+                    EndpointName=self.endpoint_name,
+                    ContentType='application/json',
+                    Body=json.dumps(payload)
+                )
+            
+            # Payload parts are arbitrary byte slices of the SSE stream, so
+            # buffer until a full "data:{...}" line is available
+            buffer = b""
+            for event in response['Body']:
+                part = event.get('PayloadPart')
+                if not part:
+                    continue
+                
+                buffer += part.get('Bytes', b"")
+                while b"\n" in buffer:
+                    line, buffer = buffer.split(b"\n", 1)
+                    text = self._parse_stream_line(line)
+                    if text:
+                        yield text
+            
+            text = self._parse_stream_line(buffer)
+            if text:
+                yield text
+            
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            raise
 
 class SageMakerEmbeddingClient:
+    # In-flight request limits shared by every client talking to the same endpoint
+    _endpoint_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+    _endpoint_semaphores_lock = threading.Lock()
+    
     def __init__(self):
-        self.runtime = boto3.client('sagemaker-runtime', region_name=AWS_REGION)
+        self.max_concurrency = max(1, EMBEDDING_MAX_CONCURRENCY)
         self.endpoint_name = SAGEMAKER_EMBEDDING_ENDPOINT
+        self.max_batch_size = max(1, EMBEDDING_BATCH_SIZE)
+        self.max_batch_tokens = max(1, EMBEDDING_BATCH_MAX_TOKENS)
+        self.max_batch_bytes = max(1, EMBEDDING_BATCH_MAX_BYTES)
+        self._semaphore = self._get_endpoint_semaphore(self.endpoint_name, self.max_concurrency)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="embedding"
+        )
     
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings using the deployed PubMedBERT model"""
-        try:
-            embeddings = []
+    @property
+    def runtime(self):
+        return get_sagemaker_runtime(self.endpoint_name)
+    
+    @classmethod
+    def _get_endpoint_semaphore(cls, endpoint_name: str, limit: int) -> threading.BoundedSemaphore:
+        """Get the semaphore bounding concurrent requests to an endpoint"""
+        with cls._endpoint_semaphores_lock:
+            if endpoint_name not in cls._endpoint_semaphores:
+                cls._endpoint_semaphores[endpoint_name] = threading.BoundedSemaphore(limit)
+            return cls._endpoint_semaphores[endpoint_name]
+    
+    def _estimate_tokens(self, text: str) -> int:
+        """Rough token estimate (~4 characters per token), never less than one"""
+        return max(1, len(text) // 4)
+    
+    def _build_batches(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """Split texts into contiguous (start, end) ranges that fit the batch budget"""
+        batches = []
+        start = 0
+        batch_tokens = 0
+        batch_bytes = 0
+        
+        for i, text in enumerate(texts):
+            text_tokens = self._estimate_tokens(text)
+            # JSON-encoded size of the text inside the inputs list (quotes + separator)
+            text_bytes = len(json.dumps(text)) + 2
             
-            for text in texts:
-                payload = {
-                    "inputs": text
-                }
-                
+            batch_full = (
+                i - start >= self.max_batch_size or
+                batch_tokens + text_tokens > self.max_batch_tokens or
+                batch_bytes + text_bytes > self.max_batch_bytes
+            )
+            # A single oversized text still goes out on its own
+            if batch_full and i > start:
+                batches.append((start, i))
+                start = i
+                batch_tokens = 0
+                batch_bytes = 0
+            
+            batch_tokens += text_tokens
+            batch_bytes += text_bytes
+        
+        if start < len(texts):
+            batches.append((start, len(texts)))
+        
+        return batches
+    
+    def _parse_embeddings(self, result: Any, expected: int) -> List[List[float]]:
+        """Extract a list of embedding vectors from the endpoint response"""
+        if isinstance(result, dict) and 'embeddings' in result:
+            result = result['embeddings']
+        elif isinstance(result, dict) and 'vectors' in result:
+            result = result['vectors']
+        elif isinstance(result, dict):
+            # Handle different response formats
+            result = list(result.values())[0]
+        
+        if not isinstance(result, list) or not result:
+            raise ValueError(f"Unexpected embedding response format: {type(result)}")
+        
+        # A single flat vector is only valid for a single input
+        if not isinstance(result[0], list):
+            result = [result]
+        
+        if len(result) != expected:
+            raise ValueError(f"Expected {expected} embeddings, got {len(result)}")
+        
+        return result
+    
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts with a single endpoint invocation"""
+        payload = {
+            "inputs": texts
+        }
+        
+        # Waiting for a slot counts against the request budget too
+        remaining = remaining_time()
+        if not self._semaphore.acquire(timeout=max(0.0, remaining) if remaining is not None else None):
+            raise DeadlineExceeded("Request deadline exceeded waiting for an embedding slot")
+        try:
+            with timed_call("sagemaker", "embed"):
                 response = self.runtime.invoke_endpoint(
                     EndpointName=self.endpoint_name,
                     ContentType='application/json',
                     Body=json.dumps(payload)
                 )
-                
                 result = json.loads(response['Body'].read().decode())
-                
-                # Extract embedding vector
-                if isinstance(result, list):
-                    embedding = result
-                elif isinstance(result, dict) and 'embeddings' in result:
-                    embedding = result['embeddings']
-                elif isinstance(result, dict) and 'vectors' in result:
-                    embedding = result['vectors']
-                else:
-                    # Handle different response formats
-                    embedding = list(result.values())[0] if isinstance(result, dict) else result
-                
-                embeddings.append(embedding)
+        finally:
+            self._semaphore.release()
+        
+        return self._parse_embeddings(result, len(texts))
+    
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings using the deployed PubMedBERT model"""
+        try:
+            batches = self._build_batches(texts)
+            if not batches:
+                return []
+            if len(batches) == 1:
+                # Nothing to fan out; skip the pool round trip
+                return self._embed_batch(texts)
+            
+            embeddings = []
+            pending = deque()
+            # Keep at most two rounds of batches in flight so huge documents
+            # don't queue every request (and its payload) up front
+            max_pending = self.max_concurrency * 2
+            
+            # Futures are drained in submission order, so results keep input order
+            for start, end in batches:
+                if len(pending) >= max_pending:
+                    embeddings.extend(pending.popleft().result())
+                # Each batch carries the caller's request deadline into the pool
+                context = contextvars.copy_context()
+                pending.append(self._executor.submit(context.run, self._embed_batch, texts[start:end]))
+            
+            while pending:
+                embeddings.extend(pending.popleft().result())
             
             return embeddings
             
@@ -93,4 +265,31 @@ class SageMakerEmbeddingClient:
     
     def get_embedding(self, text: str) -> List[float]:
         """Generate single embedding"""
-        return self.get_embeddings([text])[0]
\ No newline at end of file
+        return self.get_embeddings([text])[0]
+
+class SageMakerRerankClient:
+    """Scores (query, passage) pairs with a cross-encoder deployed behind TEI's rerank API"""
+    
+    def __init__(self, endpoint_name: str = SAGEMAKER_RERANK_ENDPOINT):
+        self.endpoint_name = endpoint_name
+    
+    @property
+    def runtime(self):
+        return get_sagemaker_runtime(self.endpoint_name)
+    
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        """Relevance score for each text, in input order"""
+        payload = {"query": query, "texts": texts, "truncate": True}
+        
+        with timed_call("sagemaker", "rerank"):
+            response = self.runtime.invoke_endpoint(
+                EndpointName=self.endpoint_name,
+                ContentType='application/json',
+                Body=json.dumps(payload)
+            )
+            result = json.loads(response['Body'].read().decode())
+        # TEI returns [{"index": i, "score": s}, ...] sorted by score
+        scores = [0.0] * len(texts)
+        for item in result:
+            scores[item['index']] = float(item['score'])
+        return scores
\ No newline at end of file
@@ -0,0 +1,193 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from config import CHUNK_SIZE, CHUNK_OVERLAP
+
+Span = Tuple[int, int]
+
+class _SeparatorIndex:
+    """
+    Sorted offsets of each separator in a text range, found with vectorized
+    comparisons over its code points, plus the gaps between consecutive
+    occurrences that are at least chunk_size long
+    """
+    
+    def __init__(self, text: str, start: int, end: int, chunk_size: int):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.chunk_size = chunk_size
+        self._codes = None
+        self._char_positions: Dict[str, np.ndarray] = {}
+        self._occurrences: Dict[str, Tuple[List[int], List[int], bool]] = {}
+    
+    def _positions_of(self, char: str) -> np.ndarray:
+        """Offsets (relative to start) of every occurrence of a single character"""
+        if char not in self._char_positions:
+            if self._codes is None:
+                # One code point per element, so array indices are string offsets
+                text = self.text[self.start:self.end]
+                if text.isascii():
+                    self._codes = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+                else:
+                    self._codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+            self._char_positions[char] = np.flatnonzero(self._codes == ord(char))
+        return self._char_positions[char]
+    
+    def lookup(self, separator: str, start: int) -> Optional[Tuple[List[int], List[int]]]:
+        """
+        (positions, indexes g where positions[g + 1] - positions[g] >= chunk_size)
+        for a scan of the range beginning at start, or None when occurrences overlap
+        and start is not where the index begins, so they depend on where a scan starts
+        """
+        if separator not in self._occurrences:
+            # Multi-character matches are filtered from the occurrences of their first character
+            width = len(separator)
+            relative = self._positions_of(separator[0])
+            relative = relative[relative <= len(self._codes) - width]
+            for i in range(1, width):
+                relative = relative[self._codes[relative + i] == ord(separator[i])]
+            overlapping = width > 1 and bool((np.diff(relative) < width).any())
+            if overlapping:
+                # Keep the occurrences a left-to-right scan from the start of the index finds
+                kept = []
+                next_free = -1
+                for position in relative.tolist():
+                    if position >= next_free:
+                        kept.append(position)
+                        next_free = position + width
+                relative = np.asarray(kept, dtype=np.int64)
+            positions = relative + self.start
+            self._occurrences[separator] = (positions.tolist(), np.flatnonzero(np.diff(positions) >= self.chunk_size).tolist(), overlapping)
+        positions, long_gaps, overlapping = self._occurrences[separator]
+        if overlapping and start != self.start:
+            return None
+        return positions, long_gaps
+
+class TextChunker:
+    """
+    Recursive character chunker working on (start, end) offsets into the text
+    Produces the same chunks as langchain's RecursiveCharacterTextSplitter with
+    length_function=len and kept separators, without slicing the text into
+    pieces: separator offsets are located once per document, and chunk
+    boundaries are found by binary search over them instead of merging pieces
+    one at a time
+    """
+    
+    SEPARATORS = ("\n\n", "\n", " ", "")
+    
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP, separators: Sequence[str] = SEPARATORS):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Chunk overlap ({chunk_overlap}) is larger than the chunk size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = tuple(separators)
+    
+    def split_spans(self, text: str, start: int = 0, end: int = -1) -> List[Span]:
+        """(start, end) offsets of the chunks of text[start:end], whitespace-trimmed, in order"""
+        end = len(text) if end < 0 else end
+        spans: List[Span] = []
+        if end > start:
+            index = _SeparatorIndex(text, start, end, self.chunk_size)
+            self._split(text, index, start, end, self.separators, spans)
+        return spans
+    
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.split_spans(text)]
+    
+    def _split(self, text: str, index: _SeparatorIndex, start: int, end: int, separators: Sequence[str], spans: List[Span]):
+        # The first separator present in the range splits it; later ones split pieces that are still too long
+        separator = separators[-1]
+        remaining: Sequence[str] = ()
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+        
+        located = index.lookup(separator, start) if separator else None
+        if located is not None:
+            bounds, long_pieces = self._indexed_pieces(located, start, end, end - len(separator) + 1)
+        else:
+            bounds = self._scanned_bounds(text, start, end, separator)
+            long_pieces = [i for i in range(len(bounds) - 1) if bounds[i + 1] - bounds[i] >= self.chunk_size]
+        
+        # Pieces of at least chunk_size are split further; runs of shorter pieces between them are merged
+        run_start = 0
+        for piece in long_pieces:
+            if piece > run_start:
+                self._merge(text, bounds, run_start, piece, spans)
+            if remaining:
+                self._split(text, index, bounds[piece], bounds[piece + 1], remaining, spans)
+            else:
+                spans.append((bounds[piece], bounds[piece + 1]))
+            run_start = piece + 1
+        if run_start < len(bounds) - 1:
+            self._merge(text, bounds, run_start, len(bounds) - 1, spans)
+    
+    def _indexed_pieces(self, located: Tuple[List[int], List[int]], start: int, end: int, last_position: int) -> Tuple[List[int], List[int]]:
+        """Piece bounds of text[start:end] (see _scanned_bounds) and the pieces at least chunk_size long"""
+        positions, long_gaps = located
+        # Only occurrences that end inside the range split it
+        lo = bisect_left(positions, start)
+        hi = bisect_left(positions, last_position)
+        head = [] if positions[lo] == start else [start]
+        bounds = head + positions[lo:hi] + [end]
+        
+        # Pieces between two occurrences come from the precomputed gaps; the first and last are checked here
+        shift = len(head) - lo
+        long_pieces = [0] if head and bounds[1] - bounds[0] >= self.chunk_size else []
+        long_pieces.extend(gap + shift for gap in long_gaps[bisect_left(long_gaps, lo):bisect_left(long_gaps, hi - 1)])
+        if bounds[-1] - bounds[-2] >= self.chunk_size:
+            long_pieces.append(len(bounds) - 2)
+        return bounds, long_pieces
+    
+    @staticmethod
+    def _scanned_bounds(text: str, start: int, end: int, separator: str) -> List[int]:
+        """
+        Offsets where the pieces of text[start:end] begin, followed by end
+        Each separator occurrence (left to right, non-overlapping) starts a piece
+        """
+        if not separator:
+            return list(range(start, end + 1))
+        bounds = []
+        position = text.find(separator, start, end)
+        while position != -1:
+            bounds.append(position)
+            position = text.find(separator, position + len(separator), end)
+        # A separator at the very start leaves an empty first piece, which is dropped
+        if not bounds or bounds[0] != start:
+            bounds.insert(0, start)
+        bounds.append(end)
+        return bounds
+    
+    def _merge(self, text: str, bounds: List[int], first: int, last: int, spans: List[Span]):
+        """
+        Combine the adjacent pieces bounds[first]..bounds[last] (each shorter than
+        chunk_size) into chunks of up to chunk_size, carrying up to chunk_overlap into the next
+        """
+        chunk_size = self.chunk_size
+        chunk_overlap = self.chunk_overlap
+        append = spans.append
+        while True:
+            # Pieces first..fit - 1 fit; piece fit is the first that doesn't
+            fit = bisect_right(bounds, bounds[first] + chunk_size, first, last + 1) - 1
+            if fit > last:
+                fit = last
+            start, end = bounds[first], bounds[fit]
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end > start:
+                append((start, end))
+            if fit == last:
+                return
+            # Drop leading pieces until at most chunk_overlap remains and piece fit can be added
+            keep_from = bounds[fit] - chunk_overlap
+            if bounds[fit + 1] - chunk_size > keep_from:
+                keep_from = bounds[fit + 1] - chunk_size
+            first = bisect_left(bounds, keep_from, first, fit)
@@ -0,0 +1,83 @@
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional
+from config import LLM_TOKENIZER, TOKEN_COUNT_CACHE_SIZE
+
+class TokenCounter:
+    """
+    Counts tokens with the LLM's own tokenizer
+    The tokenizer is loaded on first use and counts are memoized per text, so
+    re-counting the same retrieved chunks is a dictionary lookup. If the
+    tokenizer cannot be loaded it falls back to ~4 characters per token and
+    reports exact = False so callers can keep a safety margin
+    """
+    
+    FALLBACK_CHARS_PER_TOKEN = 4
+    
+    def __init__(self, tokenizer_name: str = LLM_TOKENIZER, cache_size: int = TOKEN_COUNT_CACHE_SIZE):
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._load_attempted = False
+        self._load_lock = threading.Lock()
+        self.count = lru_cache(maxsize=max(1, cache_size))(self._count)
+    
+    def _get_tokenizer(self):
+        """Load the tokenizer once (None if it is unavailable)"""
+        if not self._load_attempted:
+            with self._load_lock:
+                if not self._load_attempted:
+                    try:
+                        from transformers import AutoTokenizer
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name, use_fast=True)
+                        print(f"Loaded tokenizer: {self.tokenizer_name}")
+                    except Exception as e:
+                        print(f"Error loading tokenizer {self.tokenizer_name}, estimating token counts: {e}")
+                        self._tokenizer = None
+                    self._load_attempted = True
+        return self._tokenizer
+    
+    @property
+    def exact(self) -> bool:
+        return self._get_tokenizer() is not None
+    
+    def _encode(self, text: str) -> List[int]:
+        return self._get_tokenizer().encode(text, add_special_tokens=False)
+    
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._get_tokenizer() is None:
+            return len(text) // self.FALLBACK_CHARS_PER_TOKEN
+        return len(self._encode(text))
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of text that is at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ""
+        if self._get_tokenizer() is None:
+            return text[:max_tokens * self.FALLBACK_CHARS_PER_TOKEN]
+        token_ids = self._encode(text)
+        if len(token_ids) <= max_tokens:
+            return text
+        return self._get_tokenizer().decode(token_ids[:max_tokens], skip_special_tokens=True)
+    
+    def stats(self) -> Dict[str, object]:
+        info = self.count.cache_info()
+        return {
+            'tokenizer': self.tokenizer_name,
+            'exact': self.exact,
+            'cached_counts': info.currsize,
+            'hits': info.hits,
+            'misses': info.misses
+        }
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+def get_token_counter(tokenizer_name: Optional[str] = None) -> TokenCounter:
+    """Shared TokenCounter per tokenizer, so the tokenizer is only loaded once per process"""
+    name = tokenizer_name or LLM_TOKENIZER
+    with _counters_lock:
+        if name not in _counters:
+            _counters[name] = TokenCounter(name)
+        return _counters[name]
\ No newline at end of file
@@ -0,0 +1,139 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from config import (
+    AWS_REGION, SAGEMAKER_MAX_POOL_CONNECTIONS, SAGEMAKER_CONNECT_TIMEOUT, SAGEMAKER_READ_TIMEOUT,
+    SAGEMAKER_MAX_ATTEMPTS, PINECONE_POOL_MAXSIZE, PINECONE_MAX_RETRIES, PINECONE_RETRY_BACKOFF,
+    PINECONE_TIMEOUT_SECONDS
+)
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's time budget runs out before a downstream call is made"""
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+def _deadline_after(seconds: Optional[float]) -> Optional[float]:
+    return time.monotonic() + seconds if seconds and seconds > 0 else None
+
+@contextmanager
+def request_deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Give the calls made inside this block a shared time budget (None or <= 0 means unbounded)"""
+    with _deadline_at(_deadline_after(seconds)):
+        yield
+
+@contextmanager
+def _deadline_at(deadline: Optional[float]) -> Iterator[None]:
+    current = _deadline.get()
+    # A nested budget can only shorten the outer one
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def with_deadline(seconds: Optional[float], func: Callable) -> Callable:
+    """Wrap func so it runs under its own request deadline (for work handed to thread pools)"""
+    def run(*args, **kwargs):
+        with request_deadline(seconds):
+            return func(*args, **kwargs)
+    return run
+
+def iterate_with_deadline(seconds: Optional[float], iterator: Iterator) -> Iterator:
+    """
+    Step through iterator under one request deadline (for generators driven from thread pools)
+    Every step sees the same budget whichever thread runs it, and no step starts once it is spent
+    """
+    deadline = _deadline_after(seconds)
+    try:
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise DeadlineExceeded("Request deadline exceeded")
+            with _deadline_at(deadline):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+def remaining_time() -> Optional[float]:
+    """Seconds left in the current request budget, or None if there is no deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def call_timeout(default: float, operation: str = "request") -> float:
+    """Timeout for the next downstream call: the default capped by the remaining budget"""
+    remaining = remaining_time()
+    if remaining is None:
+        return default
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Request deadline exceeded before {operation}")
+    return min(default, remaining)
+
+def _check_deadline(request=None, **kwargs):
+    """botocore before-send hook: stop new attempts (including retries) once the budget is spent"""
+    call_timeout(SAGEMAKER_READ_TIMEOUT, "SageMaker call")
+
+_sagemaker_clients: Dict[Tuple[str, float], Any] = {}
+_sagemaker_clients_lock = threading.Lock()
+
+def get_sagemaker_runtime(endpoint_name: str, read_timeout: float = SAGEMAKER_READ_TIMEOUT):
+    """
+    Shared sagemaker-runtime client per endpoint
+    boto3 clients are thread safe, so every caller of an endpoint reuses one
+    keep-alive connection pool and one adaptive retry budget
+    """
+    key = (endpoint_name, read_timeout)
+    with _sagemaker_clients_lock:
+        if key not in _sagemaker_clients:
+            # boto3 takes a noticeable share of startup; load it on the first call
+            import boto3
+            from botocore.config import Config
+            client = boto3.client(
+                'sagemaker-runtime',
+                config=Config(
+                    region_name=AWS_REGION,
+                    max_pool_connections=max(1, SAGEMAKER_MAX_POOL_CONNECTIONS),
+                    tcp_keepalive=True,
+                    connect_timeout=SAGEMAKER_CONNECT_TIMEOUT,
+                    read_timeout=read_timeout,
+                    # Adaptive mode adds client-side rate limiting on throttles to
+                    # the standard exponential backoff with full jitter
+                    retries={'mode': 'adaptive', 'total_max_attempts': max(1, SAGEMAKER_MAX_ATTEMPTS)}
+                )
+            )
+            client.meta.events.register('before-send.sagemaker-runtime', _check_deadline)
+            _sagemaker_clients[key] = client
+        return _sagemaker_clients[key]
+
+def pinecone_openapi_config(api_key: str, host: str):
+    """Pinecone data-plane transport settings: pool size, keep-alive and jittered retries"""
+    from pinecone.config.openapi import OpenApiConfigFactory
+    from pinecone.utils import normalize_host
+    from urllib3.util.retry import Retry
+    openapi_config = OpenApiConfigFactory.build(api_key=api_key, host=normalize_host(host))  # Sets TCP keep-alive socket options
+    openapi_config.connection_pool_maxsize = max(1, PINECONE_POOL_MAXSIZE)
+    # Vector IDs are deterministic, so retrying upserts and deletes is safe
+    openapi_config.retries = Retry(
+        total=max(0, PINECONE_MAX_RETRIES),
+        backoff_factor=PINECONE_RETRY_BACKOFF,
+        backoff_jitter=PINECONE_RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    return openapi_config
+
+def pinecone_timeout(operation: str = "Pinecone call") -> float:
+    """Per-call Pinecone timeout derived from the request budget"""
+    return call_timeout(PINECONE_TIMEOUT_SECONDS, operation)
\ No newline at end of file
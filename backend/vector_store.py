@@ -0,0 +1,682 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Set
+import numpy as np
+from ann_index import IVFIndex
+from config import (
+    EMBEDDING_DIMENSION, VECTOR_STORE_BACKEND, LOCAL_VECTOR_STORE_PATH, REPLICA_SYNC_CHECK_SECONDS,
+    LOCAL_INDEX_TYPE, LOCAL_PERSIST_DELAY_SECONDS
+)
+
+class VectorStore(ABC):
+    """Interface shared by every vector store backend used by RAGPipeline"""
+    
+    @abstractmethod
+    def upsert_vectors(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadata: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> bool:
+        """Store vectors; generates IDs when none are given"""
+    
+    @abstractmethod
+    def similarity_search(self, query_embedding: List[float], top_k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict]:
+        """Return the top_k matches as dicts with id, score, text and metadata"""
+    
+    @abstractmethod
+    def delete_by_metadata(self, filter_dict: Dict) -> bool:
+        """Delete vectors whose metadata matches the filter"""
+    
+    @abstractmethod
+    def delete_vectors(self, ids: List[str]) -> bool:
+        """Delete vectors by ID"""
+    
+    @abstractmethod
+    def list_document_ids(self, document_name: str) -> Optional[Set[str]]:
+        """IDs stored for a document, or None when the backend cannot enumerate them"""
+    
+    @abstractmethod
+    def fetch_metadata(self, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Stored metadata of the given IDs (missing IDs are left out), or None if it cannot be read"""
+    
+    @abstractmethod
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """Merge new field values into the metadata of stored vectors, keeping their embeddings"""
+    
+    @abstractmethod
+    def get_index_stats(self):
+        """Get index statistics"""
+    
+    def flush(self):
+        """Write buffered changes to durable storage (stores that write through have none)"""
+
+def chunk_vector_id(document_name: str, chunk_hash: str) -> str:
+    """
+    Deterministic vector ID for a chunk
+    The document part is hashed so IDs stay ASCII and share a per-document prefix
+    """
+    document_key = hashlib.sha1(document_name.encode()).hexdigest()[:16]
+    return f"{document_key}#{chunk_hash}"
+
+def document_id_prefix(document_name: str) -> str:
+    """Prefix shared by every chunk_vector_id of a document"""
+    return chunk_vector_id(document_name, '')
+
+def matches_filter(metadata: Dict[str, Any], filter_dict: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one metadata dict"""
+    if not filter_dict:
+        return True
+    
+    for key, condition in filter_dict.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        
+        for operator, expected in condition.items():
+            if operator == '$eq' and value != expected:
+                return False
+            if operator == '$ne' and value == expected:
+                return False
+            if operator == '$in' and value not in expected:
+                return False
+            if operator == '$nin' and value in expected:
+                return False
+            if operator in ('$gt', '$gte', '$lt', '$lte'):
+                if value is None:
+                    return False
+                if operator == '$gt' and not value > expected:
+                    return False
+                if operator == '$gte' and not value >= expected:
+                    return False
+                if operator == '$lt' and not value < expected:
+                    return False
+                if operator == '$lte' and not value <= expected:
+                    return False
+    return True
+
+def _document_names_in_filter(filter_dict: Optional[Dict]) -> Optional[Set[str]]:
+    """Document names a filter is restricted to, if it is a plain document_name match"""
+    if not filter_dict or set(filter_dict) != {'document_name'}:
+        return None
+    condition = filter_dict['document_name']
+    if not isinstance(condition, dict):
+        return {condition}
+    if set(condition) == {'$eq'}:
+        return {condition['$eq']}
+    if set(condition) == {'$in'}:
+        return set(condition['$in'])
+    return None
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector store backed by a NumPy float32 matrix
+    Vectors are L2-normalized on insert so cosine similarity is a single matrix-vector product.
+    With LOCAL_INDEX_TYPE=ivf an IVFIndex narrows each query to a few inverted lists.
+    Deletes only tombstone rows; the matrix is compacted once enough rows are dead.
+    Changes are written to disk at most persist_delay seconds after they happen (or on
+    flush), from a snapshot, so searches never wait on file I/O
+    """
+    
+    # Compact once this fraction of rows are tombstones
+    COMPACT_RATIO = 0.25
+    
+    def __init__(
+        self,
+        path: Optional[str] = LOCAL_VECTOR_STORE_PATH,
+        dimension: int = EMBEDDING_DIMENSION,
+        index_type: str = LOCAL_INDEX_TYPE,
+        persist_delay: float = LOCAL_PERSIST_DELAY_SECONDS
+    ):
+        self.path = path or None
+        self.dimension = dimension
+        self.index_type = index_type
+        self.persist_delay = persist_delay
+        self._lock = threading.RLock()
+        self._persist_lock = threading.Lock()  # Serializes writers so an older snapshot never lands last
+        self._dirty = False
+        self._persist_timer: Optional[threading.Timer] = None
+        self._snapshot_rows = 0  # Leading matrix rows a persist in progress is still writing
+        self._ann = IVFIndex() if index_type == 'ivf' else None
+        self._reset()
+        
+        if self.path:
+            self._load()
+    
+    def _reset(self):
+        self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._doc_rows: Dict[str, Set[int]] = {}
+        if self._ann is not None:
+            self._ann = IVFIndex()
+    
+    def _vectors_file(self) -> str:
+        return os.path.join(self.path, 'vectors.npy')
+    
+    def _records_file(self) -> str:
+        return os.path.join(self.path, 'records.json')
+    
+    def _ann_file(self) -> str:
+        return os.path.join(self.path, 'ivf.npz')
+    
+    def _load(self):
+        """Load a previously persisted index, memory-mapping the vectors"""
+        if not (os.path.exists(self._vectors_file()) and os.path.exists(self._records_file())):
+            return
+        try:
+            # Read-only mapping; copied into memory on the first write
+            self._matrix = np.load(self._vectors_file(), mmap_mode='r')
+            with open(self._records_file(), 'r') as f:
+                records = json.load(f)
+            self._ids = records['ids']
+            self._metadata = records['metadata']
+            self._size = len(self._ids)
+            self._alive = np.array([vector_id is not None for vector_id in self._ids], dtype=bool)
+            self._rebuild_lookups()
+            if self._ann is not None:
+                self._ann.load(self._ann_file())
+            print(f"Loaded local vector store with {len(self)} vectors from {self.path}")
+        except Exception as e:
+            print(f"Error loading local vector store, starting empty: {e}")
+            self._reset()
+    
+    def persist(self):
+        """Write the index to disk now (no-op for in-memory stores)"""
+        if not self.path:
+            return
+        with self._persist_lock:
+            # Only the snapshot is taken under the store lock; the writes happen outside it.
+            # The matrix is not copied: writers copy it first if they would overwrite a
+            # row being written (_detach_snapshot). Records are replaced rather than
+            # mutated, so copying the lists is enough
+            with self._lock:
+                self._cancel_persist_timer()
+                self._dirty = False
+                matrix = self._matrix[:self._size]
+                self._snapshot_rows = self._size
+                ids = list(self._ids)
+                metadata = list(self._metadata)
+                ann_snapshot = self._ann.snapshot() if self._ann is not None else None
+            
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                # Write to temporary files first so a crash never leaves a torn index
+                vectors_tmp = self._vectors_file() + '.tmp'
+                records_tmp = self._records_file() + '.tmp'
+                with open(vectors_tmp, 'wb') as f:
+                    np.save(f, matrix)
+                with open(records_tmp, 'w') as f:
+                    # Tombstoned rows are stored with a null id
+                    json.dump({'ids': ids, 'metadata': metadata}, f)
+                os.replace(vectors_tmp, self._vectors_file())
+                os.replace(records_tmp, self._records_file())
+                if self._ann is not None:
+                    IVFIndex.write(self._ann_file(), ann_snapshot)
+            except Exception:
+                with self._lock:
+                    self._mark_dirty()
+                raise
+            finally:
+                with self._lock:
+                    self._snapshot_rows = 0
+    
+    def _detach_snapshot(self):
+        """Leave the matrix a persist in progress is reading to it, and continue on a copy (lock held)"""
+        self._matrix = self._matrix.copy()
+        self._snapshot_rows = 0
+    
+    def flush(self):
+        """Write pending changes to disk, if there are any"""
+        if self._dirty:
+            self.persist()
+    
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error persisting local vector store: {e}")
+    
+    def _mark_dirty(self):
+        """Schedule a write for persist_delay seconds from now unless one is already pending (lock held)"""
+        if not self.path:
+            return
+        self._dirty = True
+        if self._persist_timer is None:
+            self._persist_timer = threading.Timer(self.persist_delay, self._flush_in_background)
+            self._persist_timer.daemon = True
+            self._persist_timer.start()
+    
+    def _cancel_persist_timer(self):
+        if self._persist_timer is not None:
+            self._persist_timer.cancel()
+            self._persist_timer = None
+    
+    def _rebuild_lookups(self):
+        self._id_to_row = {}
+        self._doc_rows = {}
+        for row, vector_id in enumerate(self._ids):
+            if vector_id is None:
+                continue
+            self._id_to_row[vector_id] = row
+            self._doc_rows.setdefault(self._metadata[row].get('document_name'), set()).add(row)
+    
+    def _reserve(self, extra: int):
+        """Grow the matrix so it can hold `extra` more rows (amortized doubling)"""
+        needed = self._size + extra
+        writable = isinstance(self._matrix, np.ndarray) and not isinstance(self._matrix, np.memmap)
+        if needed <= self._matrix.shape[0] and writable:
+            return
+        capacity = max(needed, self._matrix.shape[0] * 2, 1024)
+        matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        self._matrix = matrix
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+    
+    @staticmethod
+    def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        return vectors / norms
+    
+    def _live_rows(self) -> np.ndarray:
+        return np.flatnonzero(self._alive[:self._size])
+    
+    def _maybe_train(self):
+        """(Re)train the ANN index when the corpus has grown enough (lock held)"""
+        if self._ann is None or not self._ann.needs_training(len(self)):
+            return
+        rows = self._live_rows()
+        self._ann.train(self._matrix[rows], rows)
+        print(f"Trained IVF index: {self._ann.stats()}")
+    
+    def upsert_vectors(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadata: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> bool:
+        """Store vectors in the local index"""
+        try:
+            if ids is None:
+                ids = [str(uuid.uuid4()) for _ in texts]
+            vectors = self._normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(texts), self.dimension))
+            now = time.time()
+            
+            with self._lock:
+                self._reserve(len(texts))
+                rows = []
+                for vector_id, text, vector, meta in zip(ids, texts, vectors, metadata):
+                    record = {**meta, 'text': text, 'timestamp': now}
+                    row = self._id_to_row.get(vector_id)
+                    if row is None:
+                        row = self._size
+                        self._size += 1
+                        self._ids.append(vector_id)
+                        self._metadata.append(record)
+                        self._id_to_row[vector_id] = row
+                    else:
+                        self._doc_rows.get(self._metadata[row].get('document_name'), set()).discard(row)
+                        self._metadata[row] = record
+                        if row < self._snapshot_rows:
+                            self._detach_snapshot()
+                    self._matrix[row] = vector
+                    self._alive[row] = True
+                    self._doc_rows.setdefault(record.get('document_name'), set()).add(row)
+                    rows.append(row)
+                
+                if self._ann is not None:
+                    self._ann.add(rows, self._matrix[rows])
+                    self._maybe_train()
+                self._mark_dirty()
+            return True
+            
+        except Exception as e:
+            print(f"Error upserting vectors into local store: {e}")
+            return False
+    
+    def _candidate_rows(self, filter_dict: Optional[Dict]) -> Optional[np.ndarray]:
+        """Live rows passing the metadata prefilter, or None when no filter is given (lock held)"""
+        if not filter_dict:
+            return None
+        
+        document_names = _document_names_in_filter(filter_dict)
+        if document_names is not None:
+            rows = set()
+            for name in document_names:
+                rows |= self._doc_rows.get(name, set())
+        else:
+            rows = {
+                row for row in range(self._size)
+                if self._alive[row] and matches_filter(self._metadata[row], filter_dict)
+            }
+        return np.fromiter(sorted(rows), dtype=np.int64, count=len(rows))
+    
+    def _search_rows(self, query: np.ndarray, top_k: int, filter_dict: Optional[Dict]) -> np.ndarray:
+        """Rows to score exactly for this query (lock held)"""
+        filtered = self._candidate_rows(filter_dict)
+        
+        # Small filtered sets are cheaper (and exact) to scan directly
+        use_ann = self._ann is not None and self._ann.trained
+        if use_ann and filtered is not None and len(filtered) <= self._ann.min_train_size:
+            use_ann = False
+        
+        if use_ann:
+            rows = self._ann.candidates(query)
+            rows = rows[self._alive[rows]]
+            if filtered is not None:
+                rows = rows[np.isin(rows, filtered, assume_unique=True)]
+            if len(rows) >= top_k:
+                return rows
+        
+        return self._live_rows() if filtered is None else filtered
+    
+    def similarity_search(self, query_embedding: List[float], top_k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict]:
+        """Search for similar vectors (exact matrix-multiply top-k, or IVF-narrowed when enabled)"""
+        try:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(query))
+            if norm == 0.0 or top_k <= 0:
+                return []
+            query = query / norm
+            
+            with self._lock:
+                rows = self._search_rows(query, top_k, filter_dict)
+                if len(rows) == 0:
+                    return []
+                scores = self._matrix[rows] @ query
+                
+                k = min(top_k, len(rows))
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                
+                results = []
+                for position in top:
+                    row = int(rows[position])
+                    meta = self._metadata[row]
+                    results.append({
+                        'id': self._ids[row],
+                        'score': float(scores[position]),
+                        'text': meta.get('text', ''),
+                        'metadata': dict(meta)
+                    })
+                return results
+            
+        except Exception as e:
+            print(f"Error searching local vectors: {e}")
+            return []
+    
+    def _tombstone_rows(self, rows: Set[int]):
+        """Mark rows deleted without moving any data (lock held)"""
+        for row in rows:
+            vector_id = self._ids[row]
+            if vector_id is None:
+                continue
+            self._doc_rows.get(self._metadata[row].get('document_name'), set()).discard(row)
+            del self._id_to_row[vector_id]
+            self._alive[row] = False
+            self._ids[row] = None
+            self._metadata[row] = None
+    
+    def _compact(self):
+        """Drop tombstoned rows and renumber the survivors (lock held)"""
+        live = self._live_rows()
+        self._matrix = np.ascontiguousarray(self._matrix[live])
+        self._ids = [self._ids[row] for row in live.tolist()]
+        self._metadata = [self._metadata[row] for row in live.tolist()]
+        self._size = len(live)
+        self._alive = np.ones(self._size, dtype=bool)
+        self._rebuild_lookups()
+        if self._ann is not None and self._ann.trained:
+            self._ann.reassign(self._matrix, np.arange(self._size))
+    
+    def delete_by_metadata(self, filter_dict: Dict) -> bool:
+        """Delete vectors by metadata filter"""
+        try:
+            with self._lock:
+                rows = self._candidate_rows(filter_dict)
+                rows = set(self._live_rows().tolist()) if rows is None else set(rows.tolist())
+                if rows:
+                    self._tombstone_rows(rows)
+                    if self._size - len(self) > self._size * self.COMPACT_RATIO:
+                        self._compact()
+                    self._mark_dirty()
+            return True
+        except Exception as e:
+            print(f"Error deleting local vectors: {e}")
+            return False
+    
+    def delete_vectors(self, ids: List[str]) -> bool:
+        """Delete vectors by ID"""
+        try:
+            with self._lock:
+                rows = {self._id_to_row[vector_id] for vector_id in ids if vector_id in self._id_to_row}
+                if rows:
+                    self._tombstone_rows(rows)
+                    if self._size - len(self) > self._size * self.COMPACT_RATIO:
+                        self._compact()
+                    self._mark_dirty()
+            return True
+        except Exception as e:
+            print(f"Error deleting local vectors: {e}")
+            return False
+    
+    def list_document_ids(self, document_name: str) -> Optional[Set[str]]:
+        """IDs stored for a document"""
+        with self._lock:
+            return {self._ids[row] for row in self._doc_rows.get(document_name, ())}
+    
+    def fetch_metadata(self, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Stored metadata of the given IDs"""
+        with self._lock:
+            return {
+                vector_id: dict(self._metadata[self._id_to_row[vector_id]])
+                for vector_id in ids if vector_id in self._id_to_row
+            }
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """Rewrite the records of stored vectors with the new field values"""
+        try:
+            with self._lock:
+                for vector_id, fields in updates.items():
+                    row = self._id_to_row.get(vector_id)
+                    if row is not None:
+                        self._metadata[row] = {**self._metadata[row], **fields}
+                self._mark_dirty()
+            return True
+        except Exception as e:
+            print(f"Error updating local vector metadata: {e}")
+            return False
+    
+    def get_index_stats(self) -> Dict[str, Any]:
+        """Get index statistics"""
+        with self._lock:
+            stats = {
+                'backend': 'local',
+                'index_type': self.index_type,
+                'dimension': self.dimension,
+                'total_vector_count': len(self),
+                'tombstones': self._size - len(self),
+                'documents': len([name for name, rows in self._doc_rows.items() if rows])
+            }
+            if self._ann is not None:
+                stats['ann'] = self._ann.stats()
+            return stats
+    
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+def _vector_count(stats: Any) -> Optional[int]:
+    """Read total_vector_count from a Pinecone stats object or a dict"""
+    if stats is None:
+        return None
+    if isinstance(stats, dict):
+        return stats.get('total_vector_count')
+    return getattr(stats, 'total_vector_count', None)
+
+class ReplicatedVectorStore(VectorStore):
+    """
+    Pinecone primary with a local read replica
+    Writes go to both stores. Reads are served locally while the replica holds
+    the same number of vectors as the primary, and fall through to Pinecone otherwise
+    """
+    
+    def __init__(self, primary: VectorStore, replica: LocalVectorStore, sync_check_seconds: int = REPLICA_SYNC_CHECK_SECONDS):
+        self.primary = primary
+        self.replica = replica
+        self.sync_check_seconds = sync_check_seconds
+        self._in_sync = False
+        self._recheck = threading.Event()  # Set by writes so the sync thread re-checks early
+        # Reads fall through to the primary until the copy completes, so it needn't block startup
+        threading.Thread(target=self._maintain_replica, name="replica-sync", daemon=True).start()
+    
+    @property
+    def status(self) -> str:
+        return getattr(self.primary, 'status', 'ready')
+    
+    def sync_from_primary(self) -> bool:
+        """Copy every primary vector into the replica, if the primary can enumerate them"""
+        iter_vectors = getattr(self.primary, 'iter_vectors', None)
+        if iter_vectors is None:
+            return False
+        try:
+            copied = 0
+            for batch in iter_vectors():
+                ids = [vector['id'] for vector in batch]
+                texts = [vector['metadata'].get('text', '') for vector in batch]
+                embeddings = [vector['values'] for vector in batch]
+                metadata = [vector['metadata'] for vector in batch]
+                self.replica.upsert_vectors(texts, embeddings, metadata, ids=ids)
+                copied += len(batch)
+            print(f"Synced {copied} vectors from primary into local replica")
+            self._recheck.set()
+            return True
+        except NotImplementedError:
+            print("Primary vector store cannot enumerate vectors; replica will fill from new writes")
+            return False
+        except Exception as e:
+            print(f"Error syncing local replica: {e}")
+            return False
+    
+    def _maintain_replica(self):
+        """Copy the primary into the replica, then keep checking that their counts match"""
+        self.sync_from_primary()
+        while True:
+            self._recheck.clear()
+            self._check_in_sync()
+            self._recheck.wait(self.sync_check_seconds)
+    
+    def _check_in_sync(self):
+        """Compare vector counts; runs on the sync thread so reads never wait on Pinecone"""
+        try:
+            primary_count = _vector_count(self.primary.get_index_stats())
+        except Exception as e:
+            print(f"Error checking replica sync: {e}")
+            primary_count = None
+        self._in_sync = primary_count is not None and primary_count == len(self.replica)
+    
+    def _replica_in_sync(self) -> bool:
+        """Whether the replica matched the primary at the last check"""
+        return self._in_sync
+    
+    def _mark_stale(self):
+        self._recheck.set()
+    
+    def upsert_vectors(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadata: List[Dict[str, Any]],
+        ids: Optional[List[str]] = None
+    ) -> bool:
+        """Store vectors in both stores under the same IDs"""
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in texts]
+        success = self.primary.upsert_vectors(texts, embeddings, metadata, ids=ids)
+        if success:
+            self.replica.upsert_vectors(texts, embeddings, metadata, ids=ids)
+        self._mark_stale()
+        return success
+    
+    def similarity_search(self, query_embedding: List[float], top_k: int = 5, filter_dict: Optional[Dict] = None) -> List[Dict]:
+        """Search the replica when it is in sync, otherwise the primary"""
+        if self._replica_in_sync():
+            return self.replica.similarity_search(query_embedding, top_k, filter_dict)
+        return self.primary.similarity_search(query_embedding, top_k, filter_dict)
+    
+    def delete_by_metadata(self, filter_dict: Dict) -> bool:
+        """Delete from both stores"""
+        success = self.primary.delete_by_metadata(filter_dict)
+        if success:
+            self.replica.delete_by_metadata(filter_dict)
+        self._mark_stale()
+        return success
+    
+    def delete_vectors(self, ids: List[str]) -> bool:
+        """Delete from both stores"""
+        success = self.primary.delete_vectors(ids)
+        if success:
+            self.replica.delete_vectors(ids)
+        self._mark_stale()
+        return success
+    
+    def list_document_ids(self, document_name: str) -> Optional[Set[str]]:
+        """IDs from the primary, or from the replica while it is in sync"""
+        ids = self.primary.list_document_ids(document_name)
+        if ids is None and self._replica_in_sync():
+            ids = self.replica.list_document_ids(document_name)
+        return ids
+    
+    def fetch_metadata(self, ids: List[str]) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Metadata from the replica while it is in sync, otherwise from the primary"""
+        if self._replica_in_sync():
+            return self.replica.fetch_metadata(ids)
+        return self.primary.fetch_metadata(ids)
+    
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> bool:
+        """Update both stores"""
+        success = self.primary.update_metadata(updates)
+        if success:
+            self.replica.update_metadata(updates)
+        return success
+    
+    def get_index_stats(self):
+        """Get primary index statistics"""
+        return self.primary.get_index_stats()
+    
+    def flush(self):
+        """Write pending replica changes to disk"""
+        self.replica.flush()
+
+def create_vector_store(backend: str = VECTOR_STORE_BACKEND) -> VectorStore:
+    """Build the vector store selected by VECTOR_STORE_BACKEND"""
+    if backend == 'local':
+        return LocalVectorStore()
+    
+    from pinecone_client import PineconeVectorStore
+    if backend == 'replicated':
+        return ReplicatedVectorStore(PineconeVectorStore(), LocalVectorStore())
+    if backend != 'pinecone':
+        print(f"Unknown vector store backend '{backend}', falling back to Pinecone")
+    return PineconeVectorStore()